@@ -1,11 +1,16 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Request, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
-from ...core.ai_service import AIService
-from ..auth import verify_token
+from typing import Any, AsyncIterator, Dict, List, Optional
+import os
+import json
+import aiofiles
+from ...core.ai_service import ai_service
+from ...core.audio_store import audio_store, parse_byte_range
+from ...core.ai_jobs import JobLimitExceeded, ai_job_queue
+from ..auth import socket_user_id, verify_staff, verify_token
 
 router = APIRouter()
-ai_service = AIService()
 
 # Pydantic models
 class ContentGenerationRequest(BaseModel):
@@ -13,6 +18,8 @@ class ContentGenerationRequest(BaseModel):
     content_type: str  # "lesson", "quiz", "explanation", "summary"
     difficulty: str = "intermediate"
     max_length: Optional[int] = 500
+    stream: bool = False  # send tokens as Server-Sent Events while they are generated
+    class_id: Optional[str] = None  # ground the answer in this class's content
 
 class ContentGenerationResponse(BaseModel):
     content: str
@@ -29,6 +36,15 @@ class ContentModerationResponse(BaseModel):
     flags: List[str]
     confidence: float
 
+class TextToSpeechRequest(BaseModel):
+    text: str
+    voice_id: Optional[str] = None
+
+class AIJobRequest(BaseModel):
+    job_type: str  # "quiz", "progress_analysis", "learning_path"
+    params: Dict[str, Any] = {}
+    priority: str = "default"  # "high", "default", "low"
+
 class LearningPathRequest(BaseModel):
     user_id: str
     subject: str
@@ -40,16 +56,55 @@ class LearningPathResponse(BaseModel):
     estimated_duration: str
     difficulty_progression: List[str]
 
+async def _sse_events(events: AsyncIterator[Dict[str, Any]]):
+    """Format AI stream events as Server-Sent Events"""
+    # StreamingResponse cancels this generator when the client disconnects;
+    # closing the event stream then aborts the upstream provider call.
+    try:
+        async for event in events:
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    finally:
+        await events.aclose()
+
+async def _file_chunks(audio, start: int, end: int, chunk_size: int = 64 * 1024):
+    """Read an inclusive byte range of an open file in chunks, closing it afterwards"""
+    async with audio:
+        await audio.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await audio.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+def _sse_response(events: AsyncIterator[Dict[str, Any]]) -> StreamingResponse:
+    return StreamingResponse(
+        _sse_events(events),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/generate", response_model=ContentGenerationResponse)
 async def generate_content(request: ContentGenerationRequest, email: str = Depends(verify_token)):
     """Generate AI-powered educational content"""
+    if request.stream:
+        return _sse_response(ai_service.stream_content(
+            prompt=request.prompt,
+            content_type=request.content_type,
+            difficulty=request.difficulty,
+            max_length=request.max_length,
+            class_id=request.class_id
+        ))
+
     try:
         # In a real app, you might want to check user permissions and rate limits
         result = await ai_service.generate_content(
             prompt=request.prompt,
             content_type=request.content_type,
             difficulty=request.difficulty,
-            max_length=request.max_length
+            max_length=request.max_length,
+            class_id=request.class_id
         )
         
         if result:
@@ -127,11 +182,20 @@ async def generate_learning_path(request: LearningPathRequest, email: str = Depe
 @router.post("/explain")
 async def explain_concept(request: ContentGenerationRequest, email: str = Depends(verify_token)):
     """Get AI explanation of a concept"""
+    if request.stream:
+        return _sse_response(ai_service.stream_explanation(
+            concept=request.prompt,
+            difficulty=request.difficulty,
+            max_length=request.max_length,
+            class_id=request.class_id
+        ))
+
     try:
         result = await ai_service.explain_concept(
             concept=request.prompt,
             difficulty=request.difficulty,
-            max_length=request.max_length
+            max_length=request.max_length,
+            class_id=request.class_id
         )
         
         if result:
@@ -153,19 +217,20 @@ async def explain_concept(request: ContentGenerationRequest, email: str = Depend
 
 @router.post("/quiz-generation")
 async def generate_quiz(request: ContentGenerationRequest, email: str = Depends(verify_token)):
-    """Generate AI-powered quiz questions"""
+    """Generate AI-powered quiz questions, served from the pre-generated pool when stocked"""
     try:
-        result = await ai_service.generate_quiz(
+        result = await ai_service.question_pool.take(
             topic=request.prompt,
             difficulty=request.difficulty,
-            question_count=5
+            count=5
         )
         
-        if result:
+        if result["success"]:
             return {
-                "questions": result.get("questions", []),
-                "difficulty": result.get("difficulty", request.difficulty),
-                "estimated_time": result.get("estimated_time", "10 minutes")
+                "questions": result["questions"],
+                "difficulty": result["difficulty"],
+                "estimated_time": result.get("estimated_time", "10 minutes"),
+                "source": result["source"]
             }
         else:
             raise HTTPException(
@@ -178,15 +243,123 @@ async def generate_quiz(request: ContentGenerationRequest, email: str = Depends(
             detail=str(e)
         )
 
+@router.post("/tts")
+async def text_to_speech(request: TextToSpeechRequest, http_request: Request, email: str = Depends(verify_token)):
+    """Synthesize speech, reusing the stored clip when the same text was narrated before"""
+    result = await ai_service.text_to_speech(request.text, request.voice_id)
+    if not result["success"]:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=result["error"]
+        )
+    return {
+        "audio_id": result["audio_id"],
+        "url": str(http_request.url_for("get_tts_audio", audio_id=result["audio_id"])),
+        "voice": result["voice"],
+        "cached": result["cached"]
+    }
+
+# Unauthenticated so <audio> elements can load it; ids are unguessable content digests
+@router.get("/tts/{audio_id}")
+async def get_tts_audio(audio_id: str, request: Request):
+    """Stream a stored clip, honoring single byte-range requests for seeking"""
+    try:
+        path = await audio_store.get(audio_id)
+        # Holding the file open keeps it readable even if another worker evicts it now
+        audio = await aiofiles.open(path, "rb") if path is not None else None
+    except (ValueError, FileNotFoundError):
+        audio = None
+    if audio is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Audio not found")
+
+    size = os.fstat(audio.fileno()).st_size
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "ETag": f'"{audio_id}"'
+    }
+    start, end = 0, size - 1
+    status_code = status.HTTP_200_OK
+
+    range_header = request.headers.get("range")
+    if range_header:
+        try:
+            start, end = parse_byte_range(range_header, size)
+        except ValueError:
+            await audio.close()
+            raise HTTPException(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                detail="Requested range not satisfiable",
+                headers={"Content-Range": f"bytes */{size}"}
+            )
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        _file_chunks(audio, start, end),
+        status_code=status_code,
+        media_type="audio/mpeg",
+        headers=headers
+    )
+
+@router.post("/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def submit_ai_job(request: AIJobRequest, http_request: Request, email: str = Depends(verify_token)):
+    """Queue a long-running AI job; poll its status or wait for the ai_job_update socket event"""
+    try:
+        job = await ai_job_queue.submit(
+            owner=email,
+            job_type=request.job_type,
+            params=request.params,
+            priority=request.priority,
+            # Only the caller's own socket hears about the job
+            notify_user_id=socket_user_id(email)
+        )
+    except JobLimitExceeded as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Job queue unavailable: {e}"
+        )
+    return {**job, "status_url": str(http_request.url_for("get_ai_job", job_id=job["job_id"]))}
+
+@router.get("/jobs/{job_id}")
+async def get_ai_job(job_id: str, email: str = Depends(verify_token)):
+    """Get a job's status, and its result once finished"""
+    job = await ai_job_queue.get(job_id)
+    if job is None or job["owner"] != email:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return ai_job_queue.public(job)
+
+@router.delete("/cache")
+async def invalidate_ai_cache(content_type: Optional[str] = None, email: str = Depends(verify_staff)):
+    """Invalidate cached AI responses, optionally for one content type only; the cache is shared, so staff only"""
+    if content_type:
+        removed = await ai_service.cache.invalidate_content_type(content_type)
+    else:
+        removed = await ai_service.cache.clear()
+    return {"message": "AI cache invalidated", "removed": removed}
+
 @router.get("/health")
 async def ai_service_health():
     """Check AI service health"""
     try:
         status = await ai_service.get_service_status()
+        breakers = status["circuit_breakers"]
+        open_circuits = [name for name, breaker in breakers.items() if breaker["state"] == "open"]
+        if breakers and len(open_circuits) == len(breakers):
+            health = "unhealthy"
+        elif open_circuits:
+            health = "degraded"
+        else:
+            health = "healthy"
         return {
-            "status": "healthy",
+            "status": health,
             "service": "ai",
-            "details": status
+            "details": {**status, "jobs": ai_job_queue.get_stats()}
         }
     except Exception as e:
         return {
@@ -74,6 +74,21 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+def verify_staff(email: str = Depends(verify_token)):
+    """Verify JWT token and that its user is a teacher or admin"""
+    user = mock_users.get(email)
+    if user is None or user["role"] not in ("teacher", "admin"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Teacher or admin role required"
+        )
+    return email
+
+def socket_user_id(email: str) -> str:
+    """Id a user's WebSocket connects under (/ws/{user_id}), for the email in their token"""
+    user = mock_users.get(email)
+    return user["id"] if user else email
+
 @router.post("/login", response_model=TokenResponse)
 async def login(user_credentials: UserLogin):
     """User login endpoint"""
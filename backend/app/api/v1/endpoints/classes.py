@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends, status
 from pydantic import BaseModel
 from typing import List, Optional
+from ...core.ai_service import ai_service
 from ..auth import verify_token
 
 router = APIRouter()
@@ -74,6 +75,11 @@ mock_classes = {
     }
 }
 
+async def index_classes():
+    """Index the content of every class for retrieval"""
+    for class_data in mock_classes.values():
+        await ai_service.retriever.index_class(class_data)
+
 @router.get("/", response_model=List[ClassInfo])
 async def get_classes(email: str = Depends(verify_token)):
     """Get all available classes"""
@@ -136,6 +142,7 @@ async def delete_class(class_id: str, email: str = Depends(verify_token)):
     
     # In a real app, check if user has permission to delete this class
     del mock_classes[class_id]
+    ai_service.retriever.remove_class(class_id)
     
     return {"message": "Class deleted successfully"}
 
@@ -161,5 +168,6 @@ async def add_class_content(class_id: str, content: ClassContent, email: str = D
     
     # In a real app, check if user has permission to add content
     mock_classes[class_id]["content"].append(content.dict())
+    await ai_service.retriever.index_content(class_id, content.dict())
     
     return content 
\ No newline at end of file
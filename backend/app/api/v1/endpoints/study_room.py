@@ -1,12 +1,12 @@
 from fastapi import APIRouter, HTTPException, Depends, status
 from pydantic import BaseModel
 from typing import List, Optional
-from ...core.study_room_service import StudyRoomService
+import uuid
+from ...core.study_room_service import study_room_service
 from ...core.websocket_manager import websocket_manager
 from ..auth import verify_token
 
 router = APIRouter()
-study_room_service = StudyRoomService()
 
 # Pydantic models
 class StudyRoomCreate(BaseModel):
@@ -39,7 +39,8 @@ class UserLeave(BaseModel):
 async def create_study_room(room_data: StudyRoomCreate, email: str = Depends(verify_token)):
     """Create a new study room"""
     try:
-        room_id = f"room_{len(study_room_service.active_rooms) + 1}"
+        # Rooms expire, so a count-based id could hand out one still in use
+        room_id = f"room_{uuid.uuid4().hex[:12]}"
         success = await study_room_service.create_room(room_id, room_data.dict())
         
         if success:
@@ -94,6 +95,11 @@ async def get_study_room(room_id: str, email: str = Depends(verify_token)):
 @router.post("/join")
 async def join_study_room(join_data: UserJoin, email: str = Depends(verify_token)):
     """Join a study room"""
+    if await study_room_service.is_full(join_data.room_id, email):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Study room is full ({study_room_service.capacity(join_data.room_id)} users)"
+        )
     try:
         success = await study_room_service.add_user_to_room(email, join_data.room_id)
         if success:
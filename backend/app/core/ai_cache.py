@@ -0,0 +1,137 @@
+import hashlib
+import json
+import logging
+import unicodedata
+from typing import Dict, Any, Optional
+
+from .config import settings
+from .redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+class AIResponseCache:
+    """Redis-backed cache of provider responses, shared by every worker"""
+
+    def __init__(self, prefix: str = "ai_cache"):
+        self.prefix = prefix
+        self.stats_key = f"{prefix}:stats"
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.errors = 0
+
+    @staticmethod
+    def normalize(text: Optional[str]) -> str:
+        """Normalize text so trivially different prompts share a cache entry"""
+        if not text:
+            return ""
+        return " ".join(unicodedata.normalize("NFC", text).split())
+
+    def is_cacheable(self, temperature: Optional[float]) -> bool:
+        """Only cache calls that are close to deterministic"""
+        if not settings.AI_CACHE_ENABLED:
+            return False
+        effective = settings.OPENAI_TEMPERATURE if temperature is None else temperature
+        return effective <= settings.AI_CACHE_MAX_TEMPERATURE
+
+    def ttl_for(self, content_type: str) -> int:
+        """Get the TTL in seconds for a content type"""
+        ttls = settings.AI_CACHE_TTLS
+        return ttls.get(content_type, ttls.get("default", 3600))
+
+    def build_key(
+        self,
+        prompt: str,
+        context: Optional[str],
+        model: str,
+        temperature: Optional[float],
+        max_tokens: Optional[int] = None,
+        content_type: str = "default"
+    ) -> str:
+        """Build the cache key for a request"""
+        effective = settings.OPENAI_TEMPERATURE if temperature is None else temperature
+        material = json.dumps(
+            [self.normalize(prompt), self.normalize(context), model, round(effective, 2), max_tokens],
+            separators=(",", ":"),
+            ensure_ascii=False
+        )
+        digest = hashlib.sha256(material.encode("utf-8")).hexdigest()
+        return f"{self.prefix}:{content_type}:{digest}"
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Look up a cached response"""
+        try:
+            cached = await redis_client.get(key)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"AI cache lookup failed: {e}")
+            return None
+
+        field = "hits" if isinstance(cached, dict) else "misses"
+        if field == "hits":
+            self.hits += 1
+        else:
+            self.misses += 1
+        await self._count(field)
+
+        if field == "hits":
+            return {**cached, "cached": True}
+        return None
+
+    async def set(self, key: str, response: Dict[str, Any], content_type: str = "default"):
+        """Store a successful response"""
+        try:
+            await redis_client.set(key, response, expire=self.ttl_for(content_type))
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"AI cache store failed: {e}")
+
+    async def invalidate(self, key: str):
+        """Remove a single cached response"""
+        try:
+            await redis_client.delete(key)
+        except Exception as e:
+            logger.warning(f"AI cache invalidation failed for {key}: {e}")
+
+    async def invalidate_content_type(self, content_type: str) -> int:
+        """Remove every cached response of a content type"""
+        try:
+            return await redis_client.delete_pattern(f"{self.prefix}:{content_type}:*")
+        except Exception as e:
+            logger.warning(f"AI cache invalidation failed for {content_type}: {e}")
+            return 0
+
+    async def clear(self) -> int:
+        """Remove every cached response"""
+        return await self.invalidate_content_type("*")
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """Get hit and miss counts for this worker and for the whole cluster"""
+        stats = {
+            "enabled": settings.AI_CACHE_ENABLED,
+            "worker": {
+                "hits": self.hits,
+                "misses": self.misses,
+                "skipped": self.skipped,
+                "errors": self.errors
+            }
+        }
+        try:
+            shared = await redis_client.redis.hgetall(self.stats_key)
+            hits = int(shared.get("hits", 0))
+            misses = int(shared.get("misses", 0))
+            stats["shared"] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0
+            }
+        except Exception as e:
+            logger.debug(f"AI cache shared stats unavailable: {e}")
+        return stats
+
+    async def _count(self, field: str):
+        """Bump a shared counter"""
+        try:
+            await redis_client.incr(self.stats_key, field=field)
+        except Exception as e:
+            logger.debug(f"AI cache counter update failed: {e}")
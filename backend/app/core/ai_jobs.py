@@ -0,0 +1,204 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .blocking_executor import blocking_executor
+from .celery_app import celery_app
+from .config import settings
+from .redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+RETRYING = "retrying"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+# Job type -> AIService method run by the worker with the job's params
+JOB_TYPES = {
+    "quiz": "generate_quiz_questions",
+    "progress_analysis": "analyze_student_progress",
+    "learning_path": "generate_learning_path",
+}
+
+JOB_EVENTS_CHANNEL = "ai_jobs:events"
+
+# Drop expired reservations, then take a slot only while the user is under the limit
+RESERVE_SLOT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[3], ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return 1
+"""
+
+class JobLimitExceeded(Exception):
+    """Raised when a user already has the maximum number of unfinished jobs"""
+
+class AIJobError(Exception):
+    """Raised by a failed job attempt that should be retried"""
+
+class AIJobQueue:
+    """Submit long-running AI work to Celery workers and track it in Redis"""
+
+    def __init__(self, prefix: str = "ai_job"):
+        self.prefix = prefix
+        self.submitted = 0
+        self.rejected = 0
+        # Longest a job can stay unfinished: every attempt plus every retry countdown
+        self.lifetime = (settings.AI_JOB_TIME_LIMIT + settings.AI_JOB_RETRY_BACKOFF_MAX) * (settings.AI_JOB_MAX_RETRIES + 1)
+
+    def _key(self, job_id: str) -> str:
+        return f"{self.prefix}:{job_id}"
+
+    def _slots_key(self, owner: str) -> str:
+        return f"{self.prefix}:active:{owner}"
+
+    async def submit(
+        self,
+        owner: str,
+        job_type: str,
+        params: Dict[str, Any],
+        priority: str = "default",
+        notify_user_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Queue a job on its priority lane, enforcing the per-user concurrency limit"""
+        if job_type not in JOB_TYPES:
+            raise ValueError(f"Unknown job type: {job_type}")
+        queue = settings.AI_JOB_QUEUES.get(priority)
+        if queue is None:
+            raise ValueError(f"Unknown priority: {priority}")
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        reserved = await redis_client.redis.eval(
+            RESERVE_SLOT, 1, self._slots_key(owner),
+            now, settings.AI_JOB_MAX_CONCURRENT_PER_USER, now + self.lifetime, job_id, self.lifetime
+        )
+        if not reserved:
+            self.rejected += 1
+            raise JobLimitExceeded(
+                f"At most {settings.AI_JOB_MAX_CONCURRENT_PER_USER} unfinished jobs per user"
+            )
+
+        job = {
+            "job_id": job_id,
+            "owner": owner,
+            "notify_user_id": notify_user_id or owner,
+            "job_type": job_type,
+            "params": params,
+            "priority": priority,
+            "status": QUEUED,
+            "attempts": 0,
+            "created_at": now
+        }
+        try:
+            await self._save(job, expire=self.lifetime + settings.AI_JOB_RESULT_TTL)
+            await blocking_executor.run(
+                "celery", celery_app.send_task, "ai_jobs.run", args=[job_id], queue=queue
+            )
+        except Exception:
+            await self._release(job)
+            await redis_client.delete(self._key(job_id))
+            raise
+
+        self.submitted += 1
+        return self.public(job)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job's full record, or None once it has expired"""
+        raw = await redis_client.redis.hgetall(self._key(job_id))
+        if not raw:
+            return None
+        return {field: json.loads(value) for field, value in raw.items()}
+
+    async def mark_running(self, job_id: str, attempt: int) -> Optional[Dict[str, Any]]:
+        """Record the start of an attempt"""
+        job = await self.get(job_id)
+        if job is None:
+            return None
+        job.update({"status": RUNNING, "attempts": attempt + 1, "started_at": time.time()})
+        await self._save(job)
+        await self._publish(job)
+        return job
+
+    async def mark_retrying(self, job: Dict[str, Any], error: str):
+        """Record a failed attempt that will be retried"""
+        job.update({"status": RETRYING, "error": error})
+        await self._save(job)
+        await self._publish(job)
+
+    async def finish(self, job: Dict[str, Any], result: Dict[str, Any] = None, error: str = None):
+        """Store the outcome, free the user's slot and notify the user"""
+        job.update({
+            "status": FAILED if error else SUCCEEDED,
+            "result": result,
+            "error": error,
+            "finished_at": time.time()
+        })
+        await self._save(job, expire=settings.AI_JOB_RESULT_TTL)
+        await self._release(job)
+        await self._publish(job)
+
+    async def listen(self, deliver: Callable[[str, Dict[str, Any]], Awaitable[Any]]):
+        """Forward job updates published by workers to the users' sockets"""
+        while True:
+            pubsub = redis_client.redis.pubsub()
+            try:
+                await pubsub.subscribe(JOB_EVENTS_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    event = json.loads(message["data"])
+                    await deliver(event.pop("notify_user_id"), event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"AI job listener error: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.close()
+
+    @staticmethod
+    def public(job: Dict[str, Any]) -> Dict[str, Any]:
+        """Strip routing fields from a job record"""
+        return {field: value for field, value in job.items() if field not in ("owner", "notify_user_id")}
+
+    async def _save(self, job: Dict[str, Any], expire: int = None):
+        pipe = redis_client.redis.pipeline()
+        pipe.hset(self._key(job["job_id"]), mapping={field: json.dumps(value) for field, value in job.items()})
+        if expire:
+            pipe.expire(self._key(job["job_id"]), expire)
+        await pipe.execute()
+
+    async def _release(self, job: Dict[str, Any]):
+        try:
+            await redis_client.redis.zrem(self._slots_key(job["owner"]), job["job_id"])
+        except Exception as e:
+            logger.warning(f"Could not release job slot {job['job_id']}: {e}")
+
+    async def _publish(self, job: Dict[str, Any]):
+        event = {
+            "type": "ai_job_update",
+            "notify_user_id": job["notify_user_id"],
+            **{field: job.get(field) for field in ("job_id", "job_type", "status", "attempts", "error")}
+        }
+        if job["status"] == SUCCEEDED:
+            event["result"] = job["result"]
+        try:
+            await redis_client.redis.publish(JOB_EVENTS_CHANNEL, json.dumps(event))
+        except Exception as e:
+            logger.warning(f"Could not publish update for job {job['job_id']}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get submission counters for this process"""
+        return {"submitted": self.submitted, "rejected": self.rejected}
+
+# Global instance
+ai_job_queue = AIJobQueue()
@@ -1,19 +1,38 @@
 import asyncio
+import importlib
 import logging
-from typing import Dict, List, Any, Optional
+import time
+from typing import AsyncIterator, Dict, List, Any, Optional
 import json
-import openai
-import anthropic
-import google.generativeai as genai
-from elevenlabs import generate, save, set_api_key
-import assemblyai as aai
-import cohere
-from huggingface_hub import InferenceClient
 
 from app.core.config import settings
+from app.core.ai_cache import AIResponseCache
+from app.core.single_flight import SingleFlight
+from app.core.provider_router import ProviderRouter, ProviderUnavailableError
+from app.core.moderation import ESCALATE, LocalModerator
+from app.core.moderation_batcher import ModerationBatcher
+from app.core.blocking_executor import blocking_executor
+from app.core.audio_store import audio_store
+from app.core.question_pool import QuestionPool
+from app.core.prompt_budget import PromptBudgeter
+from app.core.simulated_provider import SimulatedProvider
+from app.core.embedding_service import EmbeddingService
+from app.core.content_retriever import ContentRetriever
+from app.core.semantic_cache import SemanticCache
 
 logger = logging.getLogger(__name__)
 
+# SDK name -> (API key setting, module); each module is imported only when its key is set
+PROVIDER_SDKS = {
+    "openai": ("OPENAI_API_KEY", "openai"),
+    "anthropic": ("ANTHROPIC_API_KEY", "anthropic"),
+    "google": ("GOOGLE_AI_API_KEY", "google.generativeai"),
+    "cohere": ("COHERE_API_KEY", "cohere"),
+    "huggingface": ("HUGGINGFACE_API_KEY", "huggingface_hub"),
+    "elevenlabs": ("ELEVENLABS_API_KEY", "elevenlabs"),
+    "assemblyai": ("ASSEMBLYAI_API_KEY", "assemblyai"),
+}
+
 class AIService:
     def __init__(self):
         self.openai_client = None
@@ -21,56 +40,115 @@ class AIService:
         self.google_genai = None
         self.cohere_client = None
         self.hf_client = None
+        self.simulated_client = None
         self.current_provider = settings.AI_PROVIDER
         self.fallback_providers = settings.AI_FALLBACK_PROVIDERS
-        
-        # Initialize ElevenLabs
-        if settings.ELEVENLABS_API_KEY:
-            set_api_key(settings.ELEVENLABS_API_KEY)
-            
-        # Initialize AssemblyAI
-        if settings.ASSEMBLYAI_API_KEY:
-            aai.settings.api_key = settings.ASSEMBLYAI_API_KEY
+        self.cache = AIResponseCache()
+        self.inflight = SingleFlight()
+        self.router = ProviderRouter()
+        self.local_moderator = LocalModerator()
+        self.moderation_batcher = ModerationBatcher(self)
+        self.question_pool = QuestionPool(self)
+        self.budgeter = PromptBudgeter()
+        self.embeddings = EmbeddingService()
+        self.retriever = ContentRetriever(self.embeddings)
+        self.semantic_cache = SemanticCache(self.embeddings)
+        self.sdks: Dict[str, Any] = {}
+        self.sdk_import_ms: Dict[str, float] = {}
+        # Configured providers whose SDK could not be imported; the others still serve requests
+        self.missing_sdks: List[str] = []
+
+    def _import_sdks(self, modules: Dict[str, str]):
+        for name, module in modules.items():
+            started = time.perf_counter()
+            try:
+                self.sdks[name] = importlib.import_module(module)
+            except Exception as e:
+                logger.error(f"Could not import {module}: {e}")
+            self.sdk_import_ms[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    async def _load_sdks(self):
+        """Import the SDKs of configured providers off the event loop"""
+        # One thread imports them in turn: the GIL leaves little to gain from parallel
+        # imports, and SDKs sharing dependencies could trip the import deadlock detection
+        modules = {
+            name: module
+            for name, (key_setting, module) in PROVIDER_SDKS.items()
+            if getattr(settings, key_setting) and name not in self.sdks
+        }
+        if modules:
+            await blocking_executor.run("sdk_import", self._import_sdks, modules)
 
     async def initialize(self):
-        """Initialize AI service clients"""
+        """Initialize AI service clients; configured providers whose SDK is missing are recorded and skipped"""
         try:
-            # Initialize OpenAI
-            if settings.OPENAI_API_KEY:
-                self.openai_client = openai.AsyncOpenAI(
+            # Initialize the simulated provider used for load testing
+            if "simulated" in [self.current_provider] + self.fallback_providers:
+                self.simulated_client = SimulatedProvider()
+                logger.info("Simulated AI provider initialized")
+            
+            await self._load_sdks()
+            
+            # Initialize OpenAI; clients made by an earlier attempt are kept on a retry
+            if "openai" in self.sdks and self.openai_client is None:
+                self.openai_client = self.sdks["openai"].AsyncOpenAI(
                     api_key=settings.OPENAI_API_KEY,
                     organization=settings.OPENAI_ORGANIZATION_ID
                 )
                 logger.info("OpenAI client initialized")
             
             # Initialize Anthropic
-            if settings.ANTHROPIC_API_KEY:
-                self.anthropic_client = anthropic.AsyncAnthropic(
+            if "anthropic" in self.sdks and self.anthropic_client is None:
+                self.anthropic_client = self.sdks["anthropic"].AsyncAnthropic(
                     api_key=settings.ANTHROPIC_API_KEY
                 )
                 logger.info("Anthropic client initialized")
             
             # Initialize Google AI
-            if settings.GOOGLE_AI_API_KEY:
-                genai.configure(api_key=settings.GOOGLE_AI_API_KEY)
-                self.google_genai = genai.GenerativeModel(settings.GOOGLE_AI_MODEL)
+            if "google" in self.sdks:
+                self.sdks["google"].configure(api_key=settings.GOOGLE_AI_API_KEY)
+                self.google_genai = self.sdks["google"].GenerativeModel(settings.GOOGLE_AI_MODEL)
                 logger.info("Google AI client initialized")
             
             # Initialize Cohere
-            if settings.COHERE_API_KEY:
-                self.cohere_client = cohere.AsyncClient(settings.COHERE_API_KEY)
+            if "cohere" in self.sdks and self.cohere_client is None:
+                self.cohere_client = self.sdks["cohere"].AsyncClient(settings.COHERE_API_KEY)
                 logger.info("Cohere client initialized")
             
             # Initialize Hugging Face
-            if settings.HUGGINGFACE_API_KEY:
-                self.hf_client = InferenceClient(
+            if "huggingface" in self.sdks:
+                self.hf_client = self.sdks["huggingface"].InferenceClient(
                     model="microsoft/DialoGPT-medium",
                     token=settings.HUGGINGFACE_API_KEY
                 )
                 logger.info("Hugging Face client initialized")
+            
+            # Initialize ElevenLabs
+            if "elevenlabs" in self.sdks:
+                self.sdks["elevenlabs"].set_api_key(settings.ELEVENLABS_API_KEY)
+                
+            # Initialize AssemblyAI
+            if "assemblyai" in self.sdks:
+                self.sdks["assemblyai"].settings.api_key = settings.ASSEMBLYAI_API_KEY
+            
+            # Tokenizers count prompt tokens against the per-provider budgets
+            await blocking_executor.run("tokenizer", self.budgeter.load)
                 
         except Exception as e:
             logger.error(f"Error initializing AI service: {e}")
+            raise
+
+        self.missing_sdks = [
+            name for name, (key_setting, module) in PROVIDER_SDKS.items()
+            if getattr(settings, key_setting) and name not in self.sdks
+        ]
+        if self.missing_sdks:
+            logger.warning(f"Provider SDKs unavailable, serving without: {', '.join(self.missing_sdks)}")
+
+    async def load_embeddings(self):
+        """Open the embedding store, so embeddings computed before are reused"""
+        self.embeddings.openai_client = self.openai_client
+        await self.embeddings.load()
 
     async def cleanup(self):
         """Cleanup AI service resources"""
@@ -81,32 +159,140 @@ class AIService:
                 await self.anthropic_client.close()
             if self.cohere_client:
                 await self.cohere_client.close()
+            blocking_executor.shutdown()
         except Exception as e:
             logger.error(f"Error cleaning up AI service: {e}")
 
+    def _model_for(self, provider: str) -> str:
+        """Get the configured model name for a provider"""
+        models = {
+            "openai": settings.OPENAI_MODEL,
+            "anthropic": settings.ANTHROPIC_MODEL,
+            "google": settings.GOOGLE_AI_MODEL,
+            "cohere": settings.COHERE_MODEL
+        }
+        return models.get(provider, provider)
+
     async def generate_response(
         self, 
         prompt: str, 
         context: Optional[str] = None,
         max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        content_type: str = "default",
+        use_cache: bool = True,
+        query: Optional[str] = None,
+        class_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Generate AI response, served from the shared cache or, given the student's query, a similar earlier answer"""
+        key = self.cache.build_key(
+            prompt, context, self._model_for(self.current_provider),
+            temperature, max_tokens, content_type
+        )
+        cacheable = use_cache and self.cache.is_cacheable(temperature)
+        scope = self._semantic_scope(prompt, query, class_id, content_type, temperature, max_tokens) if cacheable and query else None
+        if cacheable:
+            cached = await self.cache.get(key) or await self._semantic_get(
+                query, scope, lambda: self._generate_uncached(prompt, context, max_tokens, temperature)
+            )
+            if cached:
+                return cached
+        else:
+            self.cache.skipped += 1
+
+        async def generate():
+            response = await self._generate_uncached(prompt, context, max_tokens, temperature)
+            if cacheable and response.get("success"):
+                await self.cache.set(key, response, content_type)
+                if scope:
+                    await self.semantic_cache.set(query, scope, response, self.cache.ttl_for(content_type))
+            return response
+
+        # Identical concurrent requests share a single provider call
+        try:
+            response = await self.inflight.do(key, generate, timeout=settings.AI_SINGLE_FLIGHT_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"AI request timed out after {settings.AI_SINGLE_FLIGHT_TIMEOUT}s")
+            return {
+                "success": False,
+                "error": "AI request timed out",
+                "content": "I'm sorry, but your request took too long to process. Please try again later."
+            }
+        return dict(response)
+
+    def _semantic_scope(
+        self,
+        prompt: str,
+        query: str,
+        class_id: Optional[str],
+        content_type: str,
+        temperature: Optional[float],
+        max_tokens: Optional[int]
+    ) -> str:
+        """Partition for semantic matching: the request with the question itself cut out"""
+        variant = self.cache.build_key(
+            prompt.replace(query, "{query}"), None, self._model_for(self.current_provider),
+            temperature, max_tokens, content_type
+        )
+        return self.semantic_cache.scope(class_id, content_type, variant)
+
+    async def _semantic_get(self, query: Optional[str], scope: Optional[str], regenerate) -> Optional[Dict[str, Any]]:
+        """Look up a similar earlier question, sampling hits for a false-hit check"""
+        if not scope:
+            return None
+        cached = await self.semantic_cache.get(query, scope)
+        if cached and self.semantic_cache.should_verify():
+            self.semantic_cache.verify(cached, regenerate)
+        return cached
+
+    def _available_providers(self) -> List[str]:
+        """Get configured providers, primary first, that have an initialized client"""
+        clients = {
+            "openai": self.openai_client,
+            "anthropic": self.anthropic_client,
+            "google": self.google_genai,
+            "cohere": self.cohere_client,
+            "simulated": self.simulated_client
+        }
+        providers = []
+        for provider in [self.current_provider] + self.fallback_providers:
+            if clients.get(provider) and provider not in providers:
+                providers.append(provider)
+        return providers
+
+    async def _call_provider(
+        self, 
+        provider: str,
+        prompt: str, 
+        context: Optional[str] = None,
+        max_tokens: Optional[int] = None,
         temperature: Optional[float] = None
     ) -> Dict[str, Any]:
-        """Generate AI response with fallback providers"""
-        providers = [self.current_provider] + self.fallback_providers
-        
-        for provider in providers:
-            try:
-                if provider == "openai" and self.openai_client:
-                    return await self._generate_openai_response(prompt, context, max_tokens, temperature)
-                elif provider == "anthropic" and self.anthropic_client:
-                    return await self._generate_anthropic_response(prompt, context, max_tokens, temperature)
-                elif provider == "google" and self.google_genai:
-                    return await self._generate_google_response(prompt, context, max_tokens, temperature)
-                elif provider == "cohere" and self.cohere_client:
-                    return await self._generate_cohere_response(prompt, context, max_tokens, temperature)
-            except Exception as e:
-                logger.warning(f"Provider {provider} failed: {e}")
-                continue
+        """Generate a response with one specific provider"""
+        handlers = {
+            "openai": self._generate_openai_response,
+            "anthropic": self._generate_anthropic_response,
+            "google": self._generate_google_response,
+            "cohere": self._generate_cohere_response,
+            "simulated": self._generate_simulated_response
+        }
+        return await handlers[provider](prompt, context, max_tokens, temperature)
+
+    async def _generate_uncached(
+        self, 
+        prompt: str, 
+        context: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Generate AI response, hedging slow providers onto the fallbacks"""
+        try:
+            return await self.router.route(
+                self._available_providers(),
+                lambda provider: self._call_provider(provider, prompt, context, max_tokens, temperature)
+            )
+        except ProviderUnavailableError as e:
+            logger.error(f"AI generation failed: {e}")
         
         # If all providers fail, return error
         return {
@@ -124,7 +310,7 @@ class AIService:
     ) -> Dict[str, Any]:
         """Generate response using OpenAI"""
         try:
-            full_prompt = f"{context}\n\n{prompt}" if context else prompt
+            full_prompt = self.budgeter.fit("openai", prompt, context, max_tokens)
             
             response = await self.openai_client.chat.completions.create(
                 model=settings.OPENAI_MODEL,
@@ -152,7 +338,7 @@ class AIService:
     ) -> Dict[str, Any]:
         """Generate response using Anthropic"""
         try:
-            full_prompt = f"{context}\n\n{prompt}" if context else prompt
+            full_prompt = self.budgeter.fit("anthropic", prompt, context, max_tokens)
             
             response = await self.anthropic_client.messages.create(
                 model=settings.ANTHROPIC_MODEL,
@@ -180,11 +366,11 @@ class AIService:
     ) -> Dict[str, Any]:
         """Generate response using Google AI"""
         try:
-            full_prompt = f"{context}\n\n{prompt}" if context else prompt
+            full_prompt = self.budgeter.fit("google", prompt, context, max_tokens)
             
             response = await self.google_genai.generate_content_async(
                 full_prompt,
-                generation_config=genai.types.GenerationConfig(
+                generation_config=self.sdks["google"].types.GenerationConfig(
                     max_output_tokens=max_tokens or 4000,
                     temperature=temperature or 0.7
                 )
@@ -209,7 +395,7 @@ class AIService:
     ) -> Dict[str, Any]:
         """Generate response using Cohere"""
         try:
-            full_prompt = f"{context}\n\n{prompt}" if context else prompt
+            full_prompt = self.budgeter.fit("cohere", prompt, context, max_tokens)
             
             response = await self.cohere_client.generate(
                 model=settings.COHERE_MODEL,
@@ -228,10 +414,466 @@ class AIService:
             logger.error(f"Cohere error: {e}")
             raise
 
-    async def moderate_content(self, content: str) -> Dict[str, Any]:
-        """Moderate content using AI"""
+    async def _generate_simulated_response(
+        self, 
+        prompt: str, 
+        context: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Generate response using the simulated provider"""
+        full_prompt = self.budgeter.fit("simulated", prompt, context, max_tokens)
+        return await self.simulated_client.generate(full_prompt, max_tokens)
+
+    async def stream_response(
+        self, 
+        prompt: str, 
+        context: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        content_type: str = "default",
+        use_cache: bool = True,
+        query: Optional[str] = None,
+        class_id: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream an AI response as token events followed by a final metadata event"""
+        started = time.monotonic()
+        key = self.cache.build_key(
+            prompt, context, self._model_for(self.current_provider),
+            temperature, max_tokens, content_type
+        )
+        cacheable = use_cache and self.cache.is_cacheable(temperature)
+        scope = self._semantic_scope(prompt, query, class_id, content_type, temperature, max_tokens) if cacheable and query else None
+        if cacheable:
+            cached = await self.cache.get(key) or await self._semantic_get(
+                query, scope, lambda: self._generate_uncached(prompt, context, max_tokens, temperature)
+            )
+            if cached:
+                yield {"type": "token", "content": cached["content"]}
+                yield {
+                    "type": "done",
+                    "provider": cached.get("provider"),
+                    "usage": cached.get("usage"),
+                    "cached": True,
+                    "elapsed_ms": round((time.monotonic() - started) * 1000, 1)
+                }
+                return
+
+        handlers = {
+            "openai": self._stream_openai_response,
+            "anthropic": self._stream_anthropic_response,
+            "google": self._stream_google_response,
+            "cohere": self._stream_cohere_response,
+            "simulated": self._stream_simulated_response
+        }
+
+        for provider in self.router.rank(self._available_providers()):
+            breaker = self.router.breaker_for(provider)
+            if not await breaker.allow_request():
+                continue
+
+            usage: Dict[str, Any] = {}
+            chunks: List[str] = []
+            first_token_ms = None
+            stream = handlers[provider](prompt, context, max_tokens, temperature, usage)
+            try:
+                async for text in stream:
+                    if not text:
+                        continue
+                    if first_token_ms is None:
+                        first_token_ms = round((time.monotonic() - started) * 1000, 1)
+                    chunks.append(text)
+                    yield {"type": "token", "content": text}
+            except (asyncio.CancelledError, GeneratorExit):
+                # Client went away: closing the stream below aborts the upstream call
+                await breaker.release_probe()
+                raise
+            except Exception as e:
+                logger.warning(f"Provider {provider} stream failed: {e}")
+                await breaker.record_failure(e)
+                if chunks:
+                    # Tokens were already sent, so another provider cannot take over
+                    yield {"type": "error", "provider": provider, "error": str(e)}
+                    return
+                continue
+            finally:
+                await stream.aclose()
+
+            await breaker.record_success()
+            content = "".join(chunks)
+            usage["chunks"] = len(chunks)
+            if cacheable:
+                response = {"success": True, "provider": provider, "content": content, "usage": usage}
+                await self.cache.set(key, response, content_type)
+                if scope:
+                    await self.semantic_cache.set(query, scope, response, self.cache.ttl_for(content_type))
+            yield {
+                "type": "done",
+                "provider": provider,
+                "usage": usage,
+                "cached": False,
+                "first_token_ms": first_token_ms,
+                "elapsed_ms": round((time.monotonic() - started) * 1000, 1)
+            }
+            return
+
+        yield {
+            "type": "error",
+            "error": "All AI providers are unavailable",
+            "content": "I'm sorry, but I'm currently unable to process your request. Please try again later."
+        }
+
+    async def _stream_openai_response(
+        self, 
+        prompt: str, 
+        context: Optional[str],
+        max_tokens: Optional[int],
+        temperature: Optional[float],
+        usage: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        """Stream response tokens from OpenAI"""
+        full_prompt = self.budgeter.fit("openai", prompt, context, max_tokens)
+        stream = await self.openai_client.chat.completions.create(
+            model=settings.OPENAI_MODEL,
+            messages=[{"role": "user", "content": full_prompt}],
+            max_tokens=max_tokens or settings.OPENAI_MAX_TOKENS,
+            temperature=temperature or settings.OPENAI_TEMPERATURE,
+            stream=True,
+            # The final chunk then carries the token counts, with no choices
+            extra_body={"stream_options": {"include_usage": True}}
+        )
+        parts: List[str] = []
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+                reported = getattr(chunk, "usage", None)
+                if reported:
+                    reported = reported if isinstance(reported, dict) else reported.dict()
+                    usage["prompt_tokens"] = reported.get("prompt_tokens")
+                    usage["completion_tokens"] = reported.get("completion_tokens")
+        finally:
+            await stream.response.aclose()
+        self._complete_usage("openai", full_prompt, "".join(parts), usage)
+
+    async def _stream_anthropic_response(
+        self, 
+        prompt: str, 
+        context: Optional[str],
+        max_tokens: Optional[int],
+        temperature: Optional[float],
+        usage: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        """Stream response tokens from Anthropic"""
+        full_prompt = self.budgeter.fit("anthropic", prompt, context, max_tokens)
+        stream = await self.anthropic_client.messages.create(
+            model=settings.ANTHROPIC_MODEL,
+            max_tokens=max_tokens or settings.ANTHROPIC_MAX_TOKENS,
+            temperature=temperature or 0.7,
+            messages=[{"role": "user", "content": full_prompt}],
+            stream=True
+        )
+        parts: List[str] = []
+        try:
+            async for event in stream:
+                if event.type == "message_start":
+                    usage["prompt_tokens"] = event.message.usage.input_tokens
+                elif event.type == "content_block_delta":
+                    parts.append(event.delta.text)
+                    yield event.delta.text
+                elif event.type == "message_delta":
+                    usage["completion_tokens"] = event.usage.output_tokens
+        finally:
+            await stream.response.aclose()
+        self._complete_usage("anthropic", full_prompt, "".join(parts), usage)
+
+    async def _stream_google_response(
+        self, 
+        prompt: str, 
+        context: Optional[str],
+        max_tokens: Optional[int],
+        temperature: Optional[float],
+        usage: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        """Stream response tokens from Google AI"""
+        full_prompt = self.budgeter.fit("google", prompt, context, max_tokens)
+        response = await self.google_genai.generate_content_async(
+            full_prompt,
+            generation_config=self.sdks["google"].types.GenerationConfig(
+                max_output_tokens=max_tokens or 4000,
+                temperature=temperature or 0.7
+            ),
+            stream=True
+        )
+        parts: List[str] = []
+        try:
+            async for chunk in response:
+                parts.append(chunk.text)
+                yield chunk.text
+                # Newer SDKs report counts on each chunk, the last one holding the totals
+                reported = getattr(chunk, "usage_metadata", None)
+                if reported:
+                    usage["prompt_tokens"] = reported.prompt_token_count
+                    usage["completion_tokens"] = reported.candidates_token_count
+        finally:
+            # The response has no close of its own; ending its iterator over the RPC releases the call
+            iterator = getattr(response, "_iterator", None)
+            if hasattr(iterator, "aclose"):
+                await iterator.aclose()
+        self._complete_usage("google", full_prompt, "".join(parts), usage)
+
+    async def _stream_cohere_response(
+        self, 
+        prompt: str, 
+        context: Optional[str],
+        max_tokens: Optional[int],
+        temperature: Optional[float],
+        usage: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        """Stream response tokens from Cohere"""
+        full_prompt = self.budgeter.fit("cohere", prompt, context, max_tokens)
+        stream = await self.cohere_client.generate(
+            model=settings.COHERE_MODEL,
+            prompt=full_prompt,
+            max_tokens=max_tokens or 4000,
+            temperature=temperature or 0.7,
+            stream=True
+        )
+        parts: List[str] = []
+        try:
+            async for token in stream:
+                if not token.is_finished:
+                    parts.append(token.text)
+                    yield token.text
+        finally:
+            # The aiohttp response; closing drops the connection instead of leaving it to the collector
+            stream.response.close()
+        # The stream-end event's response carries the billed units
+        meta = getattr(stream.generations, "meta", None) or {}
+        billed = meta.get("billed_units") or {}
+        usage["prompt_tokens"] = billed.get("input_tokens")
+        usage["completion_tokens"] = billed.get("output_tokens")
+        self._complete_usage("cohere", full_prompt, "".join(parts), usage)
+
+    async def _stream_simulated_response(
+        self, 
+        prompt: str, 
+        context: Optional[str],
+        max_tokens: Optional[int],
+        temperature: Optional[float],
+        usage: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        """Stream response tokens from the simulated provider"""
+        full_prompt = self.budgeter.fit("simulated", prompt, context, max_tokens)
+        async for text in self.simulated_client.stream(full_prompt, max_tokens, usage):
+            yield text
+
+    def _complete_usage(self, provider: str, full_prompt: str, content: str, usage: Dict[str, Any]):
+        """Fill in token counts a provider stream did not report, counted with the local tokenizer"""
+        estimated = False
+        if usage.get("prompt_tokens") is None:
+            usage["prompt_tokens"] = self.budgeter.count(full_prompt, provider)
+            estimated = True
+        if usage.get("completion_tokens") is None:
+            usage["completion_tokens"] = self.budgeter.count(content, provider)
+            estimated = True
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        if estimated:
+            usage["estimated"] = True
+
+    def _content_prompt(self, prompt: str, content_type: str, difficulty: str, max_length: Optional[int]) -> str:
+        """Build the prompt for educational content generation"""
+        length = f" in at most {max_length} words" if max_length else ""
+        return (
+            f"Write a {content_type} for {difficulty} level students{length}.\n\n"
+            f"Topic: {prompt}"
+        )
+
+    def _explanation_prompt(self, concept: str, difficulty: str, max_length: Optional[int], structured: bool) -> str:
+        """Build the prompt for explaining a concept"""
+        length = f" in at most {max_length} words" if max_length else ""
+        prompt = f"Explain the concept \"{concept}\" to a {difficulty} level student{length}."
+        if structured:
+            prompt += """
+            
+            Respond with JSON format:
+            {
+                "explanation": "clear explanation",
+                "examples": ["list of examples"],
+                "related_concepts": ["list of related concepts"]
+            }
+            """
+        return prompt
+
+    def _max_tokens_for(self, max_length: Optional[int]) -> Optional[int]:
+        """Translate a word budget into a completion token limit"""
+        return max_length * 2 if max_length else None
+
+    async def generate_content(
+        self, 
+        prompt: str, 
+        content_type: str = "lesson", 
+        difficulty: str = "intermediate", 
+        max_length: Optional[int] = None,
+        class_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Generate educational content grounded in the class material"""
+        response = await self.generate_response(
+            self._content_prompt(prompt, content_type, difficulty, max_length),
+            context=await self.retriever.build_context(prompt, class_id),
+            max_tokens=self._max_tokens_for(max_length),
+            content_type=content_type,
+            query=prompt,
+            class_id=class_id
+        )
+        if not response["success"]:
+            return None
+        usage = response.get("usage") or {}
+        return {
+            "content": response["content"],
+            "metadata": {
+                "provider": response.get("provider"),
+                "content_type": content_type,
+                "difficulty": difficulty,
+                "cached": response.get("cached", False)
+            },
+            "tokens_used": usage.get("total_tokens", 0)
+        }
+
+    async def stream_content(
+        self, 
+        prompt: str, 
+        content_type: str = "lesson", 
+        difficulty: str = "intermediate", 
+        max_length: Optional[int] = None,
+        class_id: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream educational content grounded in the class material"""
+        events = self.stream_response(
+            self._content_prompt(prompt, content_type, difficulty, max_length),
+            context=await self.retriever.build_context(prompt, class_id),
+            max_tokens=self._max_tokens_for(max_length),
+            content_type=content_type,
+            query=prompt,
+            class_id=class_id
+        )
+        # Closing this stream must close the provider stream straight away
+        try:
+            async for event in events:
+                yield event
+        finally:
+            await events.aclose()
+
+    async def explain_concept(
+        self, 
+        concept: str, 
+        difficulty: str = "intermediate", 
+        max_length: Optional[int] = None,
+        class_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Explain a concept with examples and related concepts, drawing on the class material"""
+        response = await self.generate_response(
+            self._explanation_prompt(concept, difficulty, max_length, structured=True),
+            context=await self.retriever.build_context(concept, class_id),
+            max_tokens=self._max_tokens_for(max_length),
+            content_type="explanation",
+            query=concept,
+            class_id=class_id
+        )
+        if not response["success"]:
+            return None
+        try:
+            return json.loads(response["content"])
+        except json.JSONDecodeError:
+            return {
+                "explanation": response["content"],
+                "examples": [],
+                "related_concepts": []
+            }
+
+    async def stream_explanation(
+        self, 
+        concept: str, 
+        difficulty: str = "intermediate", 
+        max_length: Optional[int] = None,
+        class_id: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream a plain-text explanation of a concept, drawing on the class material"""
+        events = self.stream_response(
+            self._explanation_prompt(concept, difficulty, max_length, structured=False),
+            context=await self.retriever.build_context(concept, class_id),
+            max_tokens=self._max_tokens_for(max_length),
+            content_type="explanation",
+            query=concept,
+            class_id=class_id
+        )
+        try:
+            async for event in events:
+                yield event
+        finally:
+            await events.aclose()
+
+    async def get_service_status(self) -> Dict[str, Any]:
+        """Get provider availability and cache statistics"""
+        return {
+            "current_provider": self.current_provider,
+            "fallback_providers": self.fallback_providers,
+            "providers": {
+                "openai": self.openai_client is not None,
+                "anthropic": self.anthropic_client is not None,
+                "google": self.google_genai is not None,
+                "cohere": self.cohere_client is not None
+            },
+            "cache": await self.cache.get_stats(),
+            "single_flight": self.inflight.get_stats(),
+            "routing": self.router.get_stats(),
+            "blocking_calls": blocking_executor.get_stats(),
+            "tts_cache": audio_store.get_stats(),
+            "question_pool": self.question_pool.get_stats(),
+            "prompt_budget": self.budgeter.get_stats(),
+            "embeddings": self.embeddings.get_stats(),
+            "retrieval": self.retriever.get_stats(),
+            "semantic_cache": await self.semantic_cache.get_stats(),
+            "sdk_import_ms": self.sdk_import_ms,
+            "missing_sdks": self.missing_sdks,
+            "simulated": self.simulated_client.get_stats() if self.simulated_client else None,
+            "moderation": {
+                **self.local_moderator.get_stats(),
+                "batching": self.moderation_batcher.get_stats()
+            },
+            "circuit_breakers": {
+                provider: {
+                    **await self.router.breaker_for(provider).describe(),
+                    "health_score": self.router.health_score(provider)
+                }
+                for provider in self._available_providers()
+            }
+        }
+
+    async def moderate_content(self, content: str, content_type: str = "text") -> Dict[str, Any]:
+        """Moderate content locally, escalating only ambiguous messages to the LLM"""
+        decision = self.local_moderator.evaluate(content)
+        if decision["verdict"] != ESCALATE:
+            return self.local_moderator.to_result(content, decision)
+
         try:
-            moderation_prompt = f"""
+            if settings.MODERATION_BATCH_ENABLED:
+                verdict = await self.moderation_batcher.submit(content)
+            else:
+                verdict = await self._moderate_with_llm(content)
+            if verdict is not None:
+                return {"content": content, "flags": decision["matches"], **verdict}
+            reason = "AI moderation failed, using local filtering"
+        except Exception as e:
+            logger.error(f"Content moderation error: {e}")
+            reason = "Moderation service unavailable"
+
+        return self.local_moderator.to_result(content, decision, reason)
+
+    async def _moderate_with_llm(self, content: str) -> Optional[Dict[str, Any]]:
+        """Moderate a single message with the LLM; None if no usable verdict came back"""
+        moderation_prompt = f"""
             Please analyze the following content and determine if it's appropriate for an educational platform.
             Content: {content}
             
@@ -244,51 +886,20 @@ class AIService:
             }}
             """
             
-            response = await self.generate_response(moderation_prompt)
-            
-            if response["success"]:
-                try:
-                    # Try to parse JSON response
-                    parsed = json.loads(response["content"])
-                    return parsed
-                except json.JSONDecodeError:
-                    # If not JSON, use simple heuristic
-                    inappropriate_words = ["hate", "violence", "discrimination", "harassment"]
-                    is_appropriate = not any(word in content.lower() for word in inappropriate_words)
-                    return {
-                        "is_appropriate": is_appropriate,
-                        "content": content,
-                        "reason": "AI moderation unavailable, using basic filtering",
-                        "severity": "low"
-                    }
-            else:
-                # Fallback to basic filtering
-                inappropriate_words = ["hate", "violence", "discrimination", "harassment"]
-                is_appropriate = not any(word in content.lower() for word in inappropriate_words)
-                return {
-                    "is_appropriate": is_appropriate,
-                    "content": content,
-                    "reason": "AI moderation failed, using basic filtering",
-                    "severity": "low"
-                }
-                
-        except Exception as e:
-            logger.error(f"Content moderation error: {e}")
-            # Fallback to basic filtering
-            inappropriate_words = ["hate", "violence", "discrimination", "harassment"]
-            is_appropriate = not any(word in content.lower() for word in inappropriate_words)
-            return {
-                "is_appropriate": is_appropriate,
-                "content": content,
-                "reason": "Moderation service unavailable",
-                "severity": "low"
-            }
+        response = await self.generate_response(moderation_prompt, content_type="moderation")
+        if not response["success"]:
+            return None
+        try:
+            return json.loads(response["content"])
+        except json.JSONDecodeError:
+            return None
 
     async def generate_quiz_questions(
         self, 
         topic: str, 
         difficulty: str = "medium", 
-        num_questions: int = 5
+        num_questions: int = 5,
+        use_cache: bool = True
     ) -> Dict[str, Any]:
         """Generate quiz questions using AI"""
         try:
@@ -308,7 +919,7 @@ class AIService:
             }}
             """
             
-            response = await self.generate_response(prompt)
+            response = await self.generate_response(prompt, content_type="quiz", use_cache=use_cache)
             
             if response["success"]:
                 try:
@@ -336,32 +947,98 @@ class AIService:
                 "questions": []
             }
 
+    async def generate_learning_path(
+        self,
+        user_id: str,
+        subject: str,
+        current_level: str,
+        goals: List[str]
+    ) -> Dict[str, Any]:
+        """Generate a personalized learning path"""
+        try:
+            prompt = f"""
+            Create a personalized learning path in {subject} for a {current_level} level student.
+            Goals: {json.dumps(goals)}
+            
+            Format the response as JSON:
+            {{
+                "path": [
+                    {{
+                        "title": "Step title",
+                        "description": "What the student learns",
+                        "difficulty": "beginner/intermediate/advanced",
+                        "estimated_time": "time to complete this step"
+                    }}
+                ],
+                "estimated_duration": "total time to complete the path",
+                "difficulty_progression": ["difficulty of each step"]
+            }}
+            """
+            
+            response = await self.generate_response(prompt, content_type="learning_path")
+            
+            if response["success"]:
+                try:
+                    parsed = json.loads(response["content"])
+                    return {
+                        "success": True,
+                        "user_id": user_id,
+                        "path": parsed.get("path", []),
+                        "estimated_duration": parsed.get("estimated_duration", "Unknown"),
+                        "difficulty_progression": parsed.get("difficulty_progression", [])
+                    }
+                except json.JSONDecodeError:
+                    return {
+                        "success": False,
+                        "error": "Failed to parse AI response",
+                        "path": []
+                    }
+            else:
+                return response
+                
+        except Exception as e:
+            logger.error(f"Learning path generation error: {e}")
+            return {
+                "success": False,
+                "error": str(e),
+                "path": []
+            }
+
     async def text_to_speech(self, text: str, voice_id: Optional[str] = None) -> Dict[str, Any]:
-        """Convert text to speech using ElevenLabs"""
+        """Convert text to speech using ElevenLabs, reusing previously synthesized audio"""
         try:
-            if not settings.ELEVENLABS_API_KEY:
+            if "elevenlabs" not in self.sdks:
                 return {
                     "success": False,
                     "error": "ElevenLabs API key not configured"
                 }
             
             voice = voice_id or settings.ELEVENLABS_VOICE_ID
+            audio_id = audio_store.audio_id(text, voice, settings.ELEVENLABS_MODEL)
             
-            audio = generate(
-                text=text,
-                voice=voice,
-                model="eleven_monolingual_v1"
-            )
-            
-            # Save audio to file
-            filename = f"tts_{hash(text)}.mp3"
-            save(audio, filename)
+            path = await audio_store.get(audio_id)
+            cached = path is not None
+            if not cached:
+                async def synthesize():
+                    audio = await blocking_executor.run(
+                        "elevenlabs",
+                        self.sdks["elevenlabs"].generate,
+                        text=text,
+                        voice=voice,
+                        model=settings.ELEVENLABS_MODEL
+                    )
+                    return await audio_store.put(audio_id, audio)
+
+                # Concurrent requests for the same narration share one synthesis
+                path = await self.inflight.do(f"tts:{audio_id}", synthesize)
             
             return {
                 "success": True,
-                "filename": filename,
+                "audio_id": audio_id,
+                "filename": str(path),
                 "voice": voice,
-                "text": text
+                "text": text,
+                "cached": cached
             }
             
         except Exception as e:
@@ -374,18 +1051,24 @@ class AIService:
     async def speech_to_text(self, audio_file: str) -> Dict[str, Any]:
         """Convert speech to text using AssemblyAI"""
         try:
-            if not settings.ASSEMBLYAI_API_KEY:
+            if "assemblyai" not in self.sdks:
                 return {
                     "success": False,
                     "error": "AssemblyAI API key not configured"
                 }
             
+            aai = self.sdks["assemblyai"]
             config = aai.TranscriptionConfig(
                 language_code="en",
                 speaker_labels=True
             )
             
-            transcript = aai.Transcriber().transcribe(audio_file, config)
+            transcript = await blocking_executor.run(
+                "assemblyai",
+                aai.Transcriber().transcribe,
+                audio_file,
+                config
+            )
             
             return {
                 "success": True,
@@ -411,8 +1094,8 @@ class AIService:
             prompt = f"""
             Analyze the following student data and provide personalized learning recommendations:
             
-            Student Data: {json.dumps(student_data, indent=2)}
-            Learning Objectives: {json.dumps(learning_objectives, indent=2)}
+            Student Data: {self.budgeter.compact_json(student_data)}
+            Learning Objectives: {self.budgeter.compact_json(learning_objectives)}
             
             Provide analysis in JSON format:
             {{
@@ -447,4 +1130,7 @@ class AIService:
             return {
                 "success": False,
                 "error": str(e)
-            } 
\ No newline at end of file
+            }
+
+# Global instance
+ai_service = AIService()
\ No newline at end of file
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import uuid
+from typing import Any, AsyncIterator, Dict
+
+from .ai_service import ai_service
+from .config import settings
+from .websocket_manager import websocket_manager
+
+logger = logging.getLogger(__name__)
+
+class AIStreamManager:
+    """Run AI requests started over a WebSocket and push their tokens back as frames"""
+
+    def __init__(self):
+        self.tasks: Dict[str, Dict[str, asyncio.Task]] = {}
+
+    async def start(self, user_id: str, message: Dict[str, Any]):
+        """Start streaming an AI answer for a user without blocking the socket loop"""
+        request_id = message.get("request_id") or uuid.uuid4().hex
+        try:
+            message = self._validate(message)
+        except ValueError as e:
+            await self._send(user_id, request_id, {"type": "ai_error", "error": str(e)})
+            return
+        user_tasks = self.tasks.setdefault(user_id, {})
+
+        if request_id in user_tasks:
+            await self._send(user_id, request_id, {"type": "ai_error", "error": "Duplicate request_id"})
+            return
+        if len(user_tasks) >= settings.AI_WS_MAX_CONCURRENT_REQUESTS:
+            await self._send(user_id, request_id, {"type": "ai_error", "error": "Too many concurrent AI requests"})
+            return
+
+        task = asyncio.create_task(self._run(user_id, request_id, message))
+        user_tasks[request_id] = task
+        task.add_done_callback(lambda _: self._forget(user_id, request_id))
+
+    async def cancel(self, user_id: str, request_id: str) -> bool:
+        """Cancel one request; the upstream provider stream is closed with it"""
+        task = self.tasks.get(user_id, {}).get(request_id)
+        if task is None:
+            return False
+        task.cancel()
+        return True
+
+    async def cancel_all(self, user_id: str):
+        """Cancel every request a user has in flight"""
+        for task in list(self.tasks.get(user_id, {}).values()):
+            task.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get the number of AI streams currently running"""
+        return {
+            "users": len(self.tasks),
+            "streams": sum(len(tasks) for tasks in self.tasks.values())
+        }
+
+    def _validate(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Check a client's AI request, clamping its generation limits to the configured maximums"""
+        prompt = message.get("prompt")
+        if not isinstance(prompt, str) or not prompt.strip():
+            raise ValueError("ai_request needs a prompt")
+        limits = {
+            "max_tokens": (int, 1, settings.AI_WS_MAX_TOKENS),
+            # Explanations ask for about two tokens per word
+            "max_length": (int, 1, settings.AI_WS_MAX_TOKENS // 2),
+            "temperature": (float, 0.0, settings.AI_WS_MAX_TEMPERATURE)
+        }
+        request = dict(message)
+        for field, (kind, low, high) in limits.items():
+            value = message.get(field)
+            if value is None:
+                continue
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f"{field} must be a number")
+            request[field] = min(max(kind(value), low), high)
+        return request
+
+    def _events(self, message: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        if message.get("mode") == "explain":
+            return ai_service.stream_explanation(
+                concept=message["prompt"],
+                difficulty=message.get("difficulty", "intermediate"),
+                max_length=message.get("max_length"),
+                class_id=message.get("class_id")
+            )
+        return ai_service.stream_response(
+            message["prompt"],
+            context=message.get("context"),
+            max_tokens=message.get("max_tokens"),
+            temperature=message.get("temperature"),
+            content_type=message.get("content_type", "default")
+        )
+
+    async def _run(self, user_id: str, request_id: str, message: Dict[str, Any]):
+        """Forward stream events to the user, tagged with the request id"""
+        events = None
+        try:
+            events = self._events(message)
+            async for event in events:
+                await self._send(user_id, request_id, {**event, "type": f"ai_{event['type']}"})
+        except asyncio.CancelledError:
+            await self._send(user_id, request_id, {"type": "ai_cancelled"})
+            raise
+        except Exception as e:
+            logger.error(f"AI stream {request_id} for user {user_id} failed: {e}")
+            await self._send(user_id, request_id, {"type": "ai_error", "error": str(e)})
+        finally:
+            if events is not None:
+                await events.aclose()
+
+    async def _send(self, user_id: str, request_id: str, frame: Dict[str, Any]):
+        await websocket_manager.send_personal_message(user_id, {**frame, "request_id": request_id})
+
+    def _forget(self, user_id: str, request_id: str):
+        user_tasks = self.tasks.get(user_id)
+        if user_tasks is not None:
+            user_tasks.pop(request_id, None)
+            if not user_tasks:
+                del self.tasks[user_id]
+
+# Global instance
+ai_stream_manager = AIStreamManager()
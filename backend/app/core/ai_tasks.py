@@ -0,0 +1,69 @@
+import asyncio
+import logging
+
+from celery.signals import worker_process_init
+
+from .ai_jobs import JOB_TYPES, AIJobError, ai_job_queue
+from .ai_service import ai_service
+from .celery_app import ATTEMPT_TIMEOUT, celery_app
+from .config import settings
+from .redis_client import init_redis
+
+logger = logging.getLogger(__name__)
+
+_loop = None
+
+def run_async(coro):
+    """Run a coroutine on this worker process's event loop"""
+    # One long-lived loop per process, so the Redis pool and AI clients can be reused
+    global _loop
+    if _loop is None:
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+    return _loop.run_until_complete(coro)
+
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    """Connect each worker process to Redis and the AI providers"""
+    run_async(init_redis())
+    run_async(ai_service.initialize())
+
+@celery_app.task(
+    bind=True,
+    name="ai_jobs.run",
+    autoretry_for=(AIJobError,),
+    max_retries=settings.AI_JOB_MAX_RETRIES,
+    retry_backoff=True,
+    retry_backoff_max=settings.AI_JOB_RETRY_BACKOFF_MAX,
+    retry_jitter=True
+)
+def run_ai_job(self, job_id: str):
+    """Run one attempt of a queued AI job"""
+    run_async(execute_job(job_id, self.request.retries, self.request.retries >= self.max_retries))
+
+async def execute_job(job_id: str, attempt: int, final: bool):
+    """Run a job attempt and record its outcome; raises AIJobError when it should be retried"""
+    job = await ai_job_queue.mark_running(job_id, attempt)
+    if job is None:
+        logger.warning(f"AI job {job_id} expired before it ran")
+        return
+
+    method = getattr(ai_service, JOB_TYPES[job["job_type"]])
+    try:
+        # Stop short of the soft time limit so the outcome can still be recorded
+        result = await asyncio.wait_for(method(**job["params"]), ATTEMPT_TIMEOUT)
+    except TypeError as e:
+        await ai_job_queue.finish(job, error=f"Invalid parameters: {e}")
+        return
+    except asyncio.TimeoutError:
+        result = {"success": False, "error": "Job attempt timed out"}
+    except Exception as e:
+        result = {"success": False, "error": str(e)}
+
+    if result.get("success"):
+        await ai_job_queue.finish(job, result=result)
+    elif final:
+        await ai_job_queue.finish(job, error=result.get("error", "Job failed"))
+    else:
+        await ai_job_queue.mark_retrying(job, result.get("error", "Job failed"))
+        raise AIJobError(result.get("error"))
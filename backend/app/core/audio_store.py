@@ -0,0 +1,160 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from .blocking_executor import blocking_executor
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+AUDIO_ID = re.compile(r"^[0-9a-f]{64}$")
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+def parse_byte_range(header: str, size: int) -> Tuple[int, int]:
+    """Parse a single-range Range header into inclusive (start, end); ValueError if unsatisfiable"""
+    match = RANGE.match(header.strip())
+    if not match or not any(match.groups()):
+        raise ValueError(f"Unsupported range: {header}")
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # Suffix range: the last N bytes
+        start = max(0, size - int(last))
+        end = size - 1
+    if start > end or start >= size:
+        raise ValueError(f"Unsatisfiable range: {header}")
+    return start, end
+
+class AudioStore:
+    """Content-addressed on-disk audio cache with size-bounded LRU eviction"""
+
+    def __init__(self, root: str = None, max_bytes: int = None):
+        self.root = Path(root or settings.TTS_CACHE_DIR)
+        self.max_bytes = max_bytes or settings.TTS_CACHE_MAX_BYTES
+        self.index: "OrderedDict[str, int]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def audio_id(text: str, voice: str, model: str) -> str:
+        """Stable digest of everything that determines the synthesized audio"""
+        material = json.dumps([model, voice, text], ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def path_for(self, audio_id: str) -> Path:
+        """Get the file path for an audio id"""
+        if not AUDIO_ID.match(audio_id):
+            raise ValueError(f"Invalid audio id: {audio_id}")
+        return self.root / audio_id[:2] / f"{audio_id}.mp3"
+
+    async def get(self, audio_id: str) -> Optional[Path]:
+        """Get the path of a stored clip, marking it recently used"""
+        return await blocking_executor.run("audio_store", self._get, audio_id)
+
+    async def put(self, audio_id: str, data: bytes) -> Path:
+        """Store a clip atomically and evict the least recently used clips over the size bound"""
+        return await blocking_executor.run("audio_store", self._put, audio_id, data)
+
+    def _get(self, audio_id: str) -> Optional[Path]:
+        path = self.path_for(audio_id)
+        with self._lock:
+            self._load()
+            if not path.exists():
+                # Another worker may have evicted it
+                if audio_id in self.index:
+                    self.total_bytes -= self.index.pop(audio_id)
+                self.misses += 1
+                return None
+            try:
+                # Persist recency in the mtime so it survives restarts
+                os.utime(path)
+                size = path.stat().st_size
+            except FileNotFoundError:
+                # Evicted by another worker since the check above
+                self.total_bytes -= self.index.pop(audio_id, 0)
+                self.misses += 1
+                return None
+            if audio_id not in self.index:
+                self.index[audio_id] = size
+                self.total_bytes += size
+            self.index.move_to_end(audio_id)
+            self.hits += 1
+        return path
+
+    def _put(self, audio_id: str, data: bytes) -> Path:
+        path = self.path_for(audio_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-", suffix=".mp3")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(data)
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        with self._lock:
+            self._load()
+            self.total_bytes -= self.index.pop(audio_id, 0)
+            self.index[audio_id] = len(data)
+            self.total_bytes += len(data)
+            self._evict()
+        return path
+
+    def _load(self):
+        """Rebuild the LRU index from disk, oldest modification first"""
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.root.exists():
+            return
+        entries = []
+        for path in self.root.glob("*/*.mp3"):
+            stat = path.stat()
+            entries.append((stat.st_mtime, path.stem, stat.st_size))
+        for _, audio_id, size in sorted(entries):
+            self.index[audio_id] = size
+            self.total_bytes += size
+        self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self.index) > 1:
+            audio_id, size = self.index.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            try:
+                self.path_for(audio_id).unlink()
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning(f"Could not evict audio {audio_id}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get store size and hit counters"""
+        return {
+            "clips": len(self.index),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+# Global instance
+audio_store = AudioStore()
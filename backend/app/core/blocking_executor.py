@@ -0,0 +1,112 @@
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+class ExecutorSaturatedError(Exception):
+    """Raised when a service already has its maximum number of calls queued"""
+
+class BlockingCallTimeout(asyncio.TimeoutError):
+    """Raised when a blocking call does not finish within its timeout"""
+
+class BlockingExecutor:
+    """Bounded per-service thread pools that keep blocking SDK calls off the event loop"""
+
+    def __init__(self):
+        self.pools: Dict[str, ThreadPoolExecutor] = {}
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self.max_workers: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _limit(self, limits: Dict[str, Any], service: str) -> Any:
+        return limits.get(service, limits["default"])
+
+    def _pool_for(self, service: str) -> ThreadPoolExecutor:
+        if service not in self.pools:
+            self.max_workers[service] = self._limit(settings.BLOCKING_EXECUTOR_WORKERS, service)
+            self.pools[service] = ThreadPoolExecutor(
+                max_workers=self.max_workers[service],
+                thread_name_prefix=f"blocking-{service}"
+            )
+            self.stats[service] = {
+                "in_flight": 0, "running": 0, "submitted": 0, "completed": 0,
+                "failed": 0, "timeouts": 0, "cancelled": 0, "rejected": 0
+            }
+        return self.pools[service]
+
+    async def run(
+        self,
+        service: str,
+        fn: Callable[..., Any],
+        *args,
+        timeout: Optional[float] = None,
+        **kwargs
+    ) -> Any:
+        """Run a blocking callable on the service's pool and await its result"""
+        pool = self._pool_for(service)
+        stats = self.stats[service]
+        capacity = self.max_workers[service] + self._limit(settings.BLOCKING_EXECUTOR_MAX_QUEUE, service)
+        timeout = timeout or self._limit(settings.BLOCKING_CALL_TIMEOUTS, service)
+
+        with self._lock:
+            if stats["in_flight"] >= capacity:
+                stats["rejected"] += 1
+                raise ExecutorSaturatedError(f"Too many pending {service} calls")
+            stats["in_flight"] += 1
+            stats["submitted"] += 1
+
+        def call():
+            with self._lock:
+                stats["running"] += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    stats["running"] -= 1
+
+        future = pool.submit(call)
+        future.add_done_callback(functools.partial(self._finished, stats))
+        try:
+            # Cancelling the wrapper also cancels the call if it has not started yet
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                stats["timeouts"] += 1
+            raise BlockingCallTimeout(f"{service} call timed out after {timeout}s")
+
+    def _finished(self, stats: Dict[str, int], future):
+        with self._lock:
+            stats["in_flight"] -= 1
+            if future.cancelled():
+                stats["cancelled"] += 1
+            elif future.exception() is not None:
+                stats["failed"] += 1
+            else:
+                stats["completed"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue depth and outcome counters per service"""
+        with self._lock:
+            return {
+                service: {
+                    **stats,
+                    "queued": stats["in_flight"] - stats["running"],
+                    "max_workers": self.max_workers[service]
+                }
+                for service, stats in self.stats.items()
+            }
+
+    def shutdown(self):
+        """Stop every pool, dropping calls that have not started"""
+        for pool in self.pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        self.pools.clear()
+
+# Global instance
+blocking_executor = BlockingExecutor()
@@ -0,0 +1,40 @@
+from celery import Celery
+from kombu import Queue
+
+from .config import settings
+
+# An attempt gives up on its own first so it can record the outcome; the soft limit only
+# fires if the event loop is stuck, and the hard limit kills the process after that
+ATTEMPT_TIMEOUT = settings.AI_JOB_TIME_LIMIT - 30
+SOFT_TIME_LIMIT = settings.AI_JOB_TIME_LIMIT - 15
+
+# With the priority queue order strategy workers drain the lanes in the order given,
+# so list the high lane first:
+#   celery -A app.core.celery_app worker -Q ai_high,ai_default,ai_low
+celery_app = Celery(
+    "evolvelearn",
+    broker=settings.CELERY_BROKER_URL,
+    include=["app.core.ai_tasks"]
+)
+
+celery_app.conf.update(
+    task_queues=[Queue(name) for name in settings.AI_JOB_QUEUES.values()],
+    task_default_queue=settings.AI_JOB_QUEUES["default"],
+    task_serializer="json",
+    accept_content=["json"],
+    # Job state and results live in Redis under ai_job:*, not in a result backend
+    task_ignore_result=True,
+    # Long jobs: take one at a time and only acknowledge once finished
+    worker_prefetch_multiplier=1,
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    task_time_limit=settings.AI_JOB_TIME_LIMIT,
+    task_soft_time_limit=SOFT_TIME_LIMIT,
+    # Unacknowledged messages are redelivered after this, so it must outlast an attempt
+    # plus the longest retry countdown a worker holds a message for
+    broker_transport_options={
+        "visibility_timeout": settings.AI_JOB_TIME_LIMIT + settings.AI_JOB_RETRY_BACKOFF_MAX + 60,
+        # The Redis transport otherwise round-robins between the lanes
+        "queue_order_strategy": "priority"
+    }
+)
@@ -0,0 +1,177 @@
+import json
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict
+
+from .config import settings
+from .redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Compare-and-set: move the shared state on only if it is still what this worker last saw
+# (an open breaker also by when it opened), so every transition happens exactly once however
+# many workers reach it. The probe count starts afresh only when the breaker opens.
+TRANSITION = """
+local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+if state ~= ARGV[1] or (state == 'open' and redis.call('HGET', KEYS[1], 'opened_at') ~= ARGV[2]) then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'state', ARGV[3], 'failures', ARGV[4], 'opened_at', ARGV[5])
+if ARGV[3] == 'open' then
+    redis.call('DEL', KEYS[2])
+end
+redis.call('LPUSH', KEYS[3], ARGV[6])
+redis.call('LTRIM', KEYS[3], 0, 19)
+return 1
+"""
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected by an open circuit breaker"""
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker whose state is shared by all workers through Redis"""
+
+    def __init__(self, name: str, prefix: str = "ai_breaker"):
+        self.name = name
+        self.key = f"{prefix}:{name}"
+        self.probe_key = f"{self.key}:probes"
+        self.transitions_key = f"{self.key}:transitions"
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self.transitions: Deque[Dict[str, Any]] = deque(maxlen=20)
+        self._synced_at = 0.0
+
+    def available(self) -> bool:
+        """Cheap local check used when ranking providers; never consumes a probe"""
+        if self.state == OPEN:
+            return time.time() - self.opened_at >= settings.AI_BREAKER_RECOVERY_TIMEOUT
+        return True
+
+    async def allow_request(self) -> bool:
+        """Decide whether a call may go through, reserving a probe slot when half-open"""
+        await self.sync()
+
+        if self.state == OPEN and time.time() - self.opened_at >= settings.AI_BREAKER_RECOVERY_TIMEOUT:
+            # Whichever worker loses this race picks up the state the winner left
+            await self._transition(HALF_OPEN, "recovery timeout elapsed")
+
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and await self._reserve_probe():
+            return True
+        self.rejected += 1
+        return False
+
+    async def record_success(self):
+        """Record a successful call"""
+        if self.state == HALF_OPEN:
+            await self._transition(CLOSED, "probe succeeded")
+        elif self.failures:
+            self.failures = 0
+            await self._write({"failures": 0})
+
+    async def record_failure(self, error: Exception = None):
+        """Record a failed call, opening the breaker past the threshold"""
+        if self.state == HALF_OPEN:
+            await self._transition(OPEN, f"probe failed: {error}")
+            return
+
+        self.failures = await self._increment_failures()
+        if self.state == CLOSED and self.failures >= settings.AI_BREAKER_FAILURE_THRESHOLD:
+            await self._transition(OPEN, f"{self.failures} consecutive failures: {error}")
+
+    async def release_probe(self):
+        """Give back a probe slot whose call was cancelled before it finished"""
+        if self.state == HALF_OPEN:
+            try:
+                await redis_client.redis.decr(self.probe_key)
+            except Exception as e:
+                logger.debug(f"Circuit breaker {self.name} probe release failed: {e}")
+
+    async def sync(self, force: bool = False):
+        """Refresh the local view from Redis, at most once per sync interval"""
+        now = time.monotonic()
+        if not force and now - self._synced_at < settings.AI_BREAKER_SYNC_INTERVAL:
+            return
+        self._synced_at = now
+        try:
+            shared = await redis_client.redis.hgetall(self.key)
+        except Exception as e:
+            logger.debug(f"Circuit breaker {self.name} running on local state: {e}")
+            return
+        if shared:
+            self.state = shared.get("state", self.state)
+            self.failures = int(shared.get("failures", self.failures))
+            self.opened_at = float(shared.get("opened_at", self.opened_at))
+
+    async def describe(self) -> Dict[str, Any]:
+        """Get the shared breaker state and its recent transitions"""
+        await self.sync(force=True)
+        transitions = list(self.transitions)
+        try:
+            shared = await redis_client.redis.lrange(self.transitions_key, 0, 19)
+            if shared:
+                transitions = [json.loads(entry) for entry in shared]
+        except Exception as e:
+            logger.debug(f"Circuit breaker {self.name} transitions unavailable: {e}")
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "opened_at": self.opened_at or None,
+            "rejected": self.rejected,
+            "transitions": transitions
+        }
+
+    async def _transition(self, state: str, reason: str):
+        """Move to a new state in Redis and locally, or follow another worker that moved first"""
+        previous = self.state
+        opened_at = time.time() if state == OPEN else self.opened_at
+        failures = 0 if state == CLOSED else self.failures
+        transition = {"from": previous, "to": state, "at": time.time(), "reason": reason}
+
+        try:
+            moved = await redis_client.redis.eval(
+                TRANSITION, 3, self.key, self.probe_key, self.transitions_key,
+                previous, self.opened_at, state, failures, opened_at, json.dumps(transition)
+            )
+        except Exception as e:
+            logger.debug(f"Circuit breaker {self.name} state not shared: {e}")
+            moved = True
+        if not moved:
+            await self.sync(force=True)
+            return
+
+        self.state, self.failures, self.opened_at = state, failures, opened_at
+        self.transitions.appendleft(transition)
+        logger.warning(f"Circuit breaker {self.name}: {previous} -> {state} ({reason})")
+
+    async def _reserve_probe(self) -> bool:
+        """Take one of the half-open probe slots shared across workers"""
+        try:
+            taken = await redis_client.redis.incr(self.probe_key)
+            if taken == 1:
+                await redis_client.redis.expire(self.probe_key, int(settings.AI_BREAKER_RECOVERY_TIMEOUT) or 1)
+            return taken <= settings.AI_BREAKER_HALF_OPEN_PROBES
+        except Exception as e:
+            logger.debug(f"Circuit breaker {self.name} probing on local state: {e}")
+            return True
+
+    async def _increment_failures(self) -> int:
+        """Count a consecutive failure across all workers"""
+        try:
+            return await redis_client.incr(self.key, field="failures")
+        except Exception:
+            return self.failures + 1
+
+    async def _write(self, fields: Dict[str, Any]):
+        try:
+            await redis_client.redis.hset(self.key, mapping=fields)
+        except Exception as e:
+            logger.debug(f"Circuit breaker {self.name} state not shared: {e}")
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List, Optional
+from typing import Dict, List, Optional
 import os
 
 class Settings(BaseSettings):
@@ -60,6 +60,9 @@ class Settings(BaseSettings):
     # ElevenLabs Configuration
     ELEVENLABS_API_KEY: str = os.getenv("VITE_ELEVENLABS_API_KEY", "")
     ELEVENLABS_VOICE_ID: str = "21m00Tcm4TlvDq8ikWAM"
+    ELEVENLABS_MODEL: str = "eleven_monolingual_v1"
+    TTS_CACHE_DIR: str = "tts_cache"
+    TTS_CACHE_MAX_BYTES: int = 512 * 1024 * 1024  # 512 MB
     
     # AssemblyAI Configuration
     ASSEMBLYAI_API_KEY: str = os.getenv("VITE_ASSEMBLYAI_API_KEY", "")
@@ -83,9 +86,152 @@ class Settings(BaseSettings):
     ENABLE_DEMO_MODE: bool = True
     
     # AI Service Configuration
-    AI_PROVIDER: str = "openai"  # openai, anthropic, google, azure
+    AI_PROVIDER: str = "openai"  # openai, anthropic, google, azure, simulated
     AI_FALLBACK_PROVIDERS: List[str] = ["anthropic", "google"]
-    
+
+    # Simulated AI Provider Configuration (load testing without provider quota)
+    AI_SIM_SEED: int = 42
+    AI_SIM_LATENCY_MEDIAN_MS: float = 800.0
+    AI_SIM_LATENCY_P99_MS: float = 4000.0
+    AI_SIM_TOKENS_PER_SECOND: float = 50.0  # streaming rate after the first token
+    AI_SIM_ERROR_RATE: float = 0.0  # fraction of requests that fail
+    AI_SIM_RATE_LIMIT_RATE: float = 0.0  # fraction of requests answered with a rate limit
+    AI_SIM_RATE_LIMIT_RPM: int = 0  # hard requests-per-minute limit, 0 for none
+    AI_SIM_FLAG_RATE: float = 0.05  # fraction of moderated messages judged inappropriate
+    AI_SIM_MAX_TEXT_TOKENS: int = 400
+
+    # AI Response Cache Configuration
+    AI_CACHE_ENABLED: bool = True
+    AI_CACHE_MAX_TEMPERATURE: float = 0.7  # calls above this are never cached
+    AI_CACHE_TTLS: Dict[str, int] = {
+        "default": 3600,
+        "lesson": 86400,
+        "explanation": 86400,
+        "summary": 86400,
+        "quiz": 1800,
+        "moderation": 600,
+    }
+    AI_SINGLE_FLIGHT_TIMEOUT: float = 60.0  # seconds before coalesced waiters give up
+
+    # AI Provider Routing Configuration
+    AI_ROUTER_LATENCY_WINDOW: int = 200  # latency samples kept per provider
+    AI_ROUTER_ERROR_DECAY: float = 0.1  # weight of the newest call in the error-rate estimate
+    AI_ROUTER_MAX_ERROR_RATE: float = 0.5  # providers above this are tried last
+    AI_PROVIDER_MAX_CONCURRENCY: int = 32
+    AI_HEDGE_ENABLED: bool = True
+    AI_HEDGE_PERCENTILE: float = 95.0  # hedge once the primary is slower than this percentile
+    AI_HEDGE_MIN_SAMPLES: int = 20
+    AI_HEDGE_DEFAULT_DELAY: float = 8.0  # seconds, used until enough samples exist
+    AI_HEDGE_BUDGET_RATIO: float = 0.1  # hedge budget earned per routed request
+    AI_HEDGE_MAX_BURST: int = 5
+
+    # AI Provider Circuit Breaker Configuration
+    AI_BREAKER_FAILURE_THRESHOLD: int = 5  # consecutive failures before opening
+    AI_BREAKER_RECOVERY_TIMEOUT: float = 30.0  # seconds open before a probe is allowed
+    AI_BREAKER_HALF_OPEN_PROBES: int = 1
+    AI_BREAKER_SYNC_INTERVAL: float = 1.0  # seconds between reads of the shared state
+
+    # Blocking SDK Call Configuration (ElevenLabs, AssemblyAI)
+    BLOCKING_EXECUTOR_WORKERS: Dict[str, int] = {"default": 4, "elevenlabs": 4, "assemblyai": 4, "vector_index": 1}
+    BLOCKING_EXECUTOR_MAX_QUEUE: Dict[str, int] = {"default": 32}  # waiting calls beyond the workers
+    BLOCKING_CALL_TIMEOUTS: Dict[str, float] = {"default": 60.0, "elevenlabs": 60.0, "assemblyai": 300.0, "vector_index": 600.0}
+
+    # Content Moderation Configuration
+    MODERATION_EXTRA_DENY_TERMS: List[str] = []
+    MODERATION_EXTRA_ESCALATE_TERMS: List[str] = []
+    MODERATION_CACHE_SIZE: int = 10000  # normalized messages remembered by the local tier
+    MODERATION_FAIL_CLOSED: bool = False  # block escalated messages when LLM moderation is unavailable; deny terms are always blocked
+    MODERATION_BATCH_ENABLED: bool = True
+    MODERATION_BATCH_WINDOW_MS: int = 50  # how long to gather messages before sending a batch
+    MODERATION_BATCH_MAX_SIZE: int = 20
+
+    # WebSocket Configuration
+    WS_SEND_TIMEOUT: float = 5.0  # seconds a send may take before the connection is dropped
+    WS_SEND_QUEUE_SIZE: int = 256  # frames waiting per connection before the overflow policy applies
+    WS_OVERFLOW_POLICY: str = "coalesce"  # "drop_oldest", "coalesce" (superseded presence first) or "disconnect"
+    WS_SLOW_CONSUMER_CLOSE_CODE: int = 1013  # close code when the disconnect policy drops a client
+    WS_BINARY_PROTOCOL_ENABLED: bool = True  # accept clients offering the MessagePack subprotocol
+    WS_PER_MESSAGE_DEFLATE: bool = True  # offer permessage-deflate: far fewer bytes, but compression runs per recipient
+    WS_HEARTBEAT_INTERVAL: int = 25  # seconds of client silence before the server pings (subprotocol clients)
+    WS_IDLE_TIMEOUT: int = 60  # seconds of client silence before the connection is evicted
+    WS_PING_INTERVAL: float = 20.0  # protocol-level pings uvicorn sends every client, older ones included
+    WS_PING_TIMEOUT: float = 20.0
+    WS_ROOM_BATCHING_ENABLED: bool = True  # hold a busy room's events for a tick and send them as one batch frame
+    WS_BATCH_TICK_MIN_MS: int = 25
+    WS_BATCH_TICK_MAX_MS: int = 50
+    WS_BATCH_BUSY_RATE: float = 20.0  # room events per second at which the tick reaches its maximum
+    WS_BROKER: str = "local"  # "local" (one process) or "redis" (fan out across workers and pods over pub/sub)
+    WS_BROKER_CHANNEL_PREFIX: str = "ws"
+    WS_BROKER_PUBLISH_QUEUE_SIZE: int = 10000  # frames waiting to be published before the oldest are dropped
+
+    # WebSocket AI Streaming Configuration
+    AI_WS_MAX_CONCURRENT_REQUESTS: int = 4  # per user
+    AI_WS_MAX_TOKENS: int = 4000  # client-requested reply limits are clamped to these
+    AI_WS_MAX_TEMPERATURE: float = 1.0
+
+    # AI Background Job Configuration (Celery)
+    CELERY_BROKER_URL: str = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/1")
+    AI_JOB_QUEUES: Dict[str, str] = {"high": "ai_high", "default": "ai_default", "low": "ai_low"}
+    AI_JOB_MAX_CONCURRENT_PER_USER: int = 3
+    AI_JOB_MAX_RETRIES: int = 3
+    AI_JOB_RETRY_BACKOFF_MAX: int = 60  # seconds
+    AI_JOB_TIME_LIMIT: int = 300  # seconds a worker may spend on one attempt
+    AI_JOB_RESULT_TTL: int = 3600  # seconds finished jobs stay queryable
+
+    # Prompt Budget Configuration
+    PROMPT_TOKEN_BUDGET: int = 3000  # target input tokens per request
+    PROMPT_CONTEXT_WINDOWS: Dict[str, int] = {
+        "default": 4096, "openai": 8192, "anthropic": 200000, "google": 30720, "cohere": 4096
+    }
+    PROMPT_TOKEN_MARGIN: float = 1.15  # safety factor for providers without a local tokenizer
+    PROMPT_DROP_FIELDS: List[str] = ["id", "_id", "uuid", "created_at", "updated_at", "avatar_url", "password_hash"]
+    PROMPT_JSON_MAX_ITEMS: int = 20  # most recent entries kept from long lists
+
+    # Quiz Question Pool Configuration
+    QUIZ_POOL_LOW_WATER: int = 10  # refill once a pool holds fewer questions than this
+    QUIZ_POOL_MAX_SIZE: int = 50  # per (topic, difficulty)
+    QUIZ_POOL_REFILL_BATCH: int = 10  # questions requested per refill call
+    QUIZ_POOL_DEDUP_THRESHOLD: float = 0.8  # word overlap above which questions count as duplicates
+    QUIZ_POOL_REFILL_LOCK_TTL: int = 300  # seconds
+    QUIZ_POOL_TTL: int = 7 * 24 * 3600  # pools of topics nobody asks for expire
+
+    # Embedding Configuration
+    EMBEDDING_PROVIDER: str = "local"  # "local" (feature hashing, no provider calls) or "openai"
+    EMBEDDING_DIM: int = 512  # local embeddings
+    EMBEDDING_OPENAI_MODEL: str = "text-embedding-ada-002"
+    EMBEDDING_OPENAI_DIM: int = 1536
+    EMBEDDING_BATCH_MAX_SIZE: int = 256  # texts per provider call
+    EMBEDDING_BATCH_WINDOW_MS: int = 20  # how long to gather texts before sending a batch
+    EMBEDDING_CACHE_DIR: str = "embedding_cache"
+    EMBEDDING_QUERY_CACHE_SIZE: int = 10000  # embeddings of one-off queries kept in memory, not on disk
+
+    # Class Content Retrieval Configuration
+    RETRIEVAL_ENABLED: bool = True
+    RETRIEVAL_TOP_K: int = 4  # passages added to explain/generate prompts
+    RETRIEVAL_MIN_SCORE: float = 0.15  # cosine similarity below which a passage is left out
+    RETRIEVAL_CHUNK_WORDS: int = 120
+    RETRIEVAL_CHUNK_OVERLAP: int = 20  # words repeated between neighbouring chunks
+    RETRIEVAL_INDEX_MODE: str = "auto"  # "exact", "ivf", or "auto" (IVF from RETRIEVAL_IVF_MIN_ROWS passages)
+    RETRIEVAL_IVF_MIN_ROWS: int = 20000
+    RETRIEVAL_IVF_NPROBE: int = 8  # inverted lists scanned per query
+
+    # Semantic Cache Configuration (near-duplicate questions)
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.9  # cosine similarity from which a question counts as already answered
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 1000000  # per worker
+    SEMANTIC_CACHE_EVICT_TO: float = 0.9  # fraction of the maximum kept after an eviction pass
+    SEMANTIC_CACHE_MAX_AGE: int = 7 * 24 * 3600  # seconds
+    SEMANTIC_CACHE_INDEX_MODE: str = "auto"  # "exact", "ivf", or "auto" (IVF from SEMANTIC_CACHE_IVF_MIN_ROWS entries)
+    SEMANTIC_CACHE_IVF_MIN_ROWS: int = 20000
+    SEMANTIC_CACHE_IVF_NPROBE: int = 8
+    SEMANTIC_CACHE_VERIFY_RATE: float = 0.02  # fraction of hits answered afresh to measure false hits
+    SEMANTIC_CACHE_VERIFY_MIN_SIMILARITY: float = 0.5  # fresh and cached answers less similar than this are a false hit
+
+    # Startup Configuration
+    STARTUP_TIMEOUTS: Dict[str, float] = {"default": 10.0, "ai_service": 60.0, "embeddings": 60.0, "class_index": 60.0}  # seconds per service
+    STARTUP_REQUIRED_SERVICES: List[str] = ["redis"]  # /ready fails until these are up
+    STARTUP_RETRY_INTERVAL: float = 15.0  # seconds between retries of services that failed to start
+
     # Study Room Configuration
     MAX_STUDY_ROOM_SIZE: int = 50
     STUDY_ROOM_TIMEOUT: int = 3600  # 1 hour in seconds
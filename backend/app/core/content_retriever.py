@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+from .config import settings
+from .vector_index import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+def chunk_text(text: str, max_words: int, overlap: int) -> List[str]:
+    """Split text into passages of whole sentences, about max_words long, overlapping by up to overlap words"""
+    sentences = [sentence for sentence in SENTENCE_END.split(text.strip()) if sentence]
+    chunks: List[str] = []
+    current: List[str] = []
+    words = 0
+    for sentence in sentences:
+        length = len(sentence.split())
+        if current and words + length > max_words:
+            chunks.append(" ".join(current))
+            # Carry the last sentences over so an idea split across chunks is found in both
+            carried: List[str] = []
+            carried_words = 0
+            for previous in reversed(current):
+                carried_words += len(previous.split())
+                if carried_words > overlap:
+                    break
+                carried.insert(0, previous)
+            current, words = carried, sum(len(previous.split()) for previous in carried)
+        current.append(sentence)
+        words += length
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+class ContentRetriever:
+    """Index class content passages and retrieve the most relevant ones as prompt context"""
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.index = VectorIndex(
+            embeddings.dim,
+            mode=settings.RETRIEVAL_INDEX_MODE,
+            ivf_min_rows=settings.RETRIEVAL_IVF_MIN_ROWS,
+            nprobe=settings.RETRIEVAL_IVF_NPROBE
+        )
+        self.stats = {"indexed_contents": 0, "indexed_chunks": 0, "searches": 0, "hits": 0}
+
+    async def index_content(self, class_id: str, content: Dict[str, Any]) -> int:
+        """Chunk and index one content item, replacing its earlier version"""
+        chunks = chunk_text(content["text"], settings.RETRIEVAL_CHUNK_WORDS, settings.RETRIEVAL_CHUNK_OVERLAP)
+        title = content.get("title", "")
+        # The title is embedded with every passage so short chunks keep their topic
+        vectors = await self.embeddings.embed([f"{title}. {chunk}" for chunk in chunks])
+        payloads = [
+            {"class_id": class_id, "content_id": content["id"], "title": title, "text": chunk}
+            for chunk in chunks
+        ]
+        self.index.add(f"{class_id}:{content['id']}", vectors, payloads, group=class_id)
+        self.stats["indexed_contents"] += 1
+        self.stats["indexed_chunks"] += len(chunks)
+        self.index.maybe_train()
+        return len(chunks)
+
+    async def index_class(self, class_data: Dict[str, Any]) -> int:
+        """Index every content item of a class"""
+        # Indexed together so their chunks share embedding batches
+        counts = await asyncio.gather(
+            *[self.index_content(class_data["id"], content) for content in class_data.get("content", [])]
+        )
+        return sum(counts)
+
+    def remove_content(self, class_id: str, content_id: str) -> int:
+        """Drop one content item's passages"""
+        return self.index.remove(f"{class_id}:{content_id}")
+
+    def remove_class(self, class_id: str) -> int:
+        """Drop every passage of a class"""
+        return self.index.remove_group(class_id)
+
+    async def retrieve(self, query: str, class_id: Optional[str] = None, k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get the passages most similar to a query, best first"""
+        self.stats["searches"] += 1
+        vectors = await self.embeddings.embed([query], persist=False)
+        results = self.index.search(
+            vectors[0],
+            k or settings.RETRIEVAL_TOP_K,
+            group=class_id
+        )
+        passages = [
+            {**payload, "score": round(score, 4)}
+            for score, payload in results
+            if score >= settings.RETRIEVAL_MIN_SCORE
+        ]
+        if passages:
+            self.stats["hits"] += 1
+        return passages
+
+    async def build_context(self, query: str, class_id: Optional[str] = None) -> Optional[str]:
+        """Format the retrieved passages as prompt context, or None when nothing relevant is indexed"""
+        if not settings.RETRIEVAL_ENABLED:
+            return None
+        try:
+            passages = await self.retrieve(query, class_id)
+        except Exception as e:
+            logger.error(f"Error retrieving class content: {e}")
+            return None
+        if not passages:
+            return None
+        sections = [f"[{number}] {passage['title']}\n{passage['text']}" for number, passage in enumerate(passages, 1)]
+        return "Use the following course material where it is relevant:\n\n" + "\n\n".join(sections)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get indexing and search counts"""
+        return {**self.stats, "index": self.index.get_stats()}
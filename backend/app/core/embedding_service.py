@@ -0,0 +1,270 @@
+import asyncio
+import fcntl
+import hashlib
+import logging
+import math
+import os
+import re
+import zlib
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .blocking_executor import blocking_executor
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+DIGEST_BYTES = 16
+WORD = re.compile(r"\w+")
+STOP_WORDS = frozenset(
+    "a an and are as at be by does for from how in is it of on or that the this to was what which why with".split()
+)
+
+def hash_embed(texts: List[str], dim: int) -> np.ndarray:
+    """Embed texts as signed feature hashes of their words and word pairs"""
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        words = [word for word in WORD.findall(text.lower()) if word not in STOP_WORDS]
+        features = Counter(words)
+        features.update(f"{first} {second}" for first, second in zip(words, words[1:]))
+        for feature, count in features.items():
+            digest = zlib.crc32(feature.encode("utf-8"))
+            sign = 1.0 if digest & 0x80000000 else -1.0
+            vectors[row, digest % dim] += sign * (1.0 + math.log(count))
+    return vectors
+
+class EmbeddingStore:
+    """Append-only memory-mapped float32 matrix of embeddings with a digest -> row index, shared by every worker"""
+
+    def __init__(self, directory: str, name: str, dim: int):
+        self.dim = dim
+        self.vectors_path = os.path.join(directory, f"{name}.f32")
+        self.ids_path = os.path.join(directory, f"{name}.ids")
+        self.lock_path = os.path.join(directory, f"{name}.lock")
+        self.rows: Dict[bytes, int] = {}
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.loaded = False
+
+    def _consistent_rows(self) -> int:
+        """Rows present in both files; a crash between the two writes leaves a longer vectors file"""
+        vector_rows = os.path.getsize(self.vectors_path) // (4 * self.dim) if os.path.exists(self.vectors_path) else 0
+        id_rows = os.path.getsize(self.ids_path) // DIGEST_BYTES if os.path.exists(self.ids_path) else 0
+        return min(vector_rows, id_rows)
+
+    def load(self):
+        """Map the stored vectors and read the id index; blocking"""
+        os.makedirs(os.path.dirname(self.vectors_path) or ".", exist_ok=True)
+        self.rows = {}
+        self.vectors = np.zeros((0, self.dim), dtype=np.float32)
+        self.refresh()
+        self.loaded = True
+
+    def refresh(self):
+        """Pick up rows appended by other processes; blocking"""
+        rows = self._consistent_rows()
+        known = len(self.rows)
+        if rows <= known:
+            return
+        with open(self.ids_path, "rb") as ids:
+            ids.seek(known * DIGEST_BYTES)
+            data = ids.read((rows - known) * DIGEST_BYTES)
+        added: Dict[bytes, int] = {}
+        for offset in range(0, len(data), DIGEST_BYTES):
+            digest = data[offset:offset + DIGEST_BYTES]
+            if digest not in self.rows:
+                added.setdefault(digest, known + offset // DIGEST_BYTES)
+        # Pages are read on demand, so even a large store maps instantly. The map grows
+        # before the ids are published, as lookups run concurrently on the event loop
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        self.rows.update(added)
+
+    def get(self, digests: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """Get the stored vectors of the digests that are known"""
+        found = [(digest, self.rows[digest]) for digest in digests if digest in self.rows]
+        if not found:
+            return {}
+        vectors = np.asarray(self.vectors[[row for _, row in found]])
+        return {digest: vectors[index] for index, (digest, _) in enumerate(found)}
+
+    def append(self, digests: List[bytes], vectors: np.ndarray):
+        """Persist new vectors; blocking, and serialized across processes by a file lock"""
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self.refresh()
+                new = [index for index, digest in enumerate(digests) if digest not in self.rows]
+                if not new:
+                    return
+                rows = self._consistent_rows()
+                with open(self.vectors_path, "ab") as out:
+                    out.truncate(rows * 4 * self.dim)
+                    out.write(np.ascontiguousarray(vectors[new], dtype=np.float32).tobytes())
+                # Ids go last: a row only exists once its id is written
+                with open(self.ids_path, "ab") as out:
+                    out.truncate(rows * DIGEST_BYTES)
+                    out.write(b"".join(digests[index] for index in new))
+                self.refresh()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get the stored row count and size"""
+        return {"rows": len(self.rows), "bytes": int(len(self.rows) * 4 * self.dim), "path": self.vectors_path}
+
+class EmbeddingService:
+    """Gather embedding requests into one provider call per batch, caching results by content digest"""
+
+    def __init__(self):
+        self.provider = settings.EMBEDDING_PROVIDER
+        if self.provider == "openai":
+            self.model, self.dim = settings.EMBEDDING_OPENAI_MODEL, settings.EMBEDDING_OPENAI_DIM
+        else:
+            self.model, self.dim = "hash", settings.EMBEDDING_DIM
+        self.openai_client = None
+        # Vectors from different models are not comparable, so each model gets its own store
+        self.store = EmbeddingStore(settings.EMBEDDING_CACHE_DIR, f"{self.provider}-{self.model}-{self.dim}", self.dim)
+        self.queries: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self.pending: Dict[bytes, Tuple[str, bool, asyncio.Future]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loading: Optional[asyncio.Task] = None
+        self.stats = {
+            "texts": 0, "store_hits": 0, "query_cache_hits": 0, "coalesced": 0,
+            "computed": 0, "batches": 0, "provider_calls": 0, "errors": 0
+        }
+
+    async def load(self):
+        """Open the persistent store off the event loop"""
+        if self.store.loaded:
+            return
+        started = self._loading is None
+        if started:
+            self._loading = asyncio.ensure_future(blocking_executor.run("embeddings", self.store.load))
+        try:
+            await asyncio.shield(self._loading)
+        except Exception:
+            self._loading = None
+            raise
+        if started:
+            logger.info(f"Embedding store loaded: {len(self.store.rows)} vectors from {self.store.vectors_path}")
+
+    def digest(self, text: str) -> bytes:
+        """Cache key of a text for the current model"""
+        return hashlib.blake2b(f"{self.model}\n{text}".encode("utf-8"), digest_size=DIGEST_BYTES).digest()
+
+    async def embed(self, texts: List[str], persist: bool = True) -> np.ndarray:
+        """Embed texts, computing only the ones never seen before; persist=False keeps them in memory only"""
+        await self.load()
+        self.stats["texts"] += len(texts)
+        digests = [self.digest(text) for text in texts]
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+
+        found: Dict[bytes, np.ndarray] = {}
+        for digest in digests:
+            if digest in self.queries:
+                self.queries.move_to_end(digest)
+                found[digest] = self.queries[digest]
+                self.stats["query_cache_hits"] += 1
+        stored = self.store.get([digest for digest in digests if digest not in found])
+        self.stats["store_hits"] += len(stored)
+        found.update(stored)
+
+        waiting: Dict[bytes, asyncio.Future] = {}
+        for digest, text in zip(digests, texts):
+            if digest not in found and digest not in waiting:
+                waiting[digest] = self._submit(digest, text, persist)
+        if waiting:
+            results = await asyncio.gather(*waiting.values())
+            found.update(zip(waiting, results))
+
+        for row, digest in enumerate(digests):
+            vectors[row] = found[digest]
+        return vectors
+
+    def _submit(self, digest: bytes, text: str, persist: bool) -> asyncio.Future:
+        if digest in self.pending:
+            # Someone is already waiting for this text: share their result
+            _, pending_persist, future = self.pending[digest]
+            self.pending[digest] = (text, pending_persist or persist, future)
+            self.stats["coalesced"] += 1
+            return future
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending[digest] = (text, persist, future)
+        if len(self.pending) >= settings.EMBEDDING_BATCH_MAX_SIZE:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(settings.EMBEDDING_BATCH_WINDOW_MS / 1000, self._flush)
+        return future
+
+    def _flush(self):
+        """Send everything gathered so far as one batch"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self.pending = self.pending, {}
+        if batch:
+            asyncio.ensure_future(self._compute(batch))
+
+    async def _compute(self, batch: Dict[bytes, Tuple[str, bool, asyncio.Future]]):
+        """Embed a batch with one provider call and hand each vector back to its waiters"""
+        self.stats["batches"] += 1
+        digests = list(batch)
+        try:
+            # Another worker may have embedded some of these since they were looked up
+            await blocking_executor.run("embeddings", self.store.refresh)
+            found = self.store.get(digests)
+            self.stats["store_hits"] += len(found)
+            missing = [digest for digest in digests if digest not in found]
+            if missing:
+                vectors = await self._call_provider([batch[digest][0] for digest in missing])
+                self.stats["computed"] += len(missing)
+                found.update(zip(missing, vectors))
+                persisted = [index for index, digest in enumerate(missing) if batch[digest][1]]
+                if persisted:
+                    await blocking_executor.run(
+                        "embeddings", self.store.append, [missing[index] for index in persisted], vectors[persisted]
+                    )
+                for digest, vector in zip(missing, vectors):
+                    if not batch[digest][1]:
+                        self._remember(digest, vector)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Embedding batch of {len(batch)} failed: {e}")
+            for _, _, future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for digest, (_, _, future) in batch.items():
+            if not future.done():
+                future.set_result(found[digest])
+
+    def _remember(self, digest: bytes, vector: np.ndarray):
+        self.queries[digest] = vector
+        while len(self.queries) > settings.EMBEDDING_QUERY_CACHE_SIZE:
+            self.queries.popitem(last=False)
+
+    async def _call_provider(self, texts: List[str]) -> np.ndarray:
+        """One embedding call for the whole batch"""
+        self.stats["provider_calls"] += 1
+        if self.provider == "openai":
+            if self.openai_client is None:
+                raise RuntimeError("OpenAI embeddings configured but the OpenAI client is not initialized")
+            response = await self.openai_client.embeddings.create(model=self.model, input=texts)
+            data = sorted(response.data, key=lambda item: item.index)
+            return np.asarray([item.embedding for item in data], dtype=np.float32)
+        return await blocking_executor.run("embeddings", hash_embed, texts, self.dim)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache hits, batch sizes and provider calls"""
+        return {
+            **self.stats,
+            "provider": self.provider,
+            "model": self.model,
+            "dim": self.dim,
+            "pending": len(self.pending),
+            "avg_batch_size": round(self.stats["computed"] / self.stats["provider_calls"], 2) if self.stats["provider_calls"] else 0.0,
+            "query_cache": len(self.queries),
+            "store": self.store.get_stats()
+        }
@@ -0,0 +1,238 @@
+import logging
+import re
+import unicodedata
+from collections import OrderedDict, deque
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+ALLOW = "allow"
+DENY = "deny"
+ESCALATE = "escalate"
+
+# Terms match whole words only. A trailing "*" also escalates words starting with the term, and
+# deny terms never deny on such a stem alone: "retardant" and "shitake" go to review instead
+DEFAULT_DENY_TERMS = [
+    "fuck*", "fucks", "fucked", "fucker", "fuckers", "fucking", "motherfuck*", "motherfucker",
+    "motherfuckers", "motherfucking", "shit*", "shits", "shitty", "bitch*", "bitches", "bitchy",
+    "asshole*", "assholes", "bastard*", "bastards", "cunt*", "cunts", "dickhead*", "dickheads",
+    "retard*", "slut*", "sluts", "whore*", "whores", "kys", "kill yourself", "go die",
+]
+
+# Terms that are fine in most lessons but need context to judge. Listed as whole words rather than
+# stems, since "drugstore", "sextant" and "killjoy" would otherwise be held for review
+DEFAULT_ESCALATE_TERMS = [
+    "hate", "violence", "discrimination", "harassment", "kill", "kills", "killed", "killing",
+    "killer", "suicide*", "stupid", "idiot", "idiots", "idiotic", "loser", "losers", "ugly", "dumb",
+    "weapon", "weapons", "gun", "guns", "drug", "drugs", "sex", "sexual", "sexy", "nazi*", "racist*",
+]
+
+# Characters commonly substituted for latin letters
+LEET_MAP = str.maketrans({
+    "0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "8": "b",
+    "@": "a", "$": "s", "!": "i", "|": "l", "+": "t",
+})
+
+CONFUSABLES_MAP = str.maketrans({
+    # Cyrillic
+    "а": "a", "в": "b", "е": "e", "ё": "e", "к": "k", "м": "m", "н": "h", "о": "o",
+    "р": "p", "с": "c", "т": "t", "у": "y", "х": "x", "і": "i", "ј": "j", "ѕ": "s",
+    # Greek
+    "α": "a", "β": "b", "ε": "e", "η": "n", "ι": "i", "κ": "k", "ν": "v", "ο": "o",
+    "ρ": "p", "τ": "t", "υ": "u", "χ": "x",
+})
+
+NON_WORD = re.compile(r"[^a-z]+")
+REPEATS = re.compile(r"(.)\1+")
+SINGLE_LETTER_RUN = re.compile(r"\b(?:[a-z] ){2,}[a-z]\b")
+LINK = re.compile(r"https?://|www\.", re.IGNORECASE)
+
+def _fold(text: str) -> str:
+    """Fold case, confusables, accents and leetspeak, leaving lowercase words"""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = text.translate(CONFUSABLES_MAP)
+    text = "".join(ch for ch in unicodedata.normalize("NFKD", text) if not unicodedata.combining(ch))
+    text = text.translate(LEET_MAP)
+    return NON_WORD.sub(" ", text).strip()
+
+def _squeeze(text: str) -> str:
+    """Collapse repeated letters in text and terms alike, so "fuuuck" matches "fuck" too"""
+    return REPEATS.sub(r"\1", text)
+
+def _join_letter_runs(text: str) -> str:
+    """Join spaced-out letters, so "f u c k" and "f.u.c.k" become one word"""
+    return SINGLE_LETTER_RUN.sub(lambda match: match.group(0).replace(" ", ""), text)
+
+def normalize_text(text: str) -> str:
+    """Fold case, confusables, accents, leetspeak, spacing and letter repeats into plain words"""
+    return _squeeze(_join_letter_runs(_fold(text)))
+
+class AhoCorasick:
+    """Compiled multi-pattern matcher that finds every pattern in one pass over the text"""
+
+    def __init__(self, patterns: List[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[str]] = [[]]
+        for pattern in patterns:
+            self._add(pattern)
+        self._build()
+
+    def _add(self, pattern: str):
+        state = 0
+        for ch in pattern:
+            if ch not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[state][ch] = len(self.goto) - 1
+            state = self.goto[state][ch]
+        self.output[state].append(pattern)
+
+    def _build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, target in self.goto[state].items():
+                queue.append(target)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[target] = self.goto[fallback].get(ch, 0)
+                self.output[target] = self.output[target] + self.output[self.fail[target]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str]]:
+        """Yield (end_index, pattern) for every occurrence"""
+        state = 0
+        for index, ch in enumerate(text):
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            for pattern in self.output[state]:
+                yield index, pattern
+
+class LocalModerator:
+    """First moderation tier: clear allow/deny decisions locally, escalate the rest"""
+
+    def __init__(self, deny_terms: List[str] = None, escalate_terms: List[str] = None):
+        deny_terms = (deny_terms or DEFAULT_DENY_TERMS) + settings.MODERATION_EXTRA_DENY_TERMS
+        escalate_terms = (escalate_terms or DEFAULT_ESCALATE_TERMS) + settings.MODERATION_EXTRA_ESCALATE_TERMS
+        self.verdicts: Dict[str, str] = {}
+        self.terms: Dict[str, str] = {}
+        patterns = []
+        for verdict, terms in ((ESCALATE, escalate_terms), (DENY, deny_terms)):
+            for term in terms:
+                for pattern, match_verdict in self._compile_term(term, verdict):
+                    # A whole word outranks a stem, and deny outranks escalate
+                    if self.verdicts.get(pattern) != DENY:
+                        self.verdicts[pattern] = match_verdict
+                        self.terms[pattern] = term
+                    patterns.append(pattern)
+        patterns = list(dict.fromkeys(patterns))
+        self.matcher = AhoCorasick(patterns)
+        # Spaced-out letters hide word boundaries, so their runs are scanned without them
+        self.run_terms = {
+            pattern.strip(): self.terms[pattern]
+            for pattern in patterns if self.verdicts[pattern] == DENY
+        }
+        self.run_matcher = AhoCorasick(list(self.run_terms))
+        self.cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.stats = {ALLOW: 0, DENY: 0, ESCALATE: 0, "cache_hits": 0}
+
+    @staticmethod
+    def _compile_term(term: str, verdict: str) -> List[Tuple[str, str]]:
+        """Pad a term with spaces to match on word boundaries; a stem also matches as a prefix, for review"""
+        words = normalize_text(term.rstrip("*"))
+        patterns = [(f" {words} ", verdict)]
+        if term.endswith("*"):
+            patterns.append((f" {words}", ESCALATE))
+        return patterns
+
+    def evaluate(self, content: str) -> Dict[str, Any]:
+        """Classify a message as allow, deny or escalate"""
+        # Exact repeats skip normalization entirely
+        cached = self._cached(content)
+        if cached is not None:
+            return cached
+
+        folded = _fold(content)
+        runs = [_squeeze(run.replace(" ", "")) for run in SINGLE_LETTER_RUN.findall(folded)]
+        normalized = _squeeze(_join_letter_runs(folded))
+        has_link = LINK.search(content) is not None
+        normalized_key = "\x00".join([normalized, *runs, "link" if has_link else ""])
+        cached = self._cached(normalized_key)
+        if cached is not None:
+            self._remember(content, cached)
+            return cached
+
+        matches = {DENY: set(), ESCALATE: set()}
+        for _, pattern in self.matcher.iter_matches(f" {normalized} "):
+            matches[self.verdicts[pattern]].add(self.terms[pattern])
+        for run in runs:
+            for _, pattern in self.run_matcher.iter_matches(run):
+                matches[ESCALATE].add(self.run_terms[pattern])
+
+        if matches[DENY]:
+            verdict = DENY
+        elif matches[ESCALATE] or has_link:
+            verdict = ESCALATE
+        else:
+            verdict = ALLOW
+
+        decision = {
+            "verdict": verdict,
+            "matches": sorted(matches[DENY] | matches[ESCALATE])
+        }
+        self._remember(normalized_key, decision)
+        self._remember(content, decision)
+        self.stats[verdict] += 1
+        return decision
+
+    def _cached(self, key: str) -> Optional[Dict[str, Any]]:
+        decision = self.cache.get(key)
+        if decision is not None:
+            self.cache.move_to_end(key)
+            self.stats["cache_hits"] += 1
+            self.stats[decision["verdict"]] += 1
+        return decision
+
+    def _remember(self, key: str, decision: Dict[str, Any]):
+        self.cache[key] = decision
+        if len(self.cache) > settings.MODERATION_CACHE_SIZE:
+            self.cache.popitem(last=False)
+
+    def to_result(self, content: str, decision: Dict[str, Any], reason: str = None) -> Dict[str, Any]:
+        """Turn a local decision into the moderate_content result format"""
+        if decision["verdict"] == ALLOW:
+            return {
+                "is_appropriate": True,
+                "content": content,
+                "reason": reason or "",
+                "severity": "low",
+                "flags": [],
+                "confidence": 0.9
+            }
+        if decision["verdict"] == DENY:
+            return {
+                "is_appropriate": False,
+                "content": content,
+                "reason": reason or "Message contains blocked language",
+                "severity": "high",
+                "flags": decision["matches"],
+                "confidence": 0.95
+            }
+        # Escalated content that could not be reviewed
+        return {
+            "is_appropriate": not settings.MODERATION_FAIL_CLOSED,
+            "content": content,
+            "reason": reason or "Message needs review",
+            "severity": "medium",
+            "flags": decision["matches"],
+            "confidence": 0.5
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get decision counts and cache usage"""
+        return {**self.stats, "cache_size": len(self.cache)}
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+class ModerationBatcher:
+    """Gather messages that need LLM moderation into one structured prompt per window"""
+
+    def __init__(self, ai_service):
+        self.ai_service = ai_service
+        self.pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.batches = 0
+        self.items = 0
+        self.fallback_items = 0
+
+    async def submit(self, content: str) -> Optional[Dict[str, Any]]:
+        """Queue a message and wait for its verdict; None means the LLM could not decide"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((content, future))
+
+        if len(self.pending) >= settings.MODERATION_BATCH_MAX_SIZE:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(settings.MODERATION_BATCH_WINDOW_MS / 1000, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """Send everything gathered so far as one batch"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self.pending = self.pending, []
+        if batch:
+            asyncio.ensure_future(self._moderate(batch))
+
+    async def _moderate(self, batch: List[Tuple[str, asyncio.Future]]):
+        """Moderate a batch and hand each verdict back to its waiting handler"""
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            contents = [content for content, _ in batch]
+            if len(batch) == 1:
+                verdicts = [await self.ai_service._moderate_with_llm(contents[0])]
+            else:
+                verdicts = await self._moderate_together(contents)
+
+            for (_, future), verdict in zip(batch, verdicts):
+                if not future.done():
+                    future.set_result(verdict)
+        except Exception as e:
+            logger.error(f"Moderation batch of {len(batch)} failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    async def _moderate_together(self, contents: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """Moderate several messages with one prompt, falling back per item where needed"""
+        messages = [{"id": index, "content": content} for index, content in enumerate(contents)]
+        prompt = f"""
+            Please analyze each of the following messages and determine if it's appropriate for an educational platform.
+            Messages: {json.dumps(messages, ensure_ascii=False)}
+
+            Respond with a JSON array containing one object per message:
+            [
+                {{
+                    "id": message_id,
+                    "is_appropriate": true/false,
+                    "reason": "explanation_if_inappropriate",
+                    "severity": "low/medium/high"
+                }}
+            ]
+            """
+
+        response = await self.ai_service.generate_response(prompt, content_type="moderation", use_cache=False)
+        verdicts = self._parse(response, len(contents)) if response["success"] else {}
+
+        missing = [index for index in range(len(contents)) if index not in verdicts]
+        if missing:
+            logger.warning(f"Batched moderation left {len(missing)} of {len(contents)} messages undecided")
+            self.fallback_items += len(missing)
+            results = await asyncio.gather(
+                *[self.ai_service._moderate_with_llm(contents[index]) for index in missing]
+            )
+            verdicts.update(zip(missing, results))
+
+        return [verdicts[index] for index in range(len(contents))]
+
+    @staticmethod
+    def _parse(response: Dict[str, Any], count: int) -> Dict[int, Dict[str, Any]]:
+        """Map verdicts in a batch response back to message ids, skipping malformed entries"""
+        try:
+            parsed = json.loads(response["content"])
+        except (json.JSONDecodeError, TypeError):
+            return {}
+        if isinstance(parsed, dict):
+            parsed = parsed.get("results", [])
+        if not isinstance(parsed, list):
+            return {}
+
+        verdicts = {}
+        for item in parsed:
+            if not isinstance(item, dict) or not isinstance(item.get("is_appropriate"), bool):
+                continue
+            index = item.pop("id", None)
+            if isinstance(index, int) and 0 <= index < count:
+                verdicts[index] = item
+        return verdicts
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get batching statistics"""
+        return {
+            "pending": len(self.pending),
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "fallback_items": self.fallback_items
+        }
@@ -0,0 +1,168 @@
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+from .config import settings
+
+try:
+    import tiktoken
+except ImportError:  # counted with the character estimate below
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4
+OMITTED = "\n[... {} tokens omitted ...]\n"
+
+# Reply limits the generation methods fall back to when max_tokens is not given
+REPLY_TOKENS = {
+    "openai": settings.OPENAI_MAX_TOKENS,
+    "anthropic": settings.ANTHROPIC_MAX_TOKENS
+}
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+class PromptBudgeter:
+    """Count prompt tokens per provider and trim prompts to a token budget"""
+
+    def __init__(self):
+        self.encodings: Dict[str, Any] = {}
+        self._loaded = False
+        self.stats = {
+            "prompts": 0, "trimmed": 0, "tokens_in": 0, "tokens_out": 0,
+            "json_compacted": 0, "json_tokens_saved": 0
+        }
+
+    def load(self):
+        """Load the tokenizers; blocking, since tiktoken may download its BPE files"""
+        self._loaded = True
+        if tiktoken is None:
+            logger.warning("tiktoken not installed, estimating prompt tokens from length")
+            return
+        try:
+            try:
+                openai_encoding = tiktoken.encoding_for_model(settings.OPENAI_MODEL)
+            except KeyError:
+                openai_encoding = tiktoken.get_encoding("cl100k_base")
+            # The other providers have no local tokenizer; cl100k scaled by a margin is close enough
+            default_encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.warning(f"Tokenizer unavailable, estimating prompt tokens from length: {e}")
+            return
+        self.encodings = {"openai": openai_encoding, "default": default_encoding}
+
+    def _encoding(self, provider: str):
+        if not self._loaded:
+            self.load()
+        return self.encodings.get(provider, self.encodings.get("default"))
+
+    def _margin(self, provider: str) -> float:
+        return 1.0 if provider in self.encodings else settings.PROMPT_TOKEN_MARGIN
+
+    def count(self, text: str, provider: str = "openai") -> int:
+        """Count the tokens a provider will see for a text"""
+        if not text:
+            return 0
+        encoding = self._encoding(provider)
+        if encoding is None:
+            return int(len(text) / CHARS_PER_TOKEN * settings.PROMPT_TOKEN_MARGIN) + 1
+        return int(len(encoding.encode(text, disallowed_special=())) * self._margin(provider))
+
+    def budget_for(self, provider: str, max_tokens: Optional[int] = None) -> int:
+        """Input tokens allowed: the target budget, capped by what the context window leaves for the reply"""
+        window = settings.PROMPT_CONTEXT_WINDOWS.get(provider, settings.PROMPT_CONTEXT_WINDOWS["default"])
+        reply = max_tokens or REPLY_TOKENS.get(provider, 4000)
+        # Never let a generous reply limit squeeze the prompt below half the window
+        return max(0, min(settings.PROMPT_TOKEN_BUDGET, window - min(reply, window // 2)))
+
+    def trim(self, text: str, limit: int, provider: str = "openai") -> str:
+        """Cut the middle out of a text so it fits the limit, keeping its opening and most recent parts"""
+        tokens = self.count(text, provider)
+        if tokens <= limit:
+            return text
+        marker_tokens = self.count(OMITTED.format(tokens), provider)
+        keep = max(0, limit - marker_tokens)
+        if keep == 0:
+            return ""
+        head = keep // 3
+        tail = keep - head
+        encoding = self._encoding(provider)
+        if encoding is None:
+            ratio = len(text) / tokens
+            start, end = text[:int(head * ratio)], text[len(text) - int(tail * ratio):]
+        else:
+            # Scale back to raw tokenizer units for providers counted with a margin
+            margin = self._margin(provider)
+            encoded = encoding.encode(text, disallowed_special=())
+            start = encoding.decode(encoded[:int(head / margin)])
+            end = encoding.decode(encoded[len(encoded) - int(tail / margin):])
+        return f"{start}{OMITTED.format(tokens - keep)}{end}"
+
+    def fit(
+        self,
+        provider: str,
+        prompt: str,
+        context: Optional[str] = None,
+        max_tokens: Optional[int] = None
+    ) -> str:
+        """Join context and prompt within the provider's budget, trimming context before the prompt"""
+        budget = self.budget_for(provider, max_tokens)
+        prompt_tokens = self.count(prompt, provider)
+        context_tokens = self.count(context, provider)
+        self.stats["prompts"] += 1
+        self.stats["tokens_in"] += prompt_tokens + context_tokens
+
+        if prompt_tokens + context_tokens > budget:
+            self.stats["trimmed"] += 1
+            if prompt_tokens >= budget:
+                prompt, context = self.trim(prompt, budget, provider), None
+            else:
+                context = self.trim(context, budget - prompt_tokens, provider)
+            prompt_tokens = self.count(prompt, provider)
+            context_tokens = self.count(context, provider)
+
+        self.stats["tokens_out"] += prompt_tokens + context_tokens
+        return f"{context}\n\n{prompt}" if context else prompt
+
+    def compact_json(self, data: Any, drop_fields: List[str] = None) -> str:
+        """Serialize data for a prompt without indentation, empty values, low-value fields or repeated keys"""
+        drop = set(settings.PROMPT_DROP_FIELDS if drop_fields is None else drop_fields)
+        compact = json.dumps(self._compact(data, drop), separators=(",", ":"), ensure_ascii=False, default=str)
+        self.stats["json_compacted"] += 1
+        self.stats["json_tokens_saved"] += max(
+            0, self.count(json.dumps(data, indent=2, default=str)) - self.count(compact)
+        )
+        return compact
+
+    def _compact(self, value: Any, drop: set) -> Any:
+        if isinstance(value, dict):
+            return {
+                key: self._compact(item, drop)
+                for key, item in value.items()
+                if key not in drop and not _is_empty(item)
+            }
+        if isinstance(value, (list, tuple)):
+            items = [self._compact(item, drop) for item in value]
+            omitted = max(0, len(items) - settings.PROMPT_JSON_MAX_ITEMS)
+            # Recent entries matter most in progress data
+            items = items[omitted:]
+            if len(items) > 2 and all(isinstance(item, dict) for item in items):
+                columns = list(dict.fromkeys(key for item in items for key in item))
+                if len(columns) <= max(len(item) for item in items) + 1:
+                    # Uniform records: state the keys once instead of in every record
+                    items = {"columns": columns, "rows": [[item.get(key) for key in columns] for item in items]}
+            if omitted:
+                return {"omitted_earlier": omitted, "items": items}
+            return items
+        if isinstance(value, float):
+            return round(value, 3)
+        return value
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get token counts before and after budgeting"""
+        return {
+            **self.stats,
+            "tokens_saved": self.stats["tokens_in"] - self.stats["tokens_out"],
+            "tokenizer": "tiktoken" if self.encodings else "estimate"
+        }
@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from .circuit_breaker import CLOSED, CircuitBreaker, CircuitOpenError
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+class ProviderUnavailableError(Exception):
+    """Raised when no provider could serve a request"""
+
+class ProviderStats:
+    """Rolling latency samples and error-rate estimate for one provider"""
+
+    def __init__(self, window: int):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.error_rate = 0.0
+        self.successes = 0
+        self.failures = 0
+        self.in_flight = 0
+
+    def record_success(self, latency: float):
+        """Record a successful call and its latency"""
+        self.latencies.append(latency)
+        self.successes += 1
+        self.error_rate *= 1 - settings.AI_ROUTER_ERROR_DECAY
+
+    def record_failure(self):
+        """Record a failed call"""
+        self.failures += 1
+        decay = settings.AI_ROUTER_ERROR_DECAY
+        self.error_rate = self.error_rate * (1 - decay) + decay
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Get a latency percentile, or None without enough samples"""
+        if len(self.latencies) < settings.AI_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get a serializable view of the stats"""
+        return {
+            "p50_latency": self.percentile(50),
+            "p95_latency": self.percentile(95),
+            "samples": len(self.latencies),
+            "error_rate": round(self.error_rate, 4),
+            "successes": self.successes,
+            "failures": self.failures,
+            "in_flight": self.in_flight
+        }
+
+class ProviderRouter:
+    """Route a request across providers, hedging slow primaries onto the next provider"""
+
+    def __init__(self):
+        self.stats: Dict[str, ProviderStats] = {}
+        self.semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.hedge_tokens = float(settings.AI_HEDGE_MAX_BURST)
+        self.routed = 0
+        self.hedges_sent = 0
+        self.hedges_won = 0
+
+    def _stats_for(self, provider: str) -> ProviderStats:
+        if provider not in self.stats:
+            self.stats[provider] = ProviderStats(settings.AI_ROUTER_LATENCY_WINDOW)
+        return self.stats[provider]
+
+    def _semaphore_for(self, provider: str) -> asyncio.Semaphore:
+        if provider not in self.semaphores:
+            self.semaphores[provider] = asyncio.Semaphore(settings.AI_PROVIDER_MAX_CONCURRENCY)
+        return self.semaphores[provider]
+
+    def breaker_for(self, provider: str) -> CircuitBreaker:
+        """Get the circuit breaker guarding a provider"""
+        if provider not in self.breakers:
+            self.breakers[provider] = CircuitBreaker(provider)
+        return self.breakers[provider]
+
+    def health_score(self, provider: str) -> float:
+        """Score a provider from 0 (unusable) to 1 (healthy)"""
+        breaker = self.breaker_for(provider)
+        if not breaker.available():
+            return 0.0
+        score = 1.0 - self._stats_for(provider).error_rate
+        if breaker.state != CLOSED:
+            score *= 0.5
+        return round(score, 4)
+
+    def rank(self, providers: List[str]) -> List[str]:
+        """Skip open breakers; keep the configured order but move unhealthy providers to the back"""
+        threshold = settings.AI_ROUTER_MAX_ERROR_RATE
+        return sorted(
+            [provider for provider in providers if self.breaker_for(provider).available()],
+            key=lambda provider: self._stats_for(provider).error_rate > threshold
+        )
+
+    def hedge_delay(self, provider: str) -> float:
+        """How long to wait on a provider before hedging onto the next one"""
+        latency = self._stats_for(provider).percentile(settings.AI_HEDGE_PERCENTILE)
+        return latency if latency is not None else settings.AI_HEDGE_DEFAULT_DELAY
+
+    def _take_hedge_token(self) -> bool:
+        """Spend hedge budget; the budget refills by a fixed ratio per routed request"""
+        if self.hedge_tokens >= 1:
+            self.hedge_tokens -= 1
+            return True
+        return False
+
+    async def route(self, providers: List[str], call: Callable[[str], Awaitable[Any]]) -> Any:
+        """Call providers in ranked order; the first successful answer wins"""
+        candidates = self.rank(providers)
+        if not candidates:
+            raise ProviderUnavailableError("No AI providers are configured or all circuits are open")
+
+        self.routed += 1
+        self.hedge_tokens = min(
+            settings.AI_HEDGE_MAX_BURST,
+            self.hedge_tokens + settings.AI_HEDGE_BUDGET_RATIO
+        )
+
+        pending: Dict[asyncio.Task, str] = {}
+        hedges = set()
+        next_index = 0
+        hedge_deadline = 0.0
+        hedging = settings.AI_HEDGE_ENABLED
+        last_error: Optional[BaseException] = None
+
+        def launch(hedge: bool = False):
+            nonlocal next_index, hedge_deadline
+            provider = candidates[next_index]
+            next_index += 1
+            task = asyncio.ensure_future(self._attempt(provider, call))
+            pending[task] = provider
+            if hedge:
+                hedges.add(task)
+            hedge_deadline = time.monotonic() + self.hedge_delay(provider)
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if hedging and next_index < len(candidates):
+                    timeout = max(0.0, hedge_deadline - time.monotonic())
+
+                done, _ = await asyncio.wait(
+                    pending.keys(), timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+
+                if not done:
+                    # The latest attempt is slower than its latency percentile
+                    provider = candidates[next_index]
+                    if self._semaphore_for(provider).locked() or not self._take_hedge_token():
+                        # No capacity or budget left: stop hedging and just wait
+                        hedging = False
+                        continue
+                    self.hedges_sent += 1
+                    logger.info(f"Hedging AI request onto {provider}")
+                    launch(hedge=True)
+                    continue
+
+                winner = None
+                for task in done:
+                    provider = pending.pop(task)
+                    error = task.exception()
+                    if error is None and winner is None:
+                        winner = task
+                    elif error is not None:
+                        last_error = error
+                        logger.warning(f"Provider {provider} failed: {error}")
+
+                if winner is not None:
+                    if winner in hedges:
+                        self.hedges_won += 1
+                    return winner.result()
+
+                # Every attempt so far failed: fall back to the next provider
+                if not pending and next_index < len(candidates):
+                    launch()
+        finally:
+            # Cancel whichever attempts lost the race
+            for task in pending:
+                task.cancel()
+
+        raise ProviderUnavailableError(f"All AI providers failed: {last_error}")
+
+    async def _attempt(self, provider: str, call: Callable[[str], Awaitable[Any]]) -> Any:
+        """Call one provider under its breaker and concurrency cap, recording latency and errors"""
+        stats = self._stats_for(provider)
+        breaker = self.breaker_for(provider)
+        if not await breaker.allow_request():
+            raise CircuitOpenError(f"Circuit for {provider} is {breaker.state}")
+
+        async with self._semaphore_for(provider):
+            stats.in_flight += 1
+            started = time.monotonic()
+            try:
+                result = await call(provider)
+            except asyncio.CancelledError:
+                await breaker.release_probe()
+                raise
+            except Exception as e:
+                stats.record_failure()
+                await breaker.record_failure(e)
+                raise
+            finally:
+                stats.in_flight -= 1
+            stats.record_success(time.monotonic() - started)
+            await breaker.record_success()
+            return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get routing and hedging statistics"""
+        return {
+            "routed": self.routed,
+            "hedges_sent": self.hedges_sent,
+            "hedges_won": self.hedges_won,
+            "hedge_budget_remaining": round(self.hedge_tokens, 2),
+            "providers": {name: stats.snapshot() for name, stats in self.stats.items()}
+        }
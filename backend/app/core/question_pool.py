@@ -0,0 +1,194 @@
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import re
+import time
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, List, Set
+
+from .config import settings
+from .redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+WORD = re.compile(r"\w+")
+
+# Delete the refill lock only if it still holds this refill's token, so a refill that outlived
+# its lock cannot release the one another worker has since taken
+RELEASE_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+def _tokens(question: Dict[str, Any]) -> Set[str]:
+    return set(WORD.findall(str(question.get("question", "")).casefold()))
+
+def _similar(a: Set[str], b: Set[str]) -> bool:
+    """Near-identical questions share most of their words"""
+    if not a or not b:
+        return a == b
+    return len(a & b) / len(a | b) >= settings.QUIZ_POOL_DEDUP_THRESHOLD
+
+class QuestionPool:
+    """Stock of pre-generated quiz questions per (topic, difficulty), refilled in the background"""
+
+    def __init__(self, ai_service, prefix: str = "quiz_pool"):
+        self.ai_service = ai_service
+        self.prefix = prefix
+        self._refills: Dict[str, asyncio.Task] = {}
+        self.refill_lags: Deque[float] = deque(maxlen=100)
+        self.stats = {
+            "requests": 0, "hits": 0, "partial_hits": 0, "misses": 0,
+            "served_from_pool": 0, "generated_inline": 0,
+            "refills": 0, "refill_failures": 0, "stocked": 0, "duplicates_dropped": 0
+        }
+
+    def _key(self, topic: str, difficulty: str) -> str:
+        topic = " ".join(topic.casefold().split())
+        digest = hashlib.sha256(topic.encode("utf-8")).hexdigest()[:16]
+        return f"{self.prefix}:{difficulty.casefold()}:{digest}"
+
+    async def take(self, topic: str, difficulty: str = "medium", count: int = 5) -> Dict[str, Any]:
+        """Serve questions from stock, generating only the shortfall inline"""
+        self.stats["requests"] += 1
+        key = self._key(topic, difficulty)
+
+        questions: List[Dict[str, Any]] = []
+        try:
+            pipe = redis_client.redis.pipeline()
+            # LPOP with a count needs Redis 6.2 or later
+            pipe.lpop(key, count)
+            pipe.llen(key)
+            popped, remaining = await pipe.execute()
+            questions = [json.loads(question) for question in popped or []]
+            if remaining < settings.QUIZ_POOL_LOW_WATER:
+                self._schedule_refill(key, topic, difficulty)
+        except Exception as e:
+            logger.warning(f"Question pool unavailable, generating inline: {e}")
+
+        self.stats["served_from_pool"] += len(questions)
+        if len(questions) >= count:
+            self.stats["hits"] += 1
+            return self._result(questions, topic, difficulty, "pool")
+
+        shortfall = count - len(questions)
+        generated = await self.ai_service.generate_quiz_questions(topic, difficulty, shortfall)
+        if not generated["success"]:
+            if not questions:
+                self.stats["misses"] += 1
+                return generated
+            logger.warning(f"Serving {len(questions)} of {count} pooled questions: {generated['error']}")
+            self.stats["partial_hits"] += 1
+            return self._result(questions, topic, difficulty, "pool")
+
+        fresh = generated["questions"][:shortfall]
+        self.stats["generated_inline"] += len(fresh)
+        if questions:
+            self.stats["partial_hits"] += 1
+            return self._result(questions + fresh, topic, difficulty, "mixed")
+        self.stats["misses"] += 1
+        return self._result(fresh, topic, difficulty, "generated")
+
+    @staticmethod
+    def _result(questions: List[Dict[str, Any]], topic: str, difficulty: str, source: str) -> Dict[str, Any]:
+        return {
+            "success": True,
+            "questions": questions,
+            "topic": topic,
+            "difficulty": difficulty,
+            "source": source
+        }
+
+    def _schedule_refill(self, key: str, topic: str, difficulty: str):
+        """Start a background refill unless one is already running in this process"""
+        if key in self._refills:
+            return
+        task = asyncio.ensure_future(self.refill(key, topic, difficulty))
+        self._refills[key] = task
+        task.add_done_callback(lambda _: self._refills.pop(key, None))
+
+    async def refill(self, key: str, topic: str, difficulty: str):
+        """Top a pool up to its cap in batches, dropping near-duplicates of stocked questions"""
+        lock_key = f"{key}:refill_lock"
+        token = uuid.uuid4().hex
+        # Only one worker refills a given pool at a time
+        if not await redis_client.redis.set(lock_key, token, nx=True, ex=settings.QUIZ_POOL_REFILL_LOCK_TTL):
+            return
+
+        started = time.perf_counter()
+        lag_recorded = False
+        try:
+            self.stats["refills"] += 1
+            # Bounded so a pool drained as fast as it fills does not hold the lock forever
+            for _ in range(math.ceil(settings.QUIZ_POOL_MAX_SIZE / settings.QUIZ_POOL_REFILL_BATCH)):
+                stocked = [json.loads(question) for question in await redis_client.redis.lrange(key, 0, -1)]
+                room = settings.QUIZ_POOL_MAX_SIZE - len(stocked)
+                if room <= 0:
+                    break
+
+                # Bypass the response cache, which would hand back the same questions every time
+                generated = await self.ai_service.generate_quiz_questions(
+                    topic, difficulty, min(room, settings.QUIZ_POOL_REFILL_BATCH), use_cache=False
+                )
+                if not generated["success"]:
+                    self.stats["refill_failures"] += 1
+                    logger.warning(f"Question pool refill failed for {topic!r}: {generated['error']}")
+                    break
+
+                fresh = self._dedupe(stocked, generated["questions"])[:room]
+                if not fresh:
+                    break
+                pipe = redis_client.redis.pipeline()
+                pipe.rpush(key, *[json.dumps(question) for question in fresh])
+                pipe.ltrim(key, 0, settings.QUIZ_POOL_MAX_SIZE - 1)
+                pipe.expire(key, settings.QUIZ_POOL_TTL)
+                await pipe.execute()
+                self.stats["stocked"] += len(fresh)
+
+                if not lag_recorded and len(stocked) + len(fresh) >= settings.QUIZ_POOL_LOW_WATER:
+                    self.refill_lags.append(time.perf_counter() - started)
+                    lag_recorded = True
+        except Exception as e:
+            self.stats["refill_failures"] += 1
+            logger.error(f"Question pool refill error for {topic!r}: {e}")
+        finally:
+            try:
+                await redis_client.redis.eval(RELEASE_LOCK, 1, lock_key, token)
+            except Exception as e:
+                logger.warning(f"Question pool refill lock for {topic!r} left to expire: {e}")
+
+    def _dedupe(self, stocked: List[Dict[str, Any]], candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Keep well-formed candidates that are not near-identical to stock or to each other"""
+        seen = [_tokens(question) for question in stocked]
+        fresh = []
+        for question in candidates:
+            if not isinstance(question, dict) or not question.get("question"):
+                continue
+            tokens = _tokens(question)
+            if any(_similar(tokens, other) for other in seen):
+                self.stats["duplicates_dropped"] += 1
+                continue
+            seen.append(tokens)
+            fresh.append(question)
+        return fresh
+
+    async def warm(self, topic: str, difficulty: str = "medium"):
+        """Fill a pool ahead of demand"""
+        await self.refill(self._key(topic, difficulty), topic, difficulty)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit rate, refill lag and stocking counters"""
+        requests = self.stats["requests"]
+        lags = sorted(self.refill_lags)
+        return {
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / requests, 4) if requests else 0.0,
+            "refills_running": len(self._refills),
+            "refill_lag_p50": round(lags[len(lags) // 2], 3) if lags else None,
+            "refill_lag_max": round(lags[-1], 3) if lags else None
+        }
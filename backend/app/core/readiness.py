@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+READY = "ready"
+FAILED = "failed"
+TIMEOUT = "timeout"
+PENDING = "pending"
+
+class ServiceReadiness:
+    """Start backing services concurrently and keep retrying the ones that did not come up"""
+
+    def __init__(self):
+        self.steps: Dict[str, Callable[[], Awaitable[Any]]] = {}
+        self.after: Dict[str, List[str]] = {}
+        self.services: Dict[str, Dict[str, Any]] = {}
+        self.startup_ms: Optional[float] = None
+        self._retry_task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, init: Callable[[], Awaitable[Any]], after: List[str] = None):
+        """Add a startup step, run only once the steps it comes after are ready"""
+        self.steps[name] = init
+        self.after[name] = after or []
+        self.services[name] = {"status": PENDING, "attempts": 0}
+
+    async def start(self):
+        """Run every step at once, each within its own timeout; failures leave the API degraded"""
+        started = time.perf_counter()
+        await self._start_all(list(self.steps))
+        self.startup_ms = round((time.perf_counter() - started) * 1000, 1)
+
+        pending = [name for name, service in self.services.items() if service["status"] != READY]
+        if pending:
+            logger.warning(f"Started degraded, retrying in the background: {', '.join(pending)}")
+            self._retry_task = asyncio.create_task(self._retry_failed())
+
+    async def _start_all(self, names: List[str]):
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run(name: str):
+            await asyncio.gather(*[tasks[dep] for dep in self.after[name] if dep in tasks])
+            waiting = [dep for dep in self.after[name] if self.services[dep]["status"] != READY]
+            if waiting:
+                # Left pending; the background retries start it once they are up
+                self.services[name]["error"] = f"Waiting for {', '.join(waiting)}"
+                return
+            await self._start(name)
+
+        for name in names:
+            tasks[name] = asyncio.ensure_future(run(name))
+        await asyncio.gather(*tasks.values())
+
+    async def _start(self, name: str):
+        timeout = settings.STARTUP_TIMEOUTS.get(name, settings.STARTUP_TIMEOUTS["default"])
+        service = self.services[name]
+        service["attempts"] += 1
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.steps[name](), timeout)
+            service.update({"status": READY, "error": None})
+        except asyncio.TimeoutError:
+            service.update({"status": TIMEOUT, "error": f"Not ready after {timeout}s"})
+            logger.error(f"{name} startup timed out after {timeout}s")
+        except Exception as e:
+            service.update({"status": FAILED, "error": str(e)})
+            logger.error(f"{name} startup failed: {e}")
+        service["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    async def _retry_failed(self):
+        while True:
+            pending = [name for name, service in self.services.items() if service["status"] != READY]
+            if not pending:
+                logger.info("All services ready")
+                return
+            await asyncio.sleep(settings.STARTUP_RETRY_INTERVAL)
+            await self._start_all(pending)
+
+    def is_ready(self) -> bool:
+        """Whether every required service is up"""
+        return all(
+            self.services.get(name, {}).get("status") == READY
+            for name in settings.STARTUP_REQUIRED_SERVICES
+        )
+
+    def status(self) -> str:
+        """healthy, degraded (required services up, others not) or unavailable"""
+        if not self.is_ready():
+            return "unavailable"
+        if all(service["status"] == READY for service in self.services.values()):
+            return "healthy"
+        return "degraded"
+
+    def describe(self) -> Dict[str, Any]:
+        """Get each service's startup state"""
+        return {
+            "status": self.status(),
+            "startup_ms": self.startup_ms,
+            "services": self.services
+        }
+
+    async def stop(self):
+        """Stop retrying failed services"""
+        if self._retry_task:
+            self._retry_task.cancel()
+
+# Global instance
+readiness = ServiceReadiness()
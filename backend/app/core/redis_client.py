@@ -53,6 +53,25 @@ class RedisClient:
     async def exists(self, key: str):
         """Check if key exists"""
         return await self.redis.exists(key)
+        
+    async def incr(self, key: str, amount: int = 1, field: str = None):
+        """Increment a counter, or a field of a hash counter"""
+        if field:
+            return await self.redis.hincrby(key, field, amount)
+        return await self.redis.incrby(key, amount)
+        
+    async def delete_pattern(self, pattern: str) -> int:
+        """Delete every key matching a glob pattern"""
+        deleted = 0
+        keys = []
+        async for key in self.redis.scan_iter(match=pattern, count=500):
+            keys.append(key)
+            if len(keys) >= 500:
+                deleted += await self.redis.delete(*keys)
+                keys = []
+        if keys:
+            deleted += await self.redis.delete(*keys)
+        return deleted
 
 # Global instance
 redis_client = RedisClient()
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import math
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# (frame, coalesce key, excluded user) as queued for a room
+Event = Tuple[Any, Optional[str], Optional[str]]
+
+# Time constant of each room's event rate average, seconds
+RATE_WINDOW = 1.0
+
+class RoomState:
+    __slots__ = ("events", "keys", "timer", "last_event", "rate")
+
+    def __init__(self, now: float):
+        self.events: List[Optional[Event]] = []
+        self.keys: Dict[str, int] = {}
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.last_event = now
+        self.rate = 1 / RATE_WINDOW
+
+class RoomBatcher:
+    """Collect a busy room's events over a tick and hand them over as one batch
+
+    A room that has been quiet for a tick gets its next event straight away. Events
+    arriving within a tick of the last flush wait for the next one, and a newer
+    presence event replaces the one it supersedes. A tick that ends with nothing to
+    send forgets the room, so only rooms with recent events hold any state. The tick
+    stretches from WS_BATCH_TICK_MIN_MS to WS_BATCH_TICK_MAX_MS as the room's event
+    rate rises.
+    """
+
+    def __init__(self, flush: Callable[[str, List[Event]], None]):
+        self.flush = flush
+        self.rooms: Dict[str, RoomState] = {}
+        self.stats = {"events": 0, "immediate": 0, "batches": 0, "batched_events": 0, "coalesced": 0, "max_batch": 0}
+
+    def tick(self, state: RoomState) -> float:
+        """Seconds a room's events are held, longer the busier the room"""
+        busy = min(1.0, state.rate / settings.WS_BATCH_BUSY_RATE)
+        return (settings.WS_BATCH_TICK_MIN_MS + (settings.WS_BATCH_TICK_MAX_MS - settings.WS_BATCH_TICK_MIN_MS) * busy) / 1000
+
+    def add(self, room_id: str, frame: Any, key: Optional[str] = None, exclude: Optional[str] = None):
+        """Queue an event for a room, or hand it over at once if the room is idle"""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        self.stats["events"] += 1
+        state = self.rooms.get(room_id)
+        if state is None:
+            # Whatever follows within a tick waits for the tick to end
+            state = self.rooms[room_id] = RoomState(now)
+            state.timer = loop.call_at(now + self.tick(state), self._flush, room_id)
+            self.stats["immediate"] += 1
+            self.flush(room_id, [(frame, key, exclude)])
+            return
+        state.rate = state.rate * math.exp((state.last_event - now) / RATE_WINDOW) + 1 / RATE_WINDOW
+        state.last_event = now
+
+        if key is not None and key in state.keys:
+            # Superseded: only the newest survives, in the newest one's place
+            state.events[state.keys[key]] = None
+            self.stats["coalesced"] += 1
+        if key is not None:
+            state.keys[key] = len(state.events)
+        state.events.append((frame, key, exclude))
+
+    def _flush(self, room_id: str):
+        state = self.rooms.get(room_id)
+        if state is None:
+            return
+        events = [event for event in state.events if event is not None]
+        if not events:
+            # Quiet for a whole tick: the room's next event goes straight out again
+            del self.rooms[room_id]
+            return
+        state.events, state.keys = [], {}
+        state.timer = asyncio.get_running_loop().call_later(self.tick(state), self._flush, room_id)
+        self.stats["batches"] += 1
+        self.stats["batched_events"] += len(events)
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(events))
+        try:
+            self.flush(room_id, events)
+        except Exception as e:
+            logger.error(f"Flushing {len(events)} events for room {room_id} failed: {e}")
+
+    def discard(self, room_id: str):
+        """Forget a room nobody is in any more, with whatever it had pending"""
+        state = self.rooms.pop(room_id, None)
+        if state is not None and state.timer is not None:
+            state.timer.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "enabled": settings.WS_ROOM_BATCHING_ENABLED,
+            "rooms": len(self.rooms),
+            "pending": sum(1 for state in self.rooms.values() if state.events),
+            "avg_batch": round(self.stats["batched_events"] / self.stats["batches"], 2) if self.stats["batches"] else 0.0
+        }
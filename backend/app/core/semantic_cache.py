@@ -0,0 +1,203 @@
+import asyncio
+import hashlib
+import heapq
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import numpy as np
+
+from .config import settings
+from .redis_client import redis_client
+from .vector_index import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+class SemanticCache:
+    """Serve answers to reworded questions from the answer to an earlier, similar question"""
+
+    def __init__(self, embeddings, prefix: str = "ai_semantic"):
+        self.embeddings = embeddings
+        self.prefix = prefix
+        self.stats_key = f"{prefix}:stats"
+        # Vectors are searched in-process; the answers themselves live in Redis with the usual TTLs
+        self.index = VectorIndex(
+            embeddings.dim,
+            mode=settings.SEMANTIC_CACHE_INDEX_MODE,
+            ivf_min_rows=settings.SEMANTIC_CACHE_IVF_MIN_ROWS,
+            nprobe=settings.SEMANTIC_CACHE_IVF_NPROBE
+        )
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._verifications = set()
+        self.stats = {
+            "lookups": 0, "hits": 0, "misses": 0, "stores": 0, "errors": 0,
+            "tokens_avoided": 0, "verified": 0, "false_hits": 0,
+            "evicted_age": 0, "evicted_capacity": 0, "evicted_false_hit": 0
+        }
+
+    def scope(self, class_id: Optional[str], content_type: str, variant: str) -> str:
+        """Name the partition a question is matched in; only questions asked the same way can share answers"""
+        digest = hashlib.sha256(variant.encode("utf-8")).hexdigest()[:16]
+        return f"{class_id or '-'}:{content_type}:{digest}"
+
+    def _entry_id(self, query: str, scope: str) -> str:
+        return hashlib.sha256(f"{scope}\n{' '.join(query.lower().split())}".encode("utf-8")).hexdigest()
+
+    def _expired(self, entry: Dict[str, Any], now: float) -> bool:
+        return now - entry["created"] > settings.SEMANTIC_CACHE_MAX_AGE
+
+    async def get(self, query: str, scope: str) -> Optional[Dict[str, Any]]:
+        """Look up the answer to the most similar earlier question in the scope"""
+        if not settings.SEMANTIC_CACHE_ENABLED:
+            return None
+        self.stats["lookups"] += 1
+        try:
+            vectors = await self.embeddings.embed([query], persist=False)
+            matches = self.index.search(vectors[0], 1, group=scope)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Semantic cache search failed: {e}")
+            return None
+        if not matches or matches[0][0] < settings.SEMANTIC_CACHE_THRESHOLD:
+            self.stats["misses"] += 1
+            return None
+
+        similarity, payload = matches[0]
+        entry = self.entries.get(payload["entry_id"])
+        now = time.time()
+        if entry is None or self._expired(entry, now):
+            self._evict(payload["entry_id"], "evicted_age")
+            self.stats["misses"] += 1
+            return None
+        try:
+            cached = await redis_client.get(f"{self.prefix}:{payload['entry_id']}")
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Semantic cache lookup failed: {e}")
+            return None
+        if not isinstance(cached, dict):
+            # The answer expired in Redis (or was stored by a worker that has since gone)
+            self._evict(payload["entry_id"], "evicted_age")
+            self.stats["misses"] += 1
+            return None
+
+        entry["hits"] += 1
+        entry["last_hit"] = now
+        self.stats["hits"] += 1
+        self.stats["tokens_avoided"] += (cached.get("usage") or {}).get("total_tokens", 0)
+        await self._count("hits")
+        return {
+            **cached,
+            "cached": True,
+            "semantic": {"entry_id": payload["entry_id"], "similarity": round(similarity, 4), "matched": payload["query"]}
+        }
+
+    async def set(self, query: str, scope: str, response: Dict[str, Any], ttl: int):
+        """Store a successful answer under its question"""
+        if not settings.SEMANTIC_CACHE_ENABLED:
+            return
+        entry_id = self._entry_id(query, scope)
+        try:
+            await redis_client.set(f"{self.prefix}:{entry_id}", response, expire=min(ttl, settings.SEMANTIC_CACHE_MAX_AGE))
+            vectors = await self.embeddings.embed([query], persist=False)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Semantic cache store failed: {e}")
+            return
+        self.index.add(entry_id, vectors, [{"entry_id": entry_id, "query": query}], group=scope)
+        self.entries[entry_id] = {"created": time.time(), "hits": 0, "last_hit": None}
+        self.stats["stores"] += 1
+        if len(self.entries) > settings.SEMANTIC_CACHE_MAX_ENTRIES:
+            self._evict_to_capacity()
+        self.index.maybe_train()
+
+    def _evict(self, entry_id: str, reason: str):
+        if self.entries.pop(entry_id, None) is not None:
+            self.stats[reason] += 1
+        self.index.remove(entry_id)
+
+    def _evict_to_capacity(self):
+        """Drop expired entries, then the least-hit (oldest first among equals) down to the low-water mark"""
+        now = time.time()
+        for entry_id in [entry_id for entry_id, entry in self.entries.items() if self._expired(entry, now)]:
+            self._evict(entry_id, "evicted_age")
+        excess = len(self.entries) - int(settings.SEMANTIC_CACHE_MAX_ENTRIES * settings.SEMANTIC_CACHE_EVICT_TO)
+        if excess > 0:
+            victims = heapq.nsmallest(
+                excess, self.entries.items(), key=lambda item: (item[1]["hits"], item[1]["last_hit"] or item[1]["created"])
+            )
+            for entry_id, _ in victims:
+                self._evict(entry_id, "evicted_capacity")
+
+    def should_verify(self) -> bool:
+        """Whether to sample this hit for a false-hit check"""
+        return random.random() < settings.SEMANTIC_CACHE_VERIFY_RATE
+
+    def verify(self, cached: Dict[str, Any], generate: Callable[[], Awaitable[Dict[str, Any]]]):
+        """Answer the question afresh in the background and count the hit as false if the answers differ"""
+        task = asyncio.create_task(self._verify(cached, generate))
+        self._verifications.add(task)
+        task.add_done_callback(self._verifications.discard)
+
+    async def _verify(self, cached: Dict[str, Any], generate: Callable[[], Awaitable[Dict[str, Any]]]):
+        try:
+            fresh = await generate()
+            if not fresh.get("success"):
+                return
+            vectors = await self.embeddings.embed([cached["content"], fresh["content"]], persist=False)
+            norms = np.maximum(np.linalg.norm(vectors, axis=1), 1e-12)
+            similarity = float(vectors[0] @ vectors[1] / (norms[0] * norms[1]))
+        except Exception as e:
+            logger.warning(f"Semantic cache verification failed: {e}")
+            return
+        self.stats["verified"] += 1
+        await self._count("verified")
+        if similarity < settings.SEMANTIC_CACHE_VERIFY_MIN_SIMILARITY:
+            self.stats["false_hits"] += 1
+            await self._count("false_hits")
+            # The matched entry answers a different question than it seemed to; stop serving it
+            self._evict(cached["semantic"]["entry_id"], "evicted_false_hit")
+            try:
+                await redis_client.delete(f"{self.prefix}:{cached['semantic']['entry_id']}")
+            except Exception as e:
+                logger.debug(f"Semantic cache entry removal failed: {e}")
+            logger.info(
+                f"Semantic cache false hit: {cached['semantic']['matched']!r} "
+                f"(similarity {cached['semantic']['similarity']}, answers {similarity:.2f})"
+            )
+
+    async def _count(self, field: str):
+        """Bump a shared counter"""
+        try:
+            await redis_client.incr(self.stats_key, field=field)
+        except Exception as e:
+            logger.debug(f"Semantic cache counter update failed: {e}")
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """Get hit, avoided-call and false-hit counts for this worker and for the whole cluster"""
+        stats = {
+            "enabled": settings.SEMANTIC_CACHE_ENABLED,
+            "entries": len(self.entries),
+            "worker": {
+                **self.stats,
+                # Verifying a hit calls the provider after all
+                "provider_calls_avoided": self.stats["hits"] - self.stats["verified"],
+                "hit_rate": round(self.stats["hits"] / self.stats["lookups"], 4) if self.stats["lookups"] else 0.0,
+                "false_hit_rate": round(self.stats["false_hits"] / self.stats["verified"], 4) if self.stats["verified"] else None
+            },
+            "index": self.index.get_stats()
+        }
+        try:
+            shared = await redis_client.redis.hgetall(self.stats_key)
+            verified = int(shared.get("verified", 0))
+            false_hits = int(shared.get("false_hits", 0))
+            stats["shared"] = {
+                "provider_calls_avoided": int(shared.get("hits", 0)) - verified,
+                "verified": verified,
+                "false_hits": false_hits,
+                "false_hit_rate": round(false_hits / verified, 4) if verified else None
+            }
+        except Exception as e:
+            logger.debug(f"Semantic cache shared stats unavailable: {e}")
+        return stats
@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+from collections import defaultdict, deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+from .config import settings
+
+WORDS = (
+    "concept principle example model process structure pattern method theory evidence "
+    "variable function system relation property definition result cause effect context "
+    "measure value change rate balance energy signal source sequence factor"
+).split()
+
+QUESTION_STEMS = [
+    "Which statement about {topic} best describes the {a} of a {b}?",
+    "In {topic}, what is the main {a} behind a {b}?",
+    "How does the {a} of {topic} affect its {b}?",
+    "Which {a} is most closely related to {b} in {topic}?",
+    "What happens to the {a} when the {b} changes in {topic}?",
+]
+
+QUIZ_REQUEST = re.compile(r"Generate (\d+) multiple choice questions about (.+?) at (\w+) difficulty", re.S)
+MODERATION_BATCH = "Messages: "
+
+class SimulatedProviderError(Exception):
+    """Injected provider failure"""
+
+class SimulatedRateLimitError(SimulatedProviderError):
+    """Injected rate-limit response"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limit exceeded, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+class SimulatedProvider:
+    """Local stand-in for an LLM provider: schema-valid output with configurable latency and failures"""
+
+    def __init__(self, seed: int = None):
+        self.seed = settings.AI_SIM_SEED if seed is None else seed
+        # Repeats of a prompt get fresh but reproducible output, so pools and batches still fill
+        self._occurrences: Dict[str, int] = defaultdict(int)
+        self._timing = random.Random(self.seed)
+        self._requests: Deque[float] = deque()
+        self.stats = {"requests": 0, "errors": 0, "rate_limited": 0, "tokens": 0}
+
+    def _rng(self, prompt: str) -> random.Random:
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        if len(self._occurrences) >= 100000:
+            self._occurrences.clear()
+        self._occurrences[digest] += 1
+        return random.Random(f"{self.seed}:{digest}:{self._occurrences[digest]}")
+
+    def _latency(self) -> float:
+        """Sample a lognormal latency matching the configured median and p99, in seconds"""
+        median = settings.AI_SIM_LATENCY_MEDIAN_MS / 1000
+        sigma = math.log(settings.AI_SIM_LATENCY_P99_MS / settings.AI_SIM_LATENCY_MEDIAN_MS) / 2.326
+        return self._timing.lognormvariate(math.log(median), max(sigma, 0.0))
+
+    def _admit(self):
+        """Apply the rate limit and injected failures to a new request"""
+        self.stats["requests"] += 1
+        now = time.monotonic()
+        if settings.AI_SIM_RATE_LIMIT_RPM:
+            while self._requests and now - self._requests[0] >= 60:
+                self._requests.popleft()
+            if len(self._requests) >= settings.AI_SIM_RATE_LIMIT_RPM:
+                self.stats["rate_limited"] += 1
+                raise SimulatedRateLimitError(60 - (now - self._requests[0]))
+            self._requests.append(now)
+
+        roll = self._timing.random()
+        if roll < settings.AI_SIM_RATE_LIMIT_RATE:
+            self.stats["rate_limited"] += 1
+            raise SimulatedRateLimitError(self._timing.uniform(1, 10))
+        if roll < settings.AI_SIM_RATE_LIMIT_RATE + settings.AI_SIM_ERROR_RATE:
+            self.stats["errors"] += 1
+            raise SimulatedProviderError("Simulated provider error")
+
+    async def generate(self, prompt: str, max_tokens: Optional[int] = None) -> Dict[str, Any]:
+        """Return a complete response after a sampled latency"""
+        self._admit()
+        content = self.respond(prompt, max_tokens)
+        await asyncio.sleep(self._latency())
+        return {
+            "success": True,
+            "provider": "simulated",
+            "content": content,
+            "usage": self._usage(prompt, content)
+        }
+
+    async def stream(self, prompt: str, max_tokens: Optional[int], usage: Dict[str, Any]) -> AsyncIterator[str]:
+        """Yield a response in token-sized chunks at the configured rate"""
+        self._admit()
+        content = self.respond(prompt, max_tokens)
+        await asyncio.sleep(self._latency())  # time to first token
+        delay = 1 / settings.AI_SIM_TOKENS_PER_SECOND
+        for chunk in re.findall(r"\S+\s*|\s+", content):
+            yield chunk
+            await asyncio.sleep(delay)
+        usage.update(self._usage(prompt, content))
+
+    def _usage(self, prompt: str, content: str) -> Dict[str, int]:
+        prompt_tokens = len(prompt) // 4 + 1
+        completion_tokens = len(content) // 4 + 1
+        self.stats["tokens"] += prompt_tokens + completion_tokens
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+
+    def respond(self, prompt: str, max_tokens: Optional[int] = None) -> str:
+        """Build output in the format the prompt asks for"""
+        rng = self._rng(prompt)
+        if '"is_appropriate"' in prompt:
+            start = prompt.find(MODERATION_BATCH)
+            if start >= 0:
+                messages, _ = json.JSONDecoder().raw_decode(prompt, start + len(MODERATION_BATCH))
+                return json.dumps([{"id": message["id"], **self._verdict(rng)} for message in messages])
+            return json.dumps(self._verdict(rng))
+        quiz = QUIZ_REQUEST.search(prompt)
+        if quiz:
+            count, topic = int(quiz.group(1)), quiz.group(2).strip()
+            return json.dumps({"questions": [self._question(rng, topic) for _ in range(count)]})
+        if '"progress_score"' in prompt:
+            return json.dumps(self._analysis(rng))
+        if '"difficulty_progression"' in prompt:
+            return json.dumps(self._learning_path(rng))
+        if '"related_concepts"' in prompt:
+            return json.dumps({
+                "explanation": self._text(rng, max_tokens),
+                "examples": [f"An everyday {word}" for word in rng.sample(WORDS, 2)],
+                "related_concepts": rng.sample(WORDS, 3)
+            })
+        return self._text(rng, max_tokens)
+
+    def _verdict(self, rng: random.Random) -> Dict[str, Any]:
+        if rng.random() < settings.AI_SIM_FLAG_RATE:
+            return {"is_appropriate": False, "reason": "Simulated policy violation", "severity": rng.choice(["medium", "high"])}
+        return {"is_appropriate": True, "reason": "", "severity": "low"}
+
+    def _question(self, rng: random.Random, topic: str) -> Dict[str, Any]:
+        a, b = rng.sample(WORDS, 2)
+        options = [f"The {word} {other}" for word, other in zip(rng.sample(WORDS, 4), rng.sample(WORDS, 4))]
+        return {
+            "question": rng.choice(QUESTION_STEMS).format(topic=topic, a=a, b=b),
+            "options": options,
+            "correct_answer": rng.choice(options),
+            "explanation": f"The {a} determines how the {b} behaves."
+        }
+
+    def _analysis(self, rng: random.Random) -> Dict[str, Any]:
+        return {
+            "progress_score": rng.randint(40, 95),
+            "strengths": [f"Understanding of {word}" for word in rng.sample(WORDS, 2)],
+            "areas_for_improvement": [f"Applying {word}" for word in rng.sample(WORDS, 2)],
+            "recommendations": [f"Practice {word} exercises" for word in rng.sample(WORDS, 3)],
+            "next_steps": [f"Review {word}" for word in rng.sample(WORDS, 2)],
+            "estimated_completion_time": f"{rng.randint(2, 12)} weeks"
+        }
+
+    def _learning_path(self, rng: random.Random) -> Dict[str, Any]:
+        levels = ["beginner", "intermediate", "advanced"]
+        steps = [
+            {
+                "title": f"Step {index + 1}: {word.title()}",
+                "description": f"Learn the {word} and apply it to examples.",
+                "difficulty": levels[min(index * len(levels) // 5, 2)],
+                "estimated_time": f"{rng.randint(1, 3)} weeks"
+            }
+            for index, word in enumerate(rng.sample(WORDS, 5))
+        ]
+        return {
+            "path": steps,
+            "estimated_duration": f"{rng.randint(6, 15)} weeks",
+            "difficulty_progression": [step["difficulty"] for step in steps]
+        }
+
+    def _text(self, rng: random.Random, max_tokens: Optional[int]) -> str:
+        limit = min(max_tokens or settings.AI_SIM_MAX_TEXT_TOKENS, settings.AI_SIM_MAX_TEXT_TOKENS)
+        sentences: List[str] = []
+        words = 0
+        target = rng.randint(limit // 2, limit)
+        while words < target:
+            sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 14)))
+            sentences.append(sentence.capitalize() + ".")
+            words += len(sentence.split())
+        return " ".join(sentences)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get request and injected failure counts"""
+        return dict(self.stats)
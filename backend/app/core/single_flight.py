@@ -0,0 +1,65 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    """Collapse identical concurrent calls onto one shared in-flight task"""
+
+    def __init__(self, default_timeout: Optional[float] = None):
+        self.default_timeout = default_timeout
+        self._calls: Dict[str, asyncio.Task] = {}
+        self.executed = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[Any]],
+        timeout: Optional[float] = None
+    ) -> Any:
+        """Run fn once per key; concurrent callers share its result or exception"""
+        task = self._calls.get(key)
+        if task is None:
+            self.executed += 1
+            task = asyncio.ensure_future(self._run(fn, timeout or self.default_timeout))
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.coalesced += 1
+
+        # Shield so one waiter being cancelled does not cancel the shared call
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        """Number of distinct calls currently running"""
+        return len(self._calls)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get coalescing statistics"""
+        return {
+            "in_flight": self.in_flight(),
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "timeouts": self.timeouts
+        }
+
+    async def _run(self, fn: Callable[[], Awaitable[Any]], timeout: Optional[float]) -> Any:
+        """Run the shared call, bounded by the per-key timeout"""
+        try:
+            if timeout:
+                return await asyncio.wait_for(fn(), timeout)
+            return await fn()
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+
+    def _finish(self, key: str, task: asyncio.Task):
+        """Forget a finished call so the next request starts a fresh one"""
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception as retrieved even if every waiter went away
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"Single-flight call {key} failed: {task.exception()}")
@@ -1,23 +1,82 @@
+import asyncio
 import logging
-from typing import Dict, Any, List
+import math
+import time
+from typing import Dict, Any, List, Optional, Set
+from .config import settings
+from .timing_wheel import TimingWheel
 from .websocket_manager import websocket_manager
 from .neo4j_client import neo4j_client
+from .redis_client import redis_client
 
 logger = logging.getLogger(__name__)
 
+# Seconds between expiry checks; a room outlives STUDY_ROOM_TIMEOUT by at most this much
+EXPIRY_TICK = 10.0
+
+# Members are shared by every node as a sorted set scored by when their node last stamped them.
+# A node re-stamps its own members at least every STUDY_ROOM_TIMEOUT, so an entry older than twice
+# that belongs to a node that went away without saying so.
+
+# Drop stale members, then add the user unless that would take the room over capacity
+JOIN_ROOM = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if not redis.call('ZSCORE', KEYS[1], ARGV[4]) and redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[3], ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return 1
+"""
+
+# Remove a member only if its entry is still the one this node stamped; a rejoin elsewhere re-stamps it
+LEAVE_ROOM = """
+if redis.call('ZSCORE', KEYS[1], ARGV[1]) == ARGV[2] then
+    return redis.call('ZREM', KEYS[1], ARGV[1])
+end
+return 0
+"""
+
+# Re-stamp (user, stamp) pairs this node still holds, skipping any another node has stamped since
+REFRESH_MEMBERS = """
+for i = 3, #ARGV, 2 do
+    local score = redis.call('ZSCORE', KEYS[1], ARGV[i])
+    if not score or score == ARGV[i + 1] then
+        redis.call('ZADD', KEYS[1], ARGV[1], ARGV[i])
+    end
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
 class StudyRoomService:
     def __init__(self):
         self.active_rooms = {}
+        self.expiry = TimingWheel(EXPIRY_TICK, math.ceil(settings.STUDY_ROOM_TIMEOUT / EXPIRY_TICK) + 2)
+        self.stats = {"expired": 0, "rejected_full": 0}
+        self._expiry_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start expiring abandoned rooms"""
+        self._expiry_task = asyncio.create_task(self.expiry.run(self._check_expiry))
+
+    def stop(self):
+        if self._expiry_task is not None:
+            self._expiry_task.cancel()
         
     async def create_room(self, room_id: str, room_data: Dict[str, Any]):
         """Create a new study room"""
         try:
             self.active_rooms[room_id] = {
                 "id": room_id,
+                # Members who joined through this node, and the stamp each was given in Redis
                 "users": set(),
+                "stamps": {},
                 "data": room_data,
-                "created_at": "now"
+                "created_at": "now",
+                "last_activity": time.monotonic()
             }
+            self.expiry.schedule(room_id, settings.STUDY_ROOM_TIMEOUT)
             
             # Create room in Neo4j
             query = """
@@ -40,8 +99,15 @@ class StudyRoomService:
         try:
             if room_id not in self.active_rooms:
                 await self.create_room(room_id, {"name": f"Room {room_id}"})
+            room = self.active_rooms[room_id]
+            await self._prune(room)
+            if not await self._reserve(room, user_id):
+                self.stats["rejected_full"] += 1
+                logger.warning(f"User {user_id} turned away from full room {room_id}")
+                return False
                 
-            self.active_rooms[room_id]["users"].add(user_id)
+            room["users"].add(user_id)
+            room["last_activity"] = time.monotonic()
             await websocket_manager.join_room(user_id, room_id)
             
             # Record user-room relationship in Neo4j
@@ -65,7 +131,10 @@ class StudyRoomService:
         """Remove a user from a study room"""
         try:
             if room_id in self.active_rooms:
-                self.active_rooms[room_id]["users"].discard(user_id)
+                room = self.active_rooms[room_id]
+                room["users"].discard(user_id)
+                room["last_activity"] = time.monotonic()
+                await self._release(room, user_id)
                 await websocket_manager.leave_room(user_id, room_id)
                 
                 # Remove user-room relationship in Neo4j
@@ -84,12 +153,148 @@ class StudyRoomService:
             logger.error(f"Error removing user {user_id} from room {room_id}: {e}")
             return False
             
+    def capacity(self, room_id: str) -> int:
+        """Most users a room takes: its own max_users, capped by MAX_STUDY_ROOM_SIZE"""
+        room = self.active_rooms.get(room_id)
+        requested = (room["data"].get("max_users") if room else None) or settings.MAX_STUDY_ROOM_SIZE
+        return min(requested, settings.MAX_STUDY_ROOM_SIZE)
+
+    async def is_full(self, room_id: str, user_id: str) -> bool:
+        """Whether joining would take the room over capacity, counting members on every node; members already in can always rejoin"""
+        room = self.active_rooms.get(room_id)
+        if room is None or user_id in room["users"]:
+            return False
+        await self._prune(room)
+        members = await self._members(room)
+        return user_id not in members and len(members) >= self.capacity(room_id)
+
+    def _key(self, room_id: str) -> str:
+        return f"study_room:{room_id}:members"
+
+    def _stale_before(self, stamp: int) -> int:
+        return stamp - 2 * settings.STUDY_ROOM_TIMEOUT * 1000
+
+    async def _members(self, room: Dict[str, Any]) -> Set[str]:
+        """Users in the room on any node; only this node's when Redis is unreachable"""
+        try:
+            key = self._key(room["id"])
+            pipe = redis_client.redis.pipeline()
+            pipe.zremrangebyscore(key, "-inf", self._stale_before(int(time.time() * 1000)))
+            pipe.zrange(key, 0, -1)
+            return set((await pipe.execute())[1]) | room["users"]
+        except Exception as e:
+            logger.warning(f"Could not read members of study room {room['id']}: {e}")
+            return set(room["users"])
+
+    async def _reserve(self, room: Dict[str, Any], user_id: str) -> bool:
+        """Take a place in the room if it has one, counting members on every node"""
+        stamp = int(time.time() * 1000)
+        try:
+            joined = await redis_client.redis.eval(
+                JOIN_ROOM, 1, self._key(room["id"]),
+                self._stale_before(stamp), self.capacity(room["id"]), stamp, user_id,
+                2 * settings.STUDY_ROOM_TIMEOUT
+            )
+        except Exception as e:
+            logger.warning(f"Could not share membership of study room {room['id']}: {e}")
+            return user_id in room["users"] or len(room["users"]) < self.capacity(room["id"])
+        if joined:
+            room["stamps"][user_id] = stamp
+        return bool(joined)
+
+    async def _release(self, room: Dict[str, Any], user_id: str):
+        """Give up the place this node took for a user, unless another node has taken it over since"""
+        stamp = room["stamps"].pop(user_id, None)
+        if stamp is None:
+            return
+        try:
+            await redis_client.redis.eval(LEAVE_ROOM, 1, self._key(room["id"]), user_id, stamp)
+        except Exception as e:
+            logger.warning(f"Could not release {user_id}'s place in study room {room['id']}: {e}")
+
+    async def _refresh(self, room: Dict[str, Any]):
+        """Re-stamp this node's members so other nodes keep counting them"""
+        stamp = int(time.time() * 1000)
+        pairs = [value for user_id in room["users"] for value in (user_id, room["stamps"].get(user_id, ""))]
+        try:
+            await redis_client.redis.eval(
+                REFRESH_MEMBERS, 1, self._key(room["id"]), stamp, 2 * settings.STUDY_ROOM_TIMEOUT, *pairs
+            )
+        except Exception as e:
+            logger.warning(f"Could not refresh members of study room {room['id']}: {e}")
+            return
+        room["stamps"].update(dict.fromkeys(room["users"], stamp))
+
+    async def _prune(self, room: Dict[str, Any]):
+        """Forget members whose socket on this node is gone; disconnecting only clears the WebSocket side
+
+        Only members who joined through this node are looked at, since only their disconnects are seen here.
+        """
+        connected = websocket_manager.room_connections.get(room["id"], ())
+        for user_id in room["users"] - set(connected):
+            room["users"].discard(user_id)
+            await self._release(room, user_id)
+
+    async def forget_disconnected(self, user_id: str):
+        """Give up a disconnected user's places now rather than at the next check of each room"""
+        for room in list(self.active_rooms.values()):
+            if user_id in room["users"]:
+                await self._prune(room)
+
+    async def _check_expiry(self, room_id: str):
+        """Expire a room left empty on every node and quiet for STUDY_ROOM_TIMEOUT, or check again when it could be"""
+        room = self.active_rooms.get(room_id)
+        if room is None:
+            return
+        await self._prune(room)
+        if room["users"]:
+            await self._refresh(room)
+            self.expiry.schedule(room_id, settings.STUDY_ROOM_TIMEOUT)
+            return
+        if await self._members(room):
+            # In use through other nodes, which refresh their members and expire it when they are done
+            self.expiry.schedule(room_id, settings.STUDY_ROOM_TIMEOUT)
+            return
+        idle = time.monotonic() - room["last_activity"]
+        if idle < settings.STUDY_ROOM_TIMEOUT:
+            self.expiry.schedule(room_id, settings.STUDY_ROOM_TIMEOUT - idle)
+            return
+        await self.expire_room(room_id)
+
+    async def expire_room(self, room_id: str):
+        """Drop an abandoned room from memory, and its memberships from the graph; its history stays"""
+        self.active_rooms.pop(room_id, None)
+        self.stats["expired"] += 1
+        try:
+            query = """
+            MATCH (r:StudyRoom {id: $room_id})
+            OPTIONAL MATCH (:User)-[j:JOINED_ROOM]->(r)
+            DELETE j
+            SET r.active = false, r.expired_at = datetime()
+            """
+            await neo4j_client.execute_query(query, {"room_id": room_id})
+            logger.info(f"Study room {room_id} expired")
+        except Exception as e:
+            logger.error(f"Error expiring study room {room_id} in the graph: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get live room and member gauges and expiry counters"""
+        return {
+            "rooms": len(self.active_rooms),
+            "members": sum(len(room["users"]) for room in self.active_rooms.values()),
+            "max_room_size": settings.MAX_STUDY_ROOM_SIZE,
+            "room_timeout_s": settings.STUDY_ROOM_TIMEOUT,
+            "expiry": self.expiry.get_stats(),
+            **self.stats
+        }
+
     async def get_room_info(self, room_id: str):
         """Get information about a study room"""
         try:
             if room_id in self.active_rooms:
                 room = self.active_rooms[room_id].copy()
-                room["users"] = list(room["users"])
+                room.pop("stamps")
+                room["users"] = sorted(await self._members(room))
                 return room
             return None
         except Exception as e:
@@ -98,6 +303,8 @@ class StudyRoomService:
             
     async def record_user_interaction(self, user_id: str, room_id: str, interaction_type: str):
         """Record user interaction in Neo4j"""
+        if room_id in self.active_rooms:
+            self.active_rooms[room_id]["last_activity"] = time.monotonic()
         try:
             query = """
             MATCH (u:User {id: $user_id})
@@ -133,4 +340,7 @@ class StudyRoomService:
             return [room["r"] for room in result]
         except Exception as e:
             logger.error(f"Error getting user rooms for {user_id}: {e}")
-            return [] 
\ No newline at end of file
+            return []
+
+# Global instance
+study_room_service = StudyRoomService()
@@ -0,0 +1,70 @@
+import asyncio
+import logging
+import math
+from typing import Any, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+class TimingWheel:
+    """Hashed timing wheel: scheduling is O(1) and a tick only visits the slot it lands on
+
+    Timers are never cancelled or moved; whoever handles a due item checks whether it
+    still applies and schedules it again if not. Delays longer than a full turn wait
+    out the extra turns in their slot.
+    """
+
+    def __init__(self, tick: float, slots: int):
+        self.tick = tick
+        self.slots: List[List[List[Any]]] = [[] for _ in range(slots)]
+        self.cursor = 0
+        self.size = 0
+        self.stats = {"scheduled": 0, "fired": 0, "errors": 0}
+
+    def schedule(self, item: Any, delay: float):
+        """Fire item after at least delay seconds (rounded up to whole ticks)"""
+        ticks = max(1, math.ceil(delay / self.tick))
+        slot = (self.cursor + ticks) % len(self.slots)
+        self.slots[slot].append([(ticks - 1) // len(self.slots), item])
+        self.size += 1
+        self.stats["scheduled"] += 1
+
+    def advance(self) -> List[Any]:
+        """Move one tick on and return the items now due"""
+        self.cursor = (self.cursor + 1) % len(self.slots)
+        slot = self.slots[self.cursor]
+        if not slot:
+            return []
+        due, waiting = [], []
+        for entry in slot:
+            if entry[0] == 0:
+                due.append(entry[1])
+            else:
+                entry[0] -= 1
+                waiting.append(entry)
+        self.slots[self.cursor] = waiting
+        self.size -= len(due)
+        self.stats["fired"] += len(due)
+        return due
+
+    async def run(self, on_due: Callable[[Any], Any]):
+        """Advance every tick for ever, calling on_due (maybe a coroutine function) for each due item"""
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time() + self.tick
+        while True:
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            # Scheduled against the start, so slow ticks do not make the wheel drift
+            next_tick += self.tick
+            for item in self.advance():
+                try:
+                    result = on_due(item)
+                    if asyncio.iscoroutine(result):
+                        await result
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    logger.error(f"Timer for {item!r} failed: {e}")
+
+    def __len__(self) -> int:
+        return self.size
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"pending": self.size, "tick_s": self.tick, "slots": len(self.slots), **self.stats}
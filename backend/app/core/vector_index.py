@@ -0,0 +1,269 @@
+import asyncio
+import logging
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .blocking_executor import blocking_executor
+
+logger = logging.getLogger(__name__)
+
+EXACT = "exact"
+IVF = "ivf"
+
+class VectorIndex:
+    """Cosine-similarity index over float32 rows, searched exactly or through an inverted file (IVF)"""
+
+    def __init__(self, dim: int, mode: str = "auto", ivf_min_rows: int = 20000, nprobe: int = 8, capacity: int = 1024):
+        self.dim = dim
+        self.mode = mode  # "exact", "ivf", or "auto" (IVF from ivf_min_rows rows)
+        self.ivf_min_rows = ivf_min_rows
+        self.nprobe = nprobe
+        self.size = 0
+        # Rows live in one contiguous block that doubles when full
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.groups = np.zeros(capacity, dtype=np.int32)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.payloads: List[Optional[Dict[str, Any]]] = []
+        self.docs: Dict[str, List[int]] = {}
+        self.group_codes: Dict[str, int] = {}
+        self.dead = 0
+        # IVF state: unit centroids, each row's list and the rows of each list
+        self.centroids: Optional[np.ndarray] = None
+        self.assignments = np.full(capacity, -1, dtype=np.int32)
+        self._lists: Optional[List[np.ndarray]] = None
+        self.trained_size = 0
+        self.trainings = 0
+        self.compactions = 0
+        self._training = False
+        self._train_task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return self.size - self.dead
+
+    def _group_code(self, group: Optional[str]) -> int:
+        if group is None:
+            return -1
+        if group not in self.group_codes:
+            self.group_codes[group] = len(self.group_codes)
+        return self.group_codes[group]
+
+    def _reserve(self, rows: int):
+        capacity = len(self.vectors)
+        if self.size + rows <= capacity:
+            return
+        while capacity < self.size + rows:
+            capacity *= 2
+        self.vectors = np.resize(self.vectors, (capacity, self.dim))
+        self.groups = np.resize(self.groups, capacity)
+        self.alive = np.resize(self.alive, capacity)
+        assignments = np.full(capacity, -1, dtype=np.int32)
+        assignments[:self.size] = self.assignments[:self.size]
+        self.assignments = assignments
+
+    def add(self, doc: str, vectors: np.ndarray, payloads: List[Dict[str, Any]], group: Optional[str] = None):
+        """Add a document's rows, replacing any rows the document already had"""
+        self.remove(doc)
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if not len(vectors):
+            return
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.maximum(norms, 1e-12)
+
+        self._reserve(len(vectors))
+        start, end = self.size, self.size + len(vectors)
+        self.vectors[start:end] = vectors
+        self.groups[start:end] = self._group_code(group)
+        self.alive[start:end] = True
+        self.payloads.extend(payloads)
+        self.docs[doc] = list(range(start, end))
+        self.size = end
+
+        if self.centroids is not None:
+            # New rows join their nearest list; the lists are rebuilt on the next search
+            self.assignments[start:end] = np.argmax(vectors @ self.centroids.T, axis=1)
+            self._lists = None
+
+    def remove(self, doc: str) -> int:
+        """Drop a document's rows; the space is reclaimed once enough rows are dead"""
+        rows = self.docs.pop(doc, None)
+        if not rows:
+            return 0
+        self.alive[rows] = False
+        for row in rows:
+            self.payloads[row] = None
+        self.dead += len(rows)
+        if self.dead > 1024 and self.dead > self.size // 2:
+            self._compact()
+        return len(rows)
+
+    def remove_group(self, group: str) -> int:
+        """Drop every document in a group"""
+        code = self.group_codes.get(group)
+        if code is None:
+            return 0
+        docs = [doc for doc, rows in self.docs.items() if self.groups[rows[0]] == code]
+        return sum(self.remove(doc) for doc in docs)
+
+    def _compact(self):
+        keep = np.flatnonzero(self.alive[:self.size])
+        remap = np.full(self.size, -1, dtype=np.int64)
+        remap[keep] = np.arange(len(keep))
+        self.vectors[:len(keep)] = self.vectors[keep]
+        self.groups[:len(keep)] = self.groups[keep]
+        self.assignments[:len(keep)] = self.assignments[keep]
+        self.alive[:len(keep)] = True
+        self.alive[len(keep):] = False
+        self.payloads = [self.payloads[row] for row in keep]
+        self.docs = {doc: [int(remap[row]) for row in rows] for doc, rows in self.docs.items()}
+        self.size = len(keep)
+        self.dead = 0
+        self.compactions += 1
+        self._lists = None
+
+    def train(self, nlist: Optional[int] = None, iterations: int = 10, sample_size: int = 50000, seed: int = 0) -> Tuple[np.ndarray, np.ndarray, int]:
+        """Cluster the live rows with spherical k-means and assign every row to its nearest centroid; CPU-bound"""
+        size = self.size
+        vectors = self.vectors
+        rows = np.flatnonzero(self.alive[:size])
+        nlist = min(nlist or max(1, int(math.sqrt(len(rows)))), len(rows))
+        rng = np.random.default_rng(seed)
+        if len(rows) > sample_size:
+            rows = rng.choice(rows, sample_size, replace=False)
+        sample = vectors[rows]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            empty = ~sums.any(axis=1)
+            # Empty clusters restart from random rows
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+        centroids = centroids.astype(np.float32)
+        assignments = np.empty(size, dtype=np.int32)
+        for start in range(0, size, 65536):
+            assignments[start:start + 65536] = np.argmax(vectors[start:min(start + 65536, size)] @ centroids.T, axis=1)
+        return centroids, assignments, size
+
+    def set_centroids(self, centroids: np.ndarray, assignments: np.ndarray, size: int):
+        """Switch to IVF search with the output of train, assigning rows added since then"""
+        self.centroids = centroids
+        self.assignments[:size] = assignments
+        if self.size > size:
+            self.assignments[size:self.size] = np.argmax(self.vectors[size:self.size] @ centroids.T, axis=1)
+        self._lists = None
+        self.trained_size = len(self)
+
+    def reset_centroids(self):
+        """Go back to exact search only"""
+        self.centroids = None
+        self._lists = None
+        self.trained_size = 0
+
+    def search_mode(self) -> str:
+        """Search mode for the current size"""
+        if self.mode == "auto":
+            return IVF if len(self) >= self.ivf_min_rows else EXACT
+        return self.mode
+
+    def maybe_train(self):
+        """Retrain the IVF lists in the background once the index has doubled since the last training"""
+        if self.search_mode() != IVF or self._training:
+            return
+        if self.centroids is not None and len(self) < 2 * self.trained_size:
+            return
+        self._training = True
+        self._train_task = asyncio.create_task(self._train())
+
+    async def _train(self):
+        try:
+            compactions = self.compactions
+            centroids, assignments, size = await blocking_executor.run("vector_index", self.train)
+            if compactions != self.compactions:
+                # Rows moved while training; the next addition retrains
+                return
+            self.set_centroids(centroids, assignments, size)
+            self.trainings += 1
+            logger.info(f"Vector index trained: {len(centroids)} lists over {len(self)} rows")
+        except Exception as e:
+            logger.error(f"Error training vector index: {e}")
+        finally:
+            self._training = False
+
+    def _inverted_lists(self) -> List[np.ndarray]:
+        if self._lists is None:
+            assignments = self.assignments[:self.size]
+            order = np.argsort(assignments, kind="stable")
+            bounds = np.searchsorted(assignments[order], np.arange(len(self.centroids) + 1))
+            self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(self.centroids))]
+        return self._lists
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int = 5,
+        group: Optional[str] = None,
+        mode: Optional[str] = None,
+        nprobe: Optional[int] = None
+    ) -> List[Tuple[float, Dict[str, Any]]]:
+        """Find the k rows most similar to the query, optionally within one group"""
+        mode = mode or self.search_mode()
+        nprobe = nprobe or self.nprobe
+        if len(self) == 0:
+            return []
+        code = None
+        if group is not None:
+            code = self.group_codes.get(group)
+            if code is None:
+                return []
+        query = np.asarray(query, dtype=np.float32).reshape(self.dim)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        if mode == IVF and self.centroids is not None:
+            lists = self._inverted_lists()
+            nearest = np.argsort(-(self.centroids @ query))[:nprobe]
+            rows = np.concatenate([lists[index] for index in nearest])
+        else:
+            rows = None
+
+        if rows is None:
+            scores = self.vectors[:self.size] @ query
+            mask = self.alive[:self.size]
+            if code is not None:
+                mask = mask & (self.groups[:self.size] == code)
+            scores = np.where(mask, scores, -np.inf)
+            candidates = np.arange(self.size)
+        else:
+            mask = self.alive[rows]
+            if code is not None:
+                mask &= self.groups[rows] == code
+            candidates = rows[mask]
+            scores = self.vectors[candidates] @ query
+
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            (float(scores[index]), self.payloads[candidates[index]])
+            for index in top
+            if np.isfinite(scores[index])
+        ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get row counts, memory use and IVF state"""
+        return {
+            "rows": len(self),
+            "dead_rows": self.dead,
+            "documents": len(self.docs),
+            "groups": len(self.group_codes),
+            "dim": self.dim,
+            "memory_bytes": int(self.vectors.nbytes + self.groups.nbytes + self.alive.nbytes + self.assignments.nbytes),
+            "mode": self.search_mode(),
+            "ivf_lists": len(self.centroids) if self.centroids is not None else 0,
+            "trained_rows": self.trained_size,
+            "trainings": self.trainings
+        }
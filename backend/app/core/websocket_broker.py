@@ -0,0 +1,189 @@
+import asyncio
+import json
+import logging
+import uuid
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Set, Tuple
+
+from .config import settings
+from .redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+ROOM = "room"
+USER = "user"
+ALL = "all"
+
+# Called with (kind, target, text, coalesce key, excluded user) for frames published by other nodes
+Deliver = Callable[[str, Optional[str], str, Optional[str], Optional[str]], Any]
+
+class LocalBroker:
+    """Single-process broker: every recipient is local, so nothing is published"""
+
+    distributed = False
+
+    async def start(self, deliver: Deliver):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def subscribe(self, kind: str, target: str):
+        pass
+
+    async def unsubscribe(self, kind: str, *targets: str):
+        pass
+
+    def publish(self, kind: str, target: Optional[str], text: str, key: Optional[str] = None, exclude: Optional[str] = None):
+        pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"backend": "local"}
+
+class RedisBroker(LocalBroker):
+    """Fan frames out to the other workers and pods over Redis pub/sub
+
+    Each node subscribes only to the rooms and users it has local sockets for, plus
+    one channel for broadcasts to everyone. Nodes deliver their own frames locally
+    and skip them when Redis echoes them back.
+    """
+
+    distributed = True
+
+    def __init__(self, prefix: str = None):
+        self.prefix = prefix or settings.WS_BROKER_CHANNEL_PREFIX
+        self.node_id = uuid.uuid4().hex[:12]
+        self.channels: Set[str] = {self.channel(ALL, None)}
+        self.pubsub = None
+        self.outbox: Deque[Tuple[str, str]] = deque()
+        self._outbox_ready = asyncio.Event()
+        self._deliver: Optional[Deliver] = None
+        self._tasks = []
+        self.stats = {
+            "published": 0, "received": 0, "own_echoes": 0, "publish_dropped": 0,
+            "publish_errors": 0, "receive_errors": 0, "resubscribes": 0
+        }
+
+    def channel(self, kind: str, target: Optional[str]) -> str:
+        return f"{self.prefix}:{ALL}" if kind == ALL else f"{self.prefix}:{kind}:{target}"
+
+    async def start(self, deliver: Deliver):
+        """Start listening and publishing"""
+        self._deliver = deliver
+        self._tasks = [asyncio.create_task(self._listen()), asyncio.create_task(self._publish())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def subscribe(self, kind: str, target: str):
+        """Start receiving a room's or user's frames"""
+        channel = self.channel(kind, target)
+        self.channels.add(channel)
+        await self._command("subscribe", channel)
+
+    async def unsubscribe(self, kind: str, *targets: str):
+        """Stop receiving frames for rooms or users with no local sockets left"""
+        channels = [self.channel(kind, target) for target in targets]
+        self.channels.difference_update(channels)
+        if channels:
+            await self._command("unsubscribe", *channels)
+
+    async def _command(self, command: str, *channels: str):
+        # Without a live subscription the listener subscribes to self.channels when it (re)connects
+        pubsub = self.pubsub
+        if pubsub is None:
+            return
+        try:
+            await getattr(pubsub, command)(*channels)
+        except Exception as e:
+            logger.warning(f"WebSocket broker {command} failed, resubscribing: {e}")
+            # Reconnecting is the only way to be sure the subscriptions match self.channels
+            await pubsub.close()
+
+    def publish(self, kind: str, target: Optional[str], text: str, key: Optional[str] = None, exclude: Optional[str] = None):
+        """Queue a frame for the other nodes without waiting on Redis"""
+        if len(self.outbox) >= settings.WS_BROKER_PUBLISH_QUEUE_SIZE:
+            self.outbox.popleft()
+            self.stats["publish_dropped"] += 1
+        # The header is JSON, so it holds no raw newline; the frame text follows as is
+        header = json.dumps([self.node_id, kind, target, key, exclude])
+        self.outbox.append((self.channel(kind, target), f"{header}\n{text}"))
+        self._outbox_ready.set()
+
+    async def _publish(self):
+        """Publish queued frames in order, pipelining whatever has built up"""
+        while True:
+            while not self.outbox:
+                self._outbox_ready.clear()
+                await self._outbox_ready.wait()
+            batch = [self.outbox.popleft() for _ in range(min(len(self.outbox), 500))]
+            try:
+                pipe = redis_client.redis.pipeline(transaction=False)
+                for channel, payload in batch:
+                    pipe.publish(channel, payload)
+                await pipe.execute()
+                self.stats["published"] += len(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["publish_errors"] += len(batch)
+                logger.error(f"WebSocket broker could not publish {len(batch)} frames: {e}")
+                await asyncio.sleep(1)
+
+    async def _listen(self):
+        """Hand frames from other nodes to the local sockets, resubscribing after any error"""
+        while True:
+            pubsub = None
+            try:
+                pubsub = redis_client.redis.pubsub()
+                channels = set(self.channels)
+                await pubsub.subscribe(*channels)
+                self.pubsub = pubsub
+                # Catch up with joins and leaves that happened while subscribing
+                if self.channels - channels:
+                    await pubsub.subscribe(*(self.channels - channels))
+                if channels - self.channels:
+                    await pubsub.unsubscribe(*(channels - self.channels))
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    try:
+                        header, _, text = message["data"].partition("\n")
+                        node_id, kind, target, key, exclude = json.loads(header)
+                    except ValueError:
+                        self.stats["receive_errors"] += 1
+                        continue
+                    if node_id == self.node_id:
+                        self.stats["own_echoes"] += 1
+                        continue
+                    self.stats["received"] += 1
+                    self._deliver(kind, target, text, key, exclude)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["receive_errors"] += 1
+                logger.error(f"WebSocket broker listener error: {e}")
+                await asyncio.sleep(1)
+            finally:
+                self.pubsub = None
+                if pubsub is not None:
+                    await pubsub.close()
+            self.stats["resubscribes"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "redis",
+            "node_id": self.node_id,
+            "channels": len(self.channels),
+            "outbox": len(self.outbox),
+            **self.stats
+        }
+
+def create_broker() -> LocalBroker:
+    """Build the broker named by WS_BROKER"""
+    if settings.WS_BROKER == "redis":
+        return RedisBroker()
+    return LocalBroker()
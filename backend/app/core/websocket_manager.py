@@ -1,87 +1,373 @@
-import json
+import asyncio
 import logging
-from typing import Dict, Set, Any
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Set, Any, Tuple, Union
 from fastapi import WebSocket
 
+from .config import settings
+from .room_batcher import Event, RoomBatcher
+from .timing_wheel import TimingWheel
+from .websocket_broker import ALL, ROOM, USER, create_broker
+from .ws_protocol import JSON_PROTOCOL, Frame, encode_batch, negotiate
+
 logger = logging.getLogger(__name__)
 
+DROP_OLDEST = "drop_oldest"
+COALESCE = "coalesce"
+DISCONNECT = "disconnect"
+
+# Presence events a newer event about the same user makes obsolete
+PRESENCE_FAMILIES = {
+    "user_joined": "membership",
+    "user_left": "membership",
+    "typing": "typing",
+    "typing_stopped": "typing",
+    "presence": "presence"
+}
+
+def coalesce_key(message: Dict[str, Any]) -> Optional[str]:
+    """Key shared by presence events that supersede each other, None for everything else"""
+    family = PRESENCE_FAMILIES.get(message.get("type"))
+    if family is None:
+        return None
+    return f"{family}:{message.get('room_id')}:{message.get('user_id')}"
+
+class Connection:
+    """A socket with a bounded outbound queue drained by its own writer task"""
+
+    def __init__(self, manager: "WebSocketManager", user_id: str, websocket: WebSocket, protocol: str = JSON_PROTOCOL, batches: bool = False):
+        self.manager = manager
+        self.user_id = user_id
+        self.websocket = websocket
+        self.protocol = protocol
+        # Clients that negotiated a subprotocol understand batch and ping frames; older ones get events
+        # one by one and are left to the server's protocol-level pings
+        self.batches = batches
+        self.last_seen = time.monotonic()
+        self.pinged = False
+        self.queue: Deque[Tuple[Union[str, bytes], Optional[str]]] = deque()
+        self.stats = {"sent": 0, "dropped": 0, "coalesced": 0, "max_depth": 0}
+        self.closed = False
+        self._ready = asyncio.Event()
+        self._writer = asyncio.create_task(self._write())
+
+    def enqueue(self, data: Union[str, bytes], key: Optional[str] = None) -> bool:
+        """Queue a frame without waiting; False when the overflow policy disconnected the client"""
+        if self.closed:
+            return False
+        if len(self.queue) >= settings.WS_SEND_QUEUE_SIZE and not self._make_room(key):
+            return False
+        self.queue.append((data, key))
+        self.stats["max_depth"] = max(self.stats["max_depth"], len(self.queue))
+        self._ready.set()
+        return True
+
+    def _make_room(self, key: Optional[str]) -> bool:
+        """Apply the overflow policy to a full queue"""
+        policy = settings.WS_OVERFLOW_POLICY
+        if policy == DISCONNECT:
+            self.manager.stats["slow_disconnects"] += 1
+            logger.warning(f"User {self.user_id} fell {len(self.queue)} messages behind, disconnecting")
+            self.stop()
+            self.manager.schedule_drop(self, settings.WS_SLOW_CONSUMER_CLOSE_CODE, "Slow consumer")
+            return False
+        if policy == COALESCE:
+            if key is not None:
+                for index, (_, queued_key) in enumerate(self.queue):
+                    if queued_key == key:
+                        del self.queue[index]
+                        self.stats["coalesced"] += 1
+                        self.manager.stats["coalesced"] += 1
+                        return True
+            # Presence is the cheapest thing to lose
+            for index, (_, queued_key) in enumerate(self.queue):
+                if queued_key is not None:
+                    del self.queue[index]
+                    self._count_drop()
+                    return True
+        self.queue.popleft()
+        self._count_drop()
+        return True
+
+    def _count_drop(self):
+        self.stats["dropped"] += 1
+        self.manager.stats["dropped"] += 1
+
+    async def _write(self):
+        """Send queued frames in order; a failed or stalled send drops the connection"""
+        while True:
+            while not self.queue:
+                # wait_for can swallow a cancel that lands as a send completes
+                if self.closed:
+                    return
+                self._ready.clear()
+                await self._ready.wait()
+            data, _ = self.queue.popleft()
+            send = self.websocket.send_bytes if isinstance(data, bytes) else self.websocket.send_text
+            try:
+                await asyncio.wait_for(send(data), settings.WS_SEND_TIMEOUT)
+                self.stats["sent"] += 1
+            except asyncio.TimeoutError:
+                logger.warning(f"Send to user {self.user_id} stalled for {settings.WS_SEND_TIMEOUT}s, dropping the connection")
+                self.manager.schedule_drop(self, 1011, "Send timed out")
+                return
+            except Exception as e:
+                logger.error(f"Error sending message to user {self.user_id}: {e}")
+                self.manager.schedule_drop(self, 1011, "Send failed")
+                return
+
+    def stop(self):
+        """Stop the writer and discard queued frames"""
+        self.closed = True
+        self.queue.clear()
+        if self._writer is not asyncio.current_task():
+            self._writer.cancel()
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        """Stop writing and close the socket"""
+        self.stop()
+        # A stalled peer must not hold this up either
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code, reason=reason), settings.WS_SEND_TIMEOUT)
+        except Exception:
+            pass
+
 class WebSocketManager:
     def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
+        self.active_connections: Dict[str, Connection] = {}
         self.room_connections: Dict[str, Set[str]] = {}
-        
-    async def connect(self, websocket: WebSocket, user_id: str):
-        """Connect a user's WebSocket"""
-        await websocket.accept()
-        self.active_connections[user_id] = websocket
-        logger.info(f"User {user_id} connected to WebSocket")
-        
-    async def disconnect(self, user_id: str):
-        """Disconnect a user's WebSocket"""
-        if user_id in self.active_connections:
+        # Reverse index of room_connections, so membership changes never scan every room
+        self.user_rooms: Dict[str, Set[str]] = {}
+        self.stats = {"dropped": 0, "coalesced": 0, "slow_disconnects": 0, "pings": 0, "idle_evictions": 0}
+        self._closing: Set[asyncio.Task] = set()
+        # Reaches the sockets other workers and pods hold; a no-op with a single process
+        self.broker = create_broker()
+        self.batcher = RoomBatcher(self._flush_room)
+        # One-second ticks over a turn longer than any heartbeat delay, so timers never wait out extra turns
+        self.heartbeats = TimingWheel(1.0, math.ceil(max(settings.WS_HEARTBEAT_INTERVAL, settings.WS_IDLE_TIMEOUT)) + 2)
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Start receiving frames published by other nodes and checking connections for liveness"""
+        await self.broker.start(self.deliver)
+        self._heartbeat_task = asyncio.create_task(self.heartbeats.run(self._check_liveness))
+
+    async def stop(self):
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+        await self.broker.stop()
+
+    async def connect(self, websocket: WebSocket, user_id: str) -> str:
+        """Connect a user's WebSocket in the wire format it asked for, which is returned"""
+        protocol, subprotocol = negotiate(websocket.scope.get("subprotocols", ()))
+        await websocket.accept(subprotocol=subprotocol)
+        previous = self.active_connections.get(user_id)
+        connection = self.active_connections[user_id] = Connection(self, user_id, websocket, protocol, batches=subprotocol is not None)
+        if connection.batches:
+            self.heartbeats.schedule(connection, settings.WS_HEARTBEAT_INTERVAL)
+        if previous is not None:
+            # The user reconnected: the old socket is replaced, not left writing
+            await previous.close(1000, "Replaced by a new connection")
+        else:
+            await self.broker.subscribe(USER, user_id)
+        logger.info(f"User {user_id} connected to WebSocket ({protocol})")
+        return protocol
+
+    async def disconnect(self, user_id: str, websocket: Optional[WebSocket] = None):
+        """Disconnect a user's WebSocket; given the socket, only if the user has not reconnected on another"""
+        if websocket is not None and not self.is_current(user_id, websocket):
+            return
+        connection = self.active_connections.get(user_id)
+        if connection is not None:
             del self.active_connections[user_id]
-            
+            connection.stop()
+            await self.broker.unsubscribe(USER, user_id)
+
         # Remove from all rooms
-        for room_id in list(self.room_connections.keys()):
-            if user_id in self.room_connections[room_id]:
-                self.room_connections[room_id].discard(user_id)
-                if not self.room_connections[room_id]:
-                    del self.room_connections[room_id]
-                    
+        emptied = []
+        for room_id in self.user_rooms.pop(user_id, ()):
+            if self._discard_member(self.room_connections, room_id, user_id):
+                emptied.append(room_id)
+                self.batcher.discard(room_id)
+        await self.broker.unsubscribe(ROOM, *emptied)
+
         logger.info(f"User {user_id} disconnected from WebSocket")
-        
+
+    def is_current(self, user_id: str, websocket: WebSocket) -> bool:
+        """Whether a socket is still the user's live connection, rather than one a reconnect replaced"""
+        connection = self.active_connections.get(user_id)
+        return connection is not None and connection.websocket is websocket
+
+    def touch(self, user_id: str):
+        """Note that a user's client has just been heard from"""
+        connection = self.active_connections.get(user_id)
+        if connection is not None:
+            connection.last_seen = time.monotonic()
+            connection.pinged = False
+
+    def _check_liveness(self, connection: Connection):
+        """Ping a client that has gone quiet and evict one that stayed quiet; O(1), and only when its timer is due"""
+        if connection.closed or self.active_connections.get(connection.user_id) is not connection:
+            return
+        idle = time.monotonic() - connection.last_seen
+        if idle >= settings.WS_IDLE_TIMEOUT:
+            self.stats["idle_evictions"] += 1
+            logger.info(f"User {connection.user_id} silent for {idle:.0f}s, evicting")
+            self.schedule_drop(connection, 1001, "Idle timeout")
+            return
+        if idle >= settings.WS_HEARTBEAT_INTERVAL:
+            if not connection.pinged:
+                connection.pinged = True
+                self.stats["pings"] += 1
+                connection.enqueue(Frame({"type": "ping"}).encode(connection.protocol))
+            self.heartbeats.schedule(connection, settings.WS_IDLE_TIMEOUT - idle)
+        else:
+            self.heartbeats.schedule(connection, settings.WS_HEARTBEAT_INTERVAL - idle)
+
+    def schedule_drop(self, connection: Connection, code: int, reason: str):
+        """Disconnect a failing connection in the background, unless its user has reconnected since"""
+        task = asyncio.ensure_future(self._drop(connection, code, reason))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _drop(self, connection: Connection, code: int, reason: str):
+        await self.disconnect(connection.user_id, connection.websocket)
+        # Closing ends the endpoint's receive loop
+        await connection.close(code, reason)
+
     async def join_room(self, user_id: str, room_id: str):
         """Add a user to a room"""
         if room_id not in self.room_connections:
             self.room_connections[room_id] = set()
+            await self.broker.subscribe(ROOM, room_id)
         self.room_connections[room_id].add(user_id)
+        self.user_rooms.setdefault(user_id, set()).add(room_id)
         logger.info(f"User {user_id} joined room {room_id}")
-        
+
     async def leave_room(self, user_id: str, room_id: str):
         """Remove a user from a room"""
-        if room_id in self.room_connections:
-            self.room_connections[room_id].discard(user_id)
-            if not self.room_connections[room_id]:
-                del self.room_connections[room_id]
+        if self._discard_member(self.room_connections, room_id, user_id):
+            self.batcher.discard(room_id)
+            await self.broker.unsubscribe(ROOM, room_id)
+        self._discard_member(self.user_rooms, user_id, room_id)
         logger.info(f"User {user_id} left room {room_id}")
-        
+
+    @staticmethod
+    def _discard_member(index: Dict[str, Set[str]], key: str, member: str) -> bool:
+        """Remove one side of a membership, dropping the set once it is empty; True if it was dropped"""
+        members = index.get(key)
+        if members is not None:
+            members.discard(member)
+            if not members:
+                del index[key]
+                return True
+        return False
+
     async def send_personal_message(self, user_id: str, message: Dict[str, Any]):
-        """Send a message to a specific user"""
-        if user_id in self.active_connections:
-            try:
-                await self.active_connections[user_id].send_text(json.dumps(message))
-            except Exception as e:
-                logger.error(f"Error sending message to user {user_id}: {e}")
-                await self.disconnect(user_id)
-                
+        """Queue a message for a specific user, wherever they are connected"""
+        connection = self.active_connections.get(user_id)
+        if connection is not None:
+            # A user holds one connection, so a local one means no other node has them
+            connection.enqueue(Frame(message).encode(connection.protocol), coalesce_key(message))
+        else:
+            self.broker.publish(USER, user_id, Frame(message).text, coalesce_key(message))
+
+    async def send_local_message(self, user_id: str, message: Dict[str, Any]):
+        """Queue a message for a user only if they are connected to this process"""
+        connection = self.active_connections.get(user_id)
+        if connection is not None:
+            connection.enqueue(Frame(message).encode(connection.protocol), coalesce_key(message))
+
     async def broadcast_to_room(self, room_id: str, message: Dict[str, Any], exclude_user: str = None):
-        """Broadcast a message to all users in a room"""
-        if room_id not in self.room_connections:
-            return
-            
-        disconnected_users = set()
-        for user_id in self.room_connections[room_id]:
-            if user_id != exclude_user and user_id in self.active_connections:
-                try:
-                    await self.active_connections[user_id].send_text(json.dumps(message))
-                except Exception as e:
-                    logger.error(f"Error broadcasting to user {user_id}: {e}")
-                    disconnected_users.add(user_id)
-                    
-        # Clean up disconnected users
-        for user_id in disconnected_users:
-            await self.disconnect(user_id)
-            
+        """Queue a message for all users in a room"""
+        frame, key = Frame(message), coalesce_key(message)
+        if self.broker.distributed:
+            self.broker.publish(ROOM, room_id, frame.text, key, exclude_user)
+        self._deliver(ROOM, room_id, frame, key, exclude_user)
+
     async def broadcast_to_all(self, message: Dict[str, Any]):
-        """Broadcast a message to all connected users"""
-        disconnected_users = set()
-        for user_id, websocket in self.active_connections.items():
-            try:
-                await websocket.send_text(json.dumps(message))
-            except Exception as e:
-                logger.error(f"Error broadcasting to user {user_id}: {e}")
-                disconnected_users.add(user_id)
-                
-        # Clean up disconnected users
-        for user_id in disconnected_users:
-            await self.disconnect(user_id) 
\ No newline at end of file
+        """Queue a message for all connected users"""
+        frame, key = Frame(message), coalesce_key(message)
+        if self.broker.distributed:
+            self.broker.publish(ALL, None, frame.text, key)
+        self._deliver(ALL, None, frame, key)
+
+    def deliver(self, kind: str, target: Optional[str], text: str, key: Optional[str] = None, exclude: Optional[str] = None):
+        """Queue a frame published by another node for the local sockets it is addressed to"""
+        self._deliver(kind, target, Frame(text=text), key, exclude)
+
+    def _deliver(self, kind: str, target: Optional[str], frame: Frame, key: Optional[str], exclude: Optional[str] = None):
+        if kind == ROOM:
+            if target not in self.room_connections:
+                # Nobody here is in the room, whatever id the client sent: keep nothing for it
+                return
+            if settings.WS_ROOM_BATCHING_ENABLED:
+                self.batcher.add(target, frame, key, exclude)
+            else:
+                self._flush_room(target, [(frame, key, exclude)])
+        elif kind == USER:
+            self._fan_out((target,), frame, key)
+        else:
+            self._fan_out(list(self.active_connections), frame, key)
+
+    def _flush_room(self, room_id: str, events: List[Event]):
+        """Queue a room's events for its members: a single event as is, several as one batch frame each"""
+        if len(events) == 1:
+            frame, key, exclude = events[0]
+            self._fan_out((user_id for user_id in self.room_connections.get(room_id, ()) if user_id != exclude), frame, key)
+            return
+        excluded = {exclude for _, _, exclude in events if exclude is not None}
+        # Everyone gets the same batch bar the users some events skip; each variant is encoded once per format
+        batches: Dict[Tuple[str, Optional[str]], Any] = {}
+        for user_id in self.room_connections.get(room_id, ()):
+            connection = self.active_connections.get(user_id)
+            if connection is None:
+                continue
+            if not connection.batches:
+                for frame, key, exclude in events:
+                    if exclude != user_id:
+                        connection.enqueue(frame.encode(connection.protocol), key)
+                continue
+            variant = (connection.protocol, user_id if user_id in excluded else None)
+            if variant not in batches:
+                frames = [frame for frame, _, exclude in events if exclude is None or exclude != variant[1]]
+                if not frames:
+                    batches[variant] = None
+                elif len(frames) == 1:
+                    batches[variant] = frames[0].encode(connection.protocol)
+                else:
+                    batches[variant] = encode_batch(frames, connection.protocol)
+            if batches[variant] is not None:
+                connection.enqueue(batches[variant])
+
+    def _fan_out(self, user_ids: Iterable[str], frame: Frame, key: Optional[str]):
+        """Queue a frame for each user, encoded once per wire format; each connection's writer does the sending"""
+        for user_id in user_ids:
+            connection = self.active_connections.get(user_id)
+            if connection is not None:
+                connection.enqueue(frame.encode(connection.protocol), key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get connection counts, queue depths and overflow counters"""
+        depths = [len(connection.queue) for connection in self.active_connections.values()]
+        protocols: Dict[str, int] = {}
+        for connection in self.active_connections.values():
+            protocols[connection.protocol] = protocols.get(connection.protocol, 0) + 1
+        return {
+            "connections": len(self.active_connections),
+            "protocols": protocols,
+            "rooms": len(self.room_connections),
+            "memberships": sum(len(rooms) for rooms in self.user_rooms.values()),
+            "queued": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "overflow_policy": settings.WS_OVERFLOW_POLICY,
+            **self.stats,
+            "heartbeats": self.heartbeats.get_stats(),
+            "batching": self.batcher.get_stats(),
+            "broker": self.broker.get_stats()
+        }
+
+# Global instance
+websocket_manager = WebSocketManager()
@@ -0,0 +1,187 @@
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from .config import settings
+
+try:
+    import msgpack
+except ImportError:  # only JSON is offered
+    msgpack = None
+
+# Sec-WebSocket-Protocol names; a client that offers neither gets JSON text frames
+JSON_PROTOCOL = "evolvelearn.json.v1"
+MSGPACK_PROTOCOL = "evolvelearn.msgpack.v1"
+
+CHAT_FIELDS = ("sender_id", "content", "room_id", "timestamp", "message_type")
+NOTIFICATION_FIELDS = ("type", "title", "message", "timestamp")
+
+# Field dictionary of the binary protocol. A frame is [code, *field values, extras?]: the
+# type is its code, each field its position, and a nested (name, fields) entry packs that
+# object the same way. Fields a message lacks are nil; fields missing here, and fields set
+# to None (so they are not mistaken for absent ones), go in a trailing map. Entries are only ever appended, and a new layout for a type means a new protocol version.
+MESSAGE_TYPES: List[Tuple[str, Tuple[Any, ...]]] = [
+    # Server to client
+    ("chat_message", (("data", CHAT_FIELDS),)),
+    ("user_joined", ("user_id", "room_id")),
+    ("user_left", ("user_id", "room_id")),
+    ("room_info", ("data",)),
+    ("moderation_warning", ("message",)),
+    ("notification", (("data", NOTIFICATION_FIELDS),)),
+    ("ai_token", ("request_id", "content")),
+    ("ai_done", ("request_id", "provider", "usage", "cached", "first_token_ms", "elapsed_ms")),
+    ("ai_error", ("request_id", "error", "provider", "content")),
+    ("ai_cancelled", ("request_id",)),
+    ("ai_job_update", ("job_id", "job_type", "status", "attempts", "error", "result")),
+    ("typing", ("user_id", "room_id")),
+    ("typing_stopped", ("user_id", "room_id")),
+    ("presence", ("user_id", "room_id", "status")),
+    # Client to server
+    ("chat", ("room_id", "content", "timestamp", "message_type")),
+    ("study_room_join", ("room_id",)),
+    ("study_room_leave", ("room_id",)),
+    ("ai_request", ("request_id", "prompt", "mode", "context", "max_tokens", "temperature", "content_type", "class_id")),
+    ("ai_cancel", ("request_id",)),
+    # Server to client: a busy room's events from one tick, each a frame of its own
+    ("batch", ("events",)),
+    # Either way: a ping asks for a pong, and any frame counts as a sign of life
+    ("ping", ()),
+    ("pong", ()),
+    ("room_full", ("room_id", "max_users"))
+]
+
+# Code 0 carries a plain map, for types not in the dictionary
+UNTYPED = 0
+
+def _compile(fields: Iterable[Any]) -> Tuple[Tuple[Tuple[str, Any], ...], frozenset]:
+    specs = tuple((field[0], _compile(field[1])) if isinstance(field, tuple) else (field, None) for field in fields)
+    return specs, frozenset(name for name, _ in specs)
+
+TYPE_CODES: Dict[str, int] = {}
+SCHEMAS: Dict[int, Tuple[str, Any]] = {}
+for _code, (_name, _fields) in enumerate(MESSAGE_TYPES, start=1):
+    TYPE_CODES[_name] = _code
+    SCHEMAS[_code] = (_name, _compile(_fields))
+BATCH = TYPE_CODES["batch"]
+
+def negotiate(offered: Iterable[str]) -> Tuple[str, Optional[str]]:
+    """Pick the wire format for a connection: (protocol, subprotocol to accept with)"""
+    offered = list(offered)
+    if MSGPACK_PROTOCOL in offered and msgpack is not None and settings.WS_BINARY_PROTOCOL_ENABLED:
+        return MSGPACK_PROTOCOL, MSGPACK_PROTOCOL
+    # A client that asked for subprotocols must get one back, or it drops the connection
+    return JSON_PROTOCOL, JSON_PROTOCOL if JSON_PROTOCOL in offered else None
+
+def _pack_fields(value: Dict[str, Any], schema) -> List[Any]:
+    specs, names = schema
+    packed = []
+    for name, nested in specs:
+        item = value.get(name)
+        if nested is not None and isinstance(item, dict):
+            item = _pack_fields(item, nested)
+        packed.append(item)
+    extras = {name: item for name, item in value.items() if name not in names or item is None}
+    if extras:
+        packed.append(extras)
+    return packed
+
+def _unpack_fields(values: List[Any], schema) -> Dict[str, Any]:
+    specs, _ = schema
+    value = {}
+    for (name, nested), item in zip(specs, values):
+        if item is None:
+            continue
+        if nested is not None and isinstance(item, list):
+            item = _unpack_fields(item, nested)
+        value[name] = item
+    if len(values) > len(specs):
+        value.update(values[len(specs)])
+    return value
+
+def encode_binary(message: Dict[str, Any]) -> bytes:
+    """Pack a message with the field dictionary"""
+    code = TYPE_CODES.get(message.get("type"))
+    if code is None:
+        return msgpack.packb([UNTYPED, message], use_bin_type=True)
+    body = {name: item for name, item in message.items() if name != "type"}
+    return msgpack.packb([code, *_pack_fields(body, SCHEMAS[code][1])], use_bin_type=True)
+
+def decode_binary(data: bytes) -> Dict[str, Any]:
+    """Unpack a binary frame; a plain MessagePack map is accepted as is"""
+    return _decode(msgpack.unpackb(data, raw=False))
+
+def _decode(frame: Any) -> Dict[str, Any]:
+    if isinstance(frame, dict):
+        return frame
+    if not isinstance(frame, list) or not frame:
+        raise ValueError("Binary frame is neither a map nor a coded array")
+    if frame[0] == UNTYPED:
+        return frame[1]
+    if frame[0] not in SCHEMAS:
+        raise ValueError(f"Unknown message type code {frame[0]}")
+    name, schema = SCHEMAS[frame[0]]
+    if frame[0] == BATCH:
+        return {"type": name, "events": [_decode(event) for event in frame[1]]}
+    return {"type": name, **_unpack_fields(frame[1:], schema)}
+
+def encode_batch(frames: List["Frame"], protocol: str) -> Union[str, bytes]:
+    """One frame carrying several, each spliced in as already encoded rather than encoded again"""
+    if protocol == MSGPACK_PROTOCOL:
+        packer = msgpack.Packer(use_bin_type=True)
+        head = packer.pack_array_header(2) + packer.pack(BATCH) + packer.pack_array_header(len(frames))
+        return head + b"".join(frame.encode(protocol) for frame in frames)
+    return '{"type": "batch", "events": [' + ", ".join(frame.text for frame in frames) + "]}"
+
+class Frame:
+    """A message encoded at most once per wire format, however many sockets it goes to"""
+
+    __slots__ = ("_message", "_text", "_binary")
+
+    def __init__(self, message: Optional[Dict[str, Any]] = None, text: Optional[str] = None):
+        self._message = message
+        self._text = text
+        self._binary = None
+
+    @property
+    def message(self) -> Dict[str, Any]:
+        if self._message is None:
+            self._message = json.loads(self._text)
+        return self._message
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = json.dumps(self._message)
+        return self._text
+
+    def encode(self, protocol: str) -> Union[str, bytes]:
+        """The frame as the protocol sends it: text for JSON, bytes for MessagePack"""
+        if protocol == MSGPACK_PROTOCOL:
+            if self._binary is None:
+                self._binary = encode_binary(self.message)
+            return self._binary
+        return self.text
+
+async def receive_message(websocket: WebSocket) -> Dict[str, Any]:
+    """Read one client message: JSON text or a binary frame, whichever the client sent"""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    if message.get("bytes") is not None:
+        if msgpack is None:
+            raise ValueError("Binary frames are not supported by this server")
+        return decode_binary(message["bytes"])
+    return json.loads(message["text"])
+
+def describe() -> Dict[str, Any]:
+    """The protocols on offer and the binary field dictionary, for clients to build their codec from"""
+    def fields(specs):
+        return [{"name": name, "fields": fields(nested[0])} if nested else name for name, nested in specs]
+
+    return {
+        "protocols": [MSGPACK_PROTOCOL, JSON_PROTOCOL] if msgpack is not None and settings.WS_BINARY_PROTOCOL_ENABLED else [JSON_PROTOCOL],
+        "default": JSON_PROTOCOL,
+        "untyped_code": UNTYPED,
+        "types": {str(code): {"type": name, "fields": fields(schema[0])} for code, (name, schema) in SCHEMAS.items()}
+    }
@@ -0,0 +1,164 @@
+"""Load test for the AI service layer behind /api/v1/ai, using the simulated provider.
+
+Runs a seeded mix of operations from concurrent clients for a fixed duration
+and reports throughput and latency percentiles per operation. No provider
+quota or network access is needed. Redis is used when reachable; without it
+the response cache, shared breakers and question pool fall back to their
+degraded paths.
+
+    python benchmarks/ai_load.py --concurrency 50 --duration 30
+    python benchmarks/ai_load.py --mix generate=1,quiz=1 --error-rate 0.05 --latency-median-ms 400
+
+Simulation settings (AI_SIM_*) can also be given as environment variables.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_MIX = "generate=3,stream=2,explain=1,moderate=3,quiz=2,progress=1"
+
+MESSAGES = [
+    "Can someone explain question 3?",
+    "I think the answer is 42",
+    "This homework is so stupid",
+    "Check out https://example.com for notes",
+    "Thanks, that helped a lot!",
+    "I hate fractions",
+]
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+async def run(args):
+    logging.basicConfig(level=args.log_level.upper())
+    # Settings are read at import time, so configure the simulation first
+    os.environ["AI_PROVIDER"] = "simulated"
+    os.environ["AI_FALLBACK_PROVIDERS"] = "[]"
+    overrides = {
+        "AI_SIM_SEED": args.seed,
+        "AI_SIM_ERROR_RATE": args.error_rate,
+        "AI_SIM_RATE_LIMIT_RATE": args.rate_limit_rate,
+        "AI_SIM_LATENCY_MEDIAN_MS": args.latency_median_ms,
+        "AI_SIM_LATENCY_P99_MS": args.latency_p99_ms,
+    }
+    for name, value in overrides.items():
+        if value is not None:
+            os.environ[name] = str(value)
+
+    from app.core.ai_service import ai_service
+    from app.core.redis_client import init_redis
+
+    try:
+        await asyncio.wait_for(init_redis(), 2)
+    except Exception as e:
+        print(f"Redis unavailable, running without it: {e}")
+    await ai_service.initialize()
+
+    topics = [f"topic {index}" for index in range(args.topics)]
+    student = {
+        "name": "Load Test",
+        "quiz_history": [{"quiz": f"quiz {index}", "score": 0.5 + index / 100} for index in range(30)]
+    }
+
+    async def consume(events):
+        async for event in events:
+            if event["type"] == "error":
+                return False
+        return True
+
+    operations = {
+        "generate": lambda rng: ai_service.generate_content(rng.choice(topics), "lesson", "beginner", 200),
+        "stream": lambda rng: consume(ai_service.stream_content(rng.choice(topics), "lesson", "beginner", 200)),
+        "explain": lambda rng: ai_service.explain_concept(rng.choice(topics), "beginner", 150),
+        "moderate": lambda rng: ai_service.moderate_content(rng.choice(MESSAGES)),
+        "quiz": lambda rng: ai_service.question_pool.take(rng.choice(topics), "easy", 5),
+        "progress": lambda rng: ai_service.analyze_student_progress(student, ["fractions"]),
+    }
+    weights = {}
+    for part in args.mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in operations:
+            raise SystemExit(f"Unknown operation {name!r}; choose from {', '.join(operations)}")
+        weights[name] = float(weight or 1)
+
+    latencies = {name: [] for name in weights}
+    errors = {name: 0 for name in weights}
+    deadline = time.monotonic() + args.duration
+
+    async def client(index: int):
+        rng = random.Random(f"{args.seed}:{index}")
+        names, shares = list(weights), list(weights.values())
+        while time.monotonic() < deadline:
+            name = rng.choices(names, shares)[0]
+            started = time.perf_counter()
+            try:
+                result = await operations[name](rng)
+                ok = result is not False and result is not None and (not isinstance(result, dict) or result.get("success", True))
+            except Exception:
+                ok = False
+            latencies[name].append((time.perf_counter() - started) * 1000)
+            if not ok:
+                errors[name] += 1
+
+    started = time.monotonic()
+    await asyncio.gather(*[client(index) for index in range(args.concurrency)])
+    elapsed = time.monotonic() - started
+
+    report = {"concurrency": args.concurrency, "duration_s": round(elapsed, 1), "operations": {}}
+    total = 0
+    for name, samples in latencies.items():
+        if not samples:
+            continue
+        total += len(samples)
+        report["operations"][name] = {
+            "requests": len(samples),
+            "errors": errors[name],
+            "rps": round(len(samples) / elapsed, 1),
+            "p50_ms": round(percentile(samples, 50), 1),
+            "p95_ms": round(percentile(samples, 95), 1),
+            "p99_ms": round(percentile(samples, 99), 1),
+            "mean_ms": round(statistics.mean(samples), 1)
+        }
+    report["total_rps"] = round(total / elapsed, 1)
+    report["service"] = {
+        key: value for key, value in (await ai_service.get_service_status()).items()
+        if key in ("cache", "single_flight", "routing", "question_pool", "simulated")
+    }
+
+    print(f"{'operation':<10} {'requests':>8} {'errors':>7} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for name, row in report["operations"].items():
+        print(
+            f"{name:<10} {row['requests']:>8} {row['errors']:>7} {row['rps']:>8.1f} "
+            f"{row['p50_ms']:>7.1f}ms {row['p95_ms']:>7.1f}ms {row['p99_ms']:>7.1f}ms"
+        )
+    print(f"total {report['total_rps']} req/s over {report['duration_s']}s at concurrency {args.concurrency}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="operation=weight pairs")
+    parser.add_argument("--topics", type=int, default=50, help="distinct prompts, which sets the cache hit rate")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--error-rate", type=float)
+    parser.add_argument("--rate-limit-rate", type=float)
+    parser.add_argument("--latency-median-ms", type=float)
+    parser.add_argument("--latency-p99-ms", type=float)
+    parser.add_argument("--log-level", default="error")
+    parser.add_argument("--json", help="write the full report to this file")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
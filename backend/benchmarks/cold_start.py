@@ -0,0 +1,158 @@
+"""Cold-start benchmark: module import time and service startup time.
+
+Every measurement runs in a fresh interpreter, so nothing is already imported.
+
+    python benchmarks/cold_start.py --runs 5 --save baseline.json
+    python benchmarks/cold_start.py --runs 5 --baseline baseline.json --max-regression 0.25
+
+With --baseline the script exits non-zero when any median regresses by more
+than --max-regression, so it can run in CI. Startup uses whatever backing
+services are reachable; unreachable ones count up to their STARTUP_TIMEOUTS.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = ["app.core.ai_service", "app.core.database", "app.core.neo4j_client", "main"]
+
+IMPORT_SNIPPET = """
+import json, time
+started = time.perf_counter()
+import {module}
+print(json.dumps({{"ms": (time.perf_counter() - started) * 1000}}))
+"""
+
+# Mirrors the startup steps registered in main.py
+STARTUP_SNIPPET = """
+import asyncio, json, time
+started = time.perf_counter()
+from app.core.database import init_db
+from app.core.neo4j_client import init_neo4j
+from app.core.redis_client import init_redis
+from app.core.ai_service import ai_service
+from app.core.readiness import readiness
+imported = time.perf_counter()
+
+async def main():
+    readiness.register("database", init_db)
+    readiness.register("neo4j", init_neo4j)
+    readiness.register("redis", init_redis)
+    readiness.register("ai_service", ai_service.initialize)
+    await readiness.start()
+    await readiness.stop()
+
+asyncio.run(main())
+print(json.dumps({
+    "ms": (time.perf_counter() - started) * 1000,
+    "import_ms": (imported - started) * 1000,
+    "startup_ms": readiness.startup_ms,
+    "services": {name: service["status"] for name, service in readiness.services.items()}
+}))
+"""
+
+def run_snippet(code: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed"
+        return {"error": error}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def measure(name: str, code: str, runs: int) -> dict:
+    samples = []
+    last = {}
+    for _ in range(runs):
+        last = run_snippet(code)
+        if "error" in last:
+            return {"error": last["error"]}
+        samples.append(last["ms"])
+    report = {
+        "median_ms": round(statistics.median(samples), 1),
+        "min_ms": round(min(samples), 1),
+        "max_ms": round(max(samples), 1)
+    }
+    for field in ("import_ms", "startup_ms", "services"):
+        if field in last:
+            report[field] = last[field]
+    return report
+
+def top_imports(module: str, count: int) -> list:
+    """Slowest imports by cumulative time, from -X importtime"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        rows.append((int(cumulative), name.strip()))
+    rows.sort(reverse=True)
+    return [{"module": name, "cumulative_ms": round(us / 1000, 1)} for us, name in rows[:count]]
+
+def compare(results: dict, baseline: dict, max_regression: float) -> list:
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name, {}).get("median_ms")
+        after = result.get("median_ms")
+        if before and after and after > before * (1 + max_regression):
+            regressions.append(f"{name}: {before}ms -> {after}ms (+{(after / before - 1) * 100:.0f}%)")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--no-startup", action="store_true", help="only measure imports")
+    parser.add_argument("--top", type=int, default=0, help="show the N slowest imports of the first module")
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results saved earlier")
+    parser.add_argument("--max-regression", type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = {}
+    for module in args.modules:
+        results[f"import {module}"] = measure(module, IMPORT_SNIPPET.format(module=module), args.runs)
+    if not args.no_startup:
+        results["startup"] = measure("startup", STARTUP_SNIPPET, args.runs)
+
+    for name, result in results.items():
+        if "error" in result:
+            print(f"{name:<32} error: {result['error']}")
+        else:
+            extra = f"  services={result['services']}" if "services" in result else ""
+            print(f"{name:<32} median {result['median_ms']:>8.1f}ms  (min {result['min_ms']:.1f}, max {result['max_ms']:.1f}){extra}")
+
+    if args.top:
+        print(f"\nSlowest imports under {args.modules[0]}:")
+        for row in top_imports(args.modules[0], args.top):
+            print(f"  {row['cumulative_ms']:>8.1f}ms  {row['module']}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        if regressions:
+            print("\nCold-start regressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo cold-start regressions")
+
+if __name__ == "__main__":
+    main()
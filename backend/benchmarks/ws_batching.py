@@ -0,0 +1,141 @@
+"""Room batching benchmark: frames, bytes and latency in a busy study room.
+
+One room of members, all on the JSON subprotocol. The room sees a
+Poisson mix of events: typing indicators, which dominate, plus chat
+messages and joins and leaves. Each scenario runs once with batching
+off and once with it on, in real time. Per member it reports socket
+sends per second and bytes per second. It also reports how many events
+arrived, since superseded typing events are coalesced away, and the
+delay events picked up between broadcast and send. Quiet rooms should
+see no added delay.
+
+    python benchmarks/ws_batching.py
+    python benchmarks/ws_batching.py --members 50 --rates 2 20 100 400 --seconds 3
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+class CountingSocket:
+    """Stands in for a WebSocket on the JSON subprotocol, counting frames and timing each event"""
+
+    scope = {"subprotocols": ["evolvelearn.json.v1"]}
+
+    def __init__(self, sent_at: dict, delays: list):
+        self.sent_at = sent_at
+        self.delays = delays
+        self.frames = 0
+        self.bytes = 0
+        self.events = 0
+
+    async def accept(self, subprotocol: str = None):
+        pass
+
+    async def send_text(self, text: str):
+        arrived = time.perf_counter()
+        self.frames += 1
+        self.bytes += len(text.encode("utf-8"))
+        frame = json.loads(text)
+        for event in frame["events"] if frame["type"] == "batch" else [frame]:
+            self.events += 1
+            self.delays.append((arrived - self.sent_at[event["seq"]]) * 1000)
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        pass
+
+def make_event(rng: random.Random, members: int, seq: int) -> dict:
+    user_id = f"user-{rng.randrange(members)}"
+    roll = rng.random()
+    if roll < 0.7:
+        return {"type": rng.choice(["typing", "typing", "typing_stopped"]), "user_id": user_id, "room_id": "room-1", "seq": seq}
+    if roll < 0.95:
+        return {"type": "chat_message", "seq": seq, "data": {
+            "sender_id": user_id, "content": "does anyone have the notes from the last lecture?",
+            "room_id": "room-1", "timestamp": "2024-05-01T12:00:00Z", "message_type": "text"
+        }}
+    return {"type": rng.choice(["user_joined", "user_left"]), "user_id": user_id, "room_id": "room-1", "seq": seq}
+
+async def scenario(args, rate: float, batching: bool) -> dict:
+    from app.core.config import settings
+    from app.core.websocket_manager import WebSocketManager
+
+    settings.WS_ROOM_BATCHING_ENABLED = batching
+    rng = random.Random(args.seed)
+    manager = WebSocketManager()
+    sent_at, delays, sockets = {}, [], []
+    for index in range(args.members):
+        socket = CountingSocket(sent_at, delays)
+        sockets.append(socket)
+        await manager.connect(socket, f"user-{index}")
+        await manager.join_room(f"user-{index}", "room-1")
+
+    started = time.perf_counter()
+    seq = 0
+    while time.perf_counter() - started < args.seconds:
+        await asyncio.sleep(rng.expovariate(rate))
+        message = make_event(rng, args.members, seq)
+        sent_at[seq] = time.perf_counter()
+        exclude = message.get("user_id") if message["type"] == "user_joined" else None
+        await manager.broadcast_to_room("room-1", message, exclude_user=exclude)
+        seq += 1
+    elapsed = time.perf_counter() - started
+    # Let the last tick flush and the writers drain
+    await asyncio.sleep(0.2)
+    stats = manager.batcher.get_stats()
+    for user_id in list(manager.active_connections):
+        await manager.disconnect(user_id)
+
+    delays.sort()
+    return {
+        "events": seq,
+        "frames_per_member_s": sum(socket.frames for socket in sockets) / len(sockets) / elapsed,
+        "bytes_per_member_s": sum(socket.bytes for socket in sockets) / len(sockets) / elapsed,
+        "events_delivered_per_member": sum(socket.events for socket in sockets) / len(sockets),
+        "delay_median_ms": statistics.median(delays) if delays else 0.0,
+        "delay_p99_ms": delays[int(len(delays) * 0.99) - 1] if delays else 0.0,
+        "immediate": stats["immediate"],
+        "avg_batch": stats["avg_batch"]
+    }
+
+async def run(args):
+    logging.disable(logging.CRITICAL)
+    print(f"{args.members} members, {args.seconds}s per run")
+    print(
+        f"{'events/s':>8} {'mode':>8} {'sends/s':>9} {'KB/s':>8} {'delivered':>10} "
+        f"{'delay p50':>10} {'p99':>8} {'immediate':>10} {'avg batch':>10}"
+    )
+    report = {}
+    for rate in args.rates:
+        report[rate] = {}
+        for batching in (False, True):
+            result = await scenario(args, rate, batching)
+            mode = "batched" if batching else "direct"
+            report[rate][mode] = result
+            print(
+                f"{rate:>8.0f} {mode:>8} {result['frames_per_member_s']:>9.1f} {result['bytes_per_member_s'] / 1024:>8.1f} "
+                f"{result['events_delivered_per_member']:>6.0f}/{result['events']:<4} {result['delay_median_ms']:>8.1f}ms "
+                f"{result['delay_p99_ms']:>6.1f}ms {result['immediate']:>10} {result['avg_batch']:>10}"
+            )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=50)
+    parser.add_argument("--rates", type=float, nargs="+", default=[2, 20, 100, 400], help="room events per second")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write the results to this file")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
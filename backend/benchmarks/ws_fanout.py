@@ -0,0 +1,150 @@
+"""Room fan-out benchmark for WebSocketManager.broadcast_to_room.
+
+Simulated sockets take a sampled time per send, and a few of them stall.
+Each room size is measured until every healthy member has the message.
+Two paths are compared: the manager's fan-out, which serializes once and
+queues to per-connection writers, and the sequential loop it replaced,
+which serialized once per recipient. The enqueue column is how long the
+producing handler is held up. No network is involved.
+
+    python benchmarks/ws_fanout.py
+    python benchmarks/ws_fanout.py --sizes 50 500 5000 --send-ms 2 --stalled 0.01 --send-timeout 0.5
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MESSAGE = {
+    "type": "chat_message",
+    "data": {
+        "sender_id": "user-1",
+        "content": "Can someone explain the second step of the derivation? " * 3,
+        "room_id": "room-1",
+        "timestamp": "2024-01-01T12:00:00Z",
+        "message_type": "text"
+    }
+}
+
+class Delivery:
+    """Counts deliveries and wakes the benchmark once every healthy socket has the message"""
+
+    def __init__(self, expected: int):
+        self.expected = expected
+        self.done = asyncio.Event()
+        if expected == 0:
+            self.done.set()
+
+    def delivered(self):
+        self.expected -= 1
+        if self.expected == 0:
+            self.done.set()
+
+class SimulatedSocket:
+    """Stands in for a WebSocket: each send takes a sampled time, stalled sockets never finish"""
+
+    scope = {"subprotocols": []}
+
+    def __init__(self, rng: random.Random, send_ms: float, stalled: bool, delivery: Delivery):
+        self.delay = rng.expovariate(1 / send_ms) / 1000 if send_ms else 0
+        self.stalled = stalled
+        self.delivery = delivery
+
+    async def accept(self, subprotocol: str = None):
+        pass
+
+    async def send_text(self, text: str):
+        if self.stalled:
+            await asyncio.sleep(3600)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.delivery.delivered()
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        pass
+
+async def populate(manager, size: int, args, seed: int) -> Delivery:
+    rng = random.Random(seed)
+    for user_id in list(manager.active_connections):
+        await manager.disconnect(user_id)
+    stalled = [rng.random() < args.stalled for _ in range(size)]
+    delivery = Delivery(stalled.count(False))
+    for index in range(size):
+        user_id = f"user-{index}"
+        await manager.connect(SimulatedSocket(rng, args.send_ms, stalled[index], delivery), user_id)
+        await manager.join_room(user_id, "room-1")
+    return delivery
+
+async def sequential_broadcast(manager, room_id: str, message: dict, timeout: float):
+    """The previous implementation (plus the send timeout): one serialization and one awaited send per recipient"""
+    for user_id in list(manager.room_connections.get(room_id, ())):
+        connection = manager.active_connections.get(user_id)
+        if connection is None:
+            continue
+        try:
+            await asyncio.wait_for(connection.websocket.send_text(json.dumps(message)), timeout)
+        except Exception:
+            await manager.disconnect(user_id)
+
+async def measure(manager, broadcast, size: int, args) -> dict:
+    samples, enqueue_samples = [], []
+    for run in range(args.runs):
+        delivery = await populate(manager, size, args, seed=args.seed + run)
+        started = time.perf_counter()
+        await broadcast("room-1", MESSAGE)
+        enqueue_samples.append((time.perf_counter() - started) * 1000)
+        await delivery.done.wait()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {
+        "median_ms": round(statistics.median(samples), 2),
+        "max_ms": round(max(samples), 2),
+        "enqueue_ms": round(statistics.median(enqueue_samples), 3)
+    }
+
+async def run(args):
+    logging.basicConfig(level=logging.ERROR)
+    os.environ["WS_SEND_TIMEOUT"] = str(args.send_timeout)
+    from app.core.websocket_manager import WebSocketManager
+
+    manager = WebSocketManager()
+
+    async def previous(room_id, message):
+        await sequential_broadcast(manager, room_id, message, args.send_timeout)
+
+    print(f"{'room size':>9} {'enqueue':>10} {'queued':>10} {'sequential':>12} {'speedup':>8}")
+    report = {}
+    for size in args.sizes:
+        queued = await measure(manager, manager.broadcast_to_room, size, args)
+        row = {"queued": queued}
+        line = f"{size:>9} {queued['enqueue_ms']:>8.2f}ms {queued['median_ms']:>8.1f}ms"
+        if size <= args.max_sequential:
+            sequential = await measure(manager, previous, size, args)
+            row["sequential"] = sequential
+            line += f" {sequential['median_ms']:>10.1f}ms {sequential['median_ms'] / max(queued['median_ms'], 1e-3):>7.1f}x"
+        print(line)
+        report[size] = row
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200, 1000, 5000])
+    parser.add_argument("--send-ms", type=float, default=1.0, help="mean time per send")
+    parser.add_argument("--stalled", type=float, default=0.0, help="fraction of sockets that never finish a send")
+    parser.add_argument("--send-timeout", type=float, default=1.0, help="WS_SEND_TIMEOUT for the run, seconds")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-sequential", type=int, default=1000, help="skip the sequential baseline above this size")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write the results to this file")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Room membership benchmark for WebSocketManager join, leave and disconnect.
+
+Users are spread over rooms with a skewed (Zipf-like) room popularity,
+then mass-disconnect events are simulated: a fraction of all users drops
+at once, the way a deploy or a load balancer failover drops them, and
+then they rejoin their rooms. Disconnects go through the manager's
+reverse index. The scan over every room that it replaced is timed on a
+sample of the same users and extrapolated. Only membership is exercised:
+no sockets are opened, and logging is silenced.
+
+    python benchmarks/ws_membership.py
+    python benchmarks/ws_membership.py --users 100000 --rooms 10000 --rooms-per-user 3 --storm 0.2 --storms 3
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def plan_memberships(users: int, rooms: int, per_user: int, seed: int) -> dict:
+    """Pick each user's rooms; a few rooms are large and most are small"""
+    rng = random.Random(seed)
+    room_ids = [f"room-{index}" for index in range(rooms)]
+    weights = [1 / (rank + 1) for rank in range(rooms)]
+    plan = {}
+    for index in range(users):
+        chosen = set(rng.choices(room_ids, weights=weights, k=per_user))
+        plan[f"user-{index}"] = chosen
+    return plan
+
+def scan_disconnect(room_connections: dict, user_id: str):
+    """The previous disconnect: look for the user in every room"""
+    for room_id in list(room_connections.keys()):
+        if user_id in room_connections[room_id]:
+            room_connections[room_id].discard(user_id)
+            if not room_connections[room_id]:
+                del room_connections[room_id]
+
+async def join_all(manager, plan: dict, user_ids) -> float:
+    started = time.perf_counter()
+    for user_id in user_ids:
+        for room_id in plan[user_id]:
+            await manager.join_room(user_id, room_id)
+    return time.perf_counter() - started
+
+async def run(args):
+    logging.disable(logging.CRITICAL)
+    from app.core.websocket_manager import WebSocketManager
+
+    plan = plan_memberships(args.users, args.rooms, args.rooms_per_user, args.seed)
+    manager = WebSocketManager()
+    seconds = await join_all(manager, plan, plan)
+    memberships = sum(len(rooms) for rooms in plan.values())
+    sizes = sorted((len(members) for members in manager.room_connections.values()), reverse=True)
+    print(
+        f"{args.users} users, {len(manager.room_connections)} occupied rooms, {memberships} memberships "
+        f"(largest room {sizes[0]}, median {statistics.median(sizes):.0f}); joined in {seconds * 1000:.0f}ms"
+    )
+
+    rng = random.Random(args.seed + 1)
+    storm_size = int(args.users * args.storm)
+    report = {"users": args.users, "rooms": args.rooms, "memberships": memberships, "storms": []}
+    print(f"{'storm':>5} {'users':>7} {'disconnect':>12} {'per user':>10} {'rejoin':>9} {'scan (est.)':>13} {'speedup':>8}")
+    for storm in range(args.storms):
+        dropped = rng.sample(list(plan), storm_size)
+
+        started = time.perf_counter()
+        for user_id in dropped:
+            await manager.disconnect(user_id)
+        disconnect_seconds = time.perf_counter() - started
+
+        # The scan sees the room table as it stood before the storm
+        sample = dropped[:min(args.scan_sample, len(dropped))]
+        rooms = {room_id: set(members) for room_id, members in manager.room_connections.items()}
+        for user_id in dropped:
+            for room_id in plan[user_id]:
+                rooms.setdefault(room_id, set()).add(user_id)
+        started = time.perf_counter()
+        for user_id in sample:
+            scan_disconnect(rooms, user_id)
+        scan_seconds = (time.perf_counter() - started) * len(dropped) / max(len(sample), 1)
+
+        rejoin_seconds = await join_all(manager, plan, dropped)
+        assert sum(len(members) for members in manager.room_connections.values()) == memberships
+
+        row = {
+            "users": storm_size,
+            "disconnect_ms": round(disconnect_seconds * 1000, 1),
+            "per_user_us": round(disconnect_seconds / storm_size * 1e6, 2),
+            "rejoin_ms": round(rejoin_seconds * 1000, 1),
+            "scan_estimate_ms": round(scan_seconds * 1000, 1)
+        }
+        report["storms"].append(row)
+        print(
+            f"{storm + 1:>5} {storm_size:>7} {row['disconnect_ms']:>10.1f}ms {row['per_user_us']:>8.2f}us "
+            f"{row['rejoin_ms']:>7.1f}ms {row['scan_estimate_ms']:>11.0f}ms {scan_seconds / max(disconnect_seconds, 1e-9):>7.0f}x"
+        )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--rooms", type=int, default=10000)
+    parser.add_argument("--rooms-per-user", type=int, default=2)
+    parser.add_argument("--storm", type=float, default=0.25, help="fraction of users dropped by each mass disconnect")
+    parser.add_argument("--storms", type=int, default=3)
+    parser.add_argument("--scan-sample", type=int, default=200, help="users timed with the old scan, extrapolated to the storm")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write the results to this file")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Wire size and encoding cost of the WebSocket protocols.
+
+Part one is bytes per message, by message type, for four formats: JSON
+text, the MessagePack protocol with its field dictionary, and each of
+those under permessage-deflate. Deflate is simulated the way RFC 7692
+runs it: a raw deflate stream per connection with context takeover,
+sync-flushed after every message, minus the 4-byte flush tail.
+
+Part two is CPU per room broadcast through WebSocketManager. Sockets are
+connected with either subprotocol, and each broadcast is encoded once per
+wire format. Deflate runs once per recipient, because every connection
+has its own compression context, so its cost is reported separately.
+
+    python benchmarks/ws_protocol.py
+    python benchmarks/ws_protocol.py --messages 2000 --room-size 1000 --broadcasts 200
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = "the derivative of a product is not the product of the derivatives so apply the rule step by step".split()
+
+def sample_messages(rng: random.Random) -> dict:
+    """A factory per message type producing realistic, varied frames"""
+    def user():
+        return f"user-{rng.randrange(100000)}"
+
+    def sentence(words):
+        return " ".join(rng.choice(WORDS) for _ in range(words))
+
+    return {
+        "chat_message": lambda: {"type": "chat_message", "data": {
+            "sender_id": user(), "content": sentence(rng.randint(4, 30)), "room_id": "room-42",
+            "timestamp": f"2024-05-01T12:{rng.randrange(60):02d}:{rng.randrange(60):02d}Z", "message_type": "text"
+        }},
+        "user_joined": lambda: {"type": "user_joined", "user_id": user(), "room_id": "room-42"},
+        "typing": lambda: {"type": "typing", "user_id": user(), "room_id": "room-42"},
+        "ai_token": lambda: {"type": "ai_token", "content": " " + rng.choice(WORDS), "request_id": "3f2a9c1e8b7d4f60a1b2c3d4e5f60718"},
+        "ai_done": lambda: {
+            "type": "ai_done", "provider": "openai", "cached": False, "request_id": "3f2a9c1e8b7d4f60a1b2c3d4e5f60718",
+            "usage": {"prompt_tokens": rng.randint(50, 900), "completion_tokens": rng.randint(20, 400), "chunks": rng.randint(20, 400)},
+            "first_token_ms": round(rng.uniform(150, 900), 1), "elapsed_ms": round(rng.uniform(900, 9000), 1)
+        },
+        "notification": lambda: {"type": "notification", "data": {
+            "type": "reminder", "title": "Study Reminder", "message": "Time to continue your learning journey!", "timestamp": "now"
+        }},
+        "ai_job_update": lambda: {
+            "type": "ai_job_update", "job_id": f"{rng.getrandbits(64):016x}", "job_type": "quiz",
+            "status": rng.choice(["queued", "running", "succeeded"]), "attempts": rng.randint(0, 2), "error": None
+        }
+    }
+
+class Deflater:
+    """One direction of a permessage-deflate connection"""
+
+    def __init__(self):
+        self.stream = zlib.compressobj(wbits=-15)
+
+    def compress(self, data: bytes) -> bytes:
+        # Strip the empty stored block every sync flush ends with (RFC 7692 7.2.1)
+        return (self.stream.compress(data) + self.stream.flush(zlib.Z_SYNC_FLUSH))[:-4]
+
+def measure_sizes(args, encode_binary):
+    rng = random.Random(args.seed)
+    print(f"{'type':>15} {'json':>7} {'msgpack':>8} {'json+defl':>10} {'mp+defl':>8} {'saved':>7}")
+    report = {}
+    for name, make in sample_messages(rng).items():
+        sizes = {"json": [], "msgpack": [], "json_deflate": [], "msgpack_deflate": []}
+        json_stream, binary_stream = Deflater(), Deflater()
+        for _ in range(args.messages):
+            message = make()
+            text = json.dumps(message).encode("utf-8")
+            binary = encode_binary(message)
+            sizes["json"].append(len(text))
+            sizes["msgpack"].append(len(binary))
+            sizes["json_deflate"].append(len(json_stream.compress(text)))
+            sizes["msgpack_deflate"].append(len(binary_stream.compress(binary)))
+        means = {fmt: statistics.mean(values) for fmt, values in sizes.items()}
+        report[name] = {fmt: round(mean, 1) for fmt, mean in means.items()}
+        print(
+            f"{name:>15} {means['json']:>7.1f} {means['msgpack']:>8.1f} {means['json_deflate']:>10.1f} "
+            f"{means['msgpack_deflate']:>8.1f} {1 - means['msgpack_deflate'] / means['json']:>6.0%}"
+        )
+    return report
+
+class NullSocket:
+    """Stands in for a WebSocket that offers one subprotocol and discards what it is sent"""
+
+    def __init__(self, subprotocol: str):
+        self.scope = {"subprotocols": [subprotocol]}
+
+    async def accept(self, subprotocol: str = None):
+        pass
+
+    async def send_text(self, text: str):
+        pass
+
+    async def send_bytes(self, data: bytes):
+        pass
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        pass
+
+async def measure_broadcast(args, protocol: str):
+    from app.core.websocket_manager import WebSocketManager
+
+    rng = random.Random(args.seed)
+    make = sample_messages(rng)["chat_message"]
+    manager = WebSocketManager()
+    for index in range(args.room_size):
+        await manager.connect(NullSocket(protocol), f"user-{index}")
+        await manager.join_room(f"user-{index}", "room-42")
+    connection = next(iter(manager.active_connections.values()))
+
+    encode_us, deflate_us = [], []
+    deflaters = [Deflater() for _ in range(args.room_size)]
+    for _ in range(args.broadcasts):
+        message = make()
+        started = time.perf_counter()
+        await manager.broadcast_to_room("room-42", message)
+        encode_us.append((time.perf_counter() - started) * 1e6)
+        data = connection.queue[-1][0]
+        data = data.encode("utf-8") if isinstance(data, str) else data
+        started = time.perf_counter()
+        for deflater in deflaters:
+            deflater.compress(data)
+        deflate_us.append((time.perf_counter() - started) * 1e6)
+        # Let the writers drain so queues stay below the overflow limit
+        await asyncio.sleep(0)
+    for user_id in list(manager.active_connections):
+        await manager.disconnect(user_id)
+    return statistics.median(encode_us), statistics.median(deflate_us)
+
+async def run(args):
+    logging.disable(logging.CRITICAL)
+    from app.core.ws_protocol import JSON_PROTOCOL, MSGPACK_PROTOCOL, encode_binary
+
+    report = {"bytes": measure_sizes(args, encode_binary), "broadcast_us": {}}
+    print(f"\nchat_message broadcast to {args.room_size} sockets (median of {args.broadcasts})")
+    print(f"{'protocol':>24} {'encode+queue':>13} {'deflate':>10}")
+    for protocol in (JSON_PROTOCOL, MSGPACK_PROTOCOL):
+        encode_us, deflate_us = await measure_broadcast(args, protocol)
+        report["broadcast_us"][protocol] = {"encode_and_queue": round(encode_us, 1), "deflate": round(deflate_us, 1)}
+        print(f"{protocol:>24} {encode_us:>11.0f}us {deflate_us:>8.0f}us")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1000, help="messages per type for the size table")
+    parser.add_argument("--room-size", type=int, default=500)
+    parser.add_argument("--broadcasts", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write the results to this file")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -10,15 +10,20 @@ from typing import List, Dict, Any
 import os
 from dotenv import load_dotenv
 
-from backend.app.core.config import settings
+from app.core.config import settings
 from app.core.database import init_db, close_db
 from app.core.neo4j_client import init_neo4j, close_neo4j
 from app.core.redis_client import init_redis, close_redis
 from app.api.v1.api import api_router
-from app.core.websocket_manager import WebSocketManager
+from app.api.v1.endpoints.classes import index_classes
+from app.core.websocket_manager import websocket_manager
+from app.core.ws_protocol import receive_message, describe as describe_ws_protocol
 from app.core.notification_service import NotificationService
-from app.core.ai_service import AIService
-from app.core.study_room_service import StudyRoomService
+from app.core.ai_service import ai_service
+from app.core.study_room_service import study_room_service
+from app.core.ai_stream_manager import ai_stream_manager
+from app.core.ai_jobs import ai_job_queue
+from app.core.readiness import readiness
 
 # Load environment variables
 load_dotenv()
@@ -28,29 +33,45 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Global instances
-websocket_manager = WebSocketManager()
 notification_service = NotificationService()
-ai_service = AIService()
-study_room_service = StudyRoomService()
+
+readiness.register("database", init_db)
+readiness.register("neo4j", init_neo4j)
+readiness.register("redis", init_redis)
+readiness.register("ai_service", ai_service.initialize)
+# OpenAI embeddings need the client ai_service sets up; local ones only need their store
+readiness.register(
+    "embeddings", ai_service.load_embeddings,
+    after=["ai_service"] if settings.EMBEDDING_PROVIDER == "openai" else None
+)
+readiness.register("class_index", index_classes, after=["embeddings"])
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting up EvolveLearn API...")
-    await init_db()
-    await init_neo4j()
-    await init_redis()
-    await ai_service.initialize()
-    logger.info("EvolveLearn API started successfully")
+    await readiness.start()
+    await websocket_manager.start()
+    study_room_service.start()
+    # Push background job updates from the workers to connected users; every node hears them
+    job_listener = asyncio.create_task(ai_job_queue.listen(websocket_manager.send_local_message))
+    logger.info(f"EvolveLearn API started ({readiness.status()}) in {readiness.startup_ms}ms")
     
     yield
     
     # Shutdown
     logger.info("Shutting down EvolveLearn API...")
-    await close_db()
-    await close_neo4j()
-    await close_redis()
-    await ai_service.cleanup()
+    job_listener.cancel()
+    await websocket_manager.stop()
+    study_room_service.stop()
+    await readiness.stop()
+    results = await asyncio.gather(
+        close_db(), close_neo4j(), close_redis(), ai_service.cleanup(),
+        return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(f"Error during shutdown: {result}")
     logger.info("EvolveLearn API shut down successfully")
 
 app = FastAPI(
@@ -83,11 +104,13 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
     await websocket_manager.connect(websocket, user_id)
     try:
         while True:
-            data = await websocket.receive_text()
-            message = json.loads(data)
+            message = await receive_message(websocket)
+            websocket_manager.touch(user_id)
             
             # Handle different message types
-            if message["type"] == "chat":
+            if message["type"] == "ping":
+                await websocket_manager.send_personal_message(user_id, {"type": "pong"})
+            elif message["type"] == "chat":
                 await handle_chat_message(user_id, message)
             elif message["type"] == "study_room_join":
                 await handle_study_room_join(user_id, message)
@@ -95,12 +118,23 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
                 await handle_study_room_leave(user_id, message)
             elif message["type"] == "notification":
                 await handle_notification(user_id, message)
+            elif message["type"] == "ai_request":
+                await handle_ai_request(user_id, message)
+            elif message["type"] == "ai_cancel":
+                await handle_ai_cancel(user_id, message)
                 
     except WebSocketDisconnect:
-        await websocket_manager.disconnect(user_id)
+        # After a reconnect the user's streams belong to the new socket
+        if websocket_manager.is_current(user_id, websocket):
+            await ai_stream_manager.cancel_all(user_id)
+        await websocket_manager.disconnect(user_id, websocket)
+        await study_room_service.forget_disconnected(user_id)
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
-        await websocket_manager.disconnect(user_id)
+        if websocket_manager.is_current(user_id, websocket):
+            await ai_stream_manager.cancel_all(user_id)
+        await websocket_manager.disconnect(user_id, websocket)
+        await study_room_service.forget_disconnected(user_id)
 
 async def handle_chat_message(user_id: str, message: Dict[str, Any]):
     """Handle chat messages and broadcast to relevant users"""
@@ -150,7 +184,18 @@ async def handle_study_room_join(user_id: str, message: Dict[str, Any]):
     """Handle user joining a study room"""
     try:
         room_id = message["room_id"]
-        await study_room_service.add_user_to_room(user_id, room_id)
+        if await study_room_service.is_full(room_id, user_id):
+            await websocket_manager.send_personal_message(
+                user_id,
+                {
+                    "type": "room_full",
+                    "room_id": room_id,
+                    "max_users": study_room_service.capacity(room_id)
+                }
+            )
+            return
+        if not await study_room_service.add_user_to_room(user_id, room_id):
+            return
         
         # Notify other users in the room
         await websocket_manager.broadcast_to_room(
@@ -211,6 +256,20 @@ async def handle_notification(user_id: str, message: Dict[str, Any]):
     except Exception as e:
         logger.error(f"Error handling notification: {e}")
 
+async def handle_ai_request(user_id: str, message: Dict[str, Any]):
+    """Start an AI request whose tokens are streamed back over the socket"""
+    try:
+        await ai_stream_manager.start(user_id, message)
+    except Exception as e:
+        logger.error(f"Error handling AI request: {e}")
+
+async def handle_ai_cancel(user_id: str, message: Dict[str, Any]):
+    """Cancel a streaming AI request"""
+    try:
+        await ai_stream_manager.cancel(user_id, message["request_id"])
+    except Exception as e:
+        logger.error(f"Error cancelling AI request: {e}")
+
 @app.get("/")
 async def root():
     return {
@@ -221,16 +280,29 @@ async def root():
 
 @app.get("/health")
 async def health_check():
+    return readiness.describe()
+
+@app.get("/ws/stats")
+async def websocket_stats():
+    """Live WebSocket connections, send queue depths and overflow counters"""
     return {
-        "status": "healthy",
-        "services": {
-            "database": "connected",
-            "neo4j": "connected",
-            "redis": "connected",
-            "ai_service": "initialized"
-        }
+        **websocket_manager.get_stats(),
+        "study_rooms": study_room_service.get_stats(),
+        "ai_streams": ai_stream_manager.get_stats()
     }
 
+@app.get("/ws/protocol")
+async def websocket_protocol():
+    """WebSocket subprotocols on offer and the binary protocol's field dictionary"""
+    return describe_ws_protocol()
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 503 until every required service is up"""
+    if not readiness.is_ready():
+        raise HTTPException(status_code=503, detail=readiness.describe())
+    return {"status": readiness.status()}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -238,5 +310,8 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8000,
         reload=True,
-        log_level="info"
+        log_level="info",
+        ws_per_message_deflate=settings.WS_PER_MESSAGE_DEFLATE,
+        ws_ping_interval=settings.WS_PING_INTERVAL,
+        ws_ping_timeout=settings.WS_PING_TIMEOUT
     ) 
\ No newline at end of file
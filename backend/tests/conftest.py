@@ -0,0 +1,66 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.core.redis_client import redis_client
+
+@pytest.fixture
+async def redis():
+    """An empty in-memory Redis behind the shared redis_client"""
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    await client.flushall()
+    previous, redis_client.redis = redis_client.redis, client
+    yield client
+    redis_client.redis = previous
+    await client.flushall()
+
+@pytest.fixture
+def fast_simulation(monkeypatch):
+    """Make the simulated provider answer within milliseconds"""
+    monkeypatch.setattr(settings, "AI_SIM_LATENCY_MEDIAN_MS", 5.0)
+    monkeypatch.setattr(settings, "AI_SIM_LATENCY_P99_MS", 10.0)
+    monkeypatch.setattr(settings, "AI_SIM_TOKENS_PER_SECOND", 2000.0)
+    monkeypatch.setattr(settings, "AI_SIM_ERROR_RATE", 0.0)
+    monkeypatch.setattr(settings, "AI_SIM_RATE_LIMIT_RATE", 0.0)
+    monkeypatch.setattr(settings, "AI_SIM_RATE_LIMIT_RPM", 0)
+
+@pytest.fixture
+def ai(redis, fast_simulation):
+    """An AIService answering from the simulated provider only"""
+    from app.core.ai_service import AIService
+    from app.core.simulated_provider import SimulatedProvider
+
+    service = AIService()
+    service.current_provider = "simulated"
+    service.fallback_providers = []
+    service.simulated_client = SimulatedProvider(seed=1)
+    # Count tokens by length rather than fetching tokenizer files
+    service.budgeter._loaded = True
+    return service
+
+@pytest.fixture
+def embeddings(monkeypatch, tmp_path):
+    """A local hashing EmbeddingService whose store lives in a temporary directory"""
+    from app.core.embedding_service import EmbeddingService
+
+    monkeypatch.setattr(settings, "EMBEDDING_PROVIDER", "local")
+    monkeypatch.setattr(settings, "EMBEDDING_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "EMBEDDING_BATCH_WINDOW_MS", 1)
+    return EmbeddingService()
+
+@pytest.fixture
+async def manager(monkeypatch):
+    """A single-node WebSocketManager that sends room events as they come"""
+    from app.core.websocket_manager import WebSocketManager
+
+    monkeypatch.setattr(settings, "WS_BROKER", "local")
+    monkeypatch.setattr(settings, "WS_ROOM_BATCHING_ENABLED", False)
+    manager = WebSocketManager()
+    yield manager
+    for connection in list(manager.active_connections.values()):
+        connection.stop()
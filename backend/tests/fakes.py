@@ -0,0 +1,35 @@
+import asyncio
+import json
+from typing import Any, Dict, List
+
+from app.core.ws_protocol import decode_binary
+
+class FakeSocket:
+    """Stands in for a Starlette WebSocket, recording the frames it is sent"""
+
+    def __init__(self, *subprotocols: str):
+        self.scope = {"subprotocols": list(subprotocols)}
+        self.subprotocol = None
+        self.sent: List[Any] = []
+        self.closed = None
+
+    async def accept(self, subprotocol: str = None):
+        self.subprotocol = subprotocol
+
+    async def send_text(self, text: str):
+        self.sent.append(text)
+
+    async def send_bytes(self, data: bytes):
+        self.sent.append(data)
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        self.closed = (code, reason)
+
+    def messages(self) -> List[Dict[str, Any]]:
+        """Every frame sent so far, decoded"""
+        return [decode_binary(frame) if isinstance(frame, bytes) else json.loads(frame) for frame in self.sent]
+
+async def settle(rounds: int = 5):
+    """Let writer tasks and callbacks run"""
+    for _ in range(rounds):
+        await asyncio.sleep(0)
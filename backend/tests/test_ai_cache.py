@@ -0,0 +1,74 @@
+from app.core.ai_cache import AIResponseCache
+from app.core.config import settings
+
+def test_key_ignores_whitespace_and_unicode_form():
+    cache = AIResponseCache()
+    plain = cache.build_key("What is  a\nderivative?", "Calculus", "gpt-4", 0.2)
+    spaced = cache.build_key("  What is a derivative? ", "Calculus ", "gpt-4", 0.2)
+    assert plain == spaced
+    assert cache.build_key("café", None, "gpt-4", 0.2) == cache.build_key("café", None, "gpt-4", 0.2)
+
+def test_key_separates_model_temperature_tokens_and_type():
+    cache = AIResponseCache()
+    base = cache.build_key("prompt", None, "gpt-4", 0.2, 100, "lesson")
+    assert base.startswith("ai_cache:lesson:")
+    assert base != cache.build_key("prompt", None, "claude", 0.2, 100, "lesson")
+    assert base != cache.build_key("prompt", None, "gpt-4", 0.3, 100, "lesson")
+    assert base != cache.build_key("prompt", None, "gpt-4", 0.2, 200, "lesson")
+    assert base != cache.build_key("prompt", None, "gpt-4", 0.2, 100, "quiz")
+
+def test_only_low_temperature_calls_are_cacheable(monkeypatch):
+    cache = AIResponseCache()
+    monkeypatch.setattr(settings, "AI_CACHE_MAX_TEMPERATURE", 0.5)
+    assert cache.is_cacheable(0.2)
+    assert not cache.is_cacheable(0.9)
+    monkeypatch.setattr(settings, "AI_CACHE_ENABLED", False)
+    assert not cache.is_cacheable(0.0)
+
+def test_ttl_per_content_type(monkeypatch):
+    monkeypatch.setattr(settings, "AI_CACHE_TTLS", {"default": 60, "lesson": 600})
+    cache = AIResponseCache()
+    assert cache.ttl_for("lesson") == 600
+    assert cache.ttl_for("unknown") == 60
+
+async def test_round_trip_counts_hits_and_misses(redis):
+    cache = AIResponseCache()
+    key = cache.build_key("prompt", None, "gpt-4", 0.2, content_type="lesson")
+    assert await cache.get(key) is None
+    await cache.set(key, {"success": True, "content": "answer"}, "lesson")
+    assert await cache.get(key) == {"success": True, "content": "answer", "cached": True}
+    assert 0 < await redis.ttl(key) <= settings.AI_CACHE_TTLS["lesson"]
+
+    stats = await cache.get_stats()
+    assert stats["worker"]["hits"] == 1 and stats["worker"]["misses"] == 1
+    assert stats["shared"] == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+async def test_invalidate_content_type(redis):
+    cache = AIResponseCache()
+    lesson = cache.build_key("a", None, "gpt-4", 0.2, content_type="lesson")
+    quiz = cache.build_key("a", None, "gpt-4", 0.2, content_type="quiz")
+    await cache.set(lesson, {"content": "l"}, "lesson")
+    await cache.set(quiz, {"content": "q"}, "quiz")
+    assert await cache.invalidate_content_type("lesson") == 1
+    assert await cache.get(lesson) is None
+    assert await cache.get(quiz) is not None
+
+async def test_redis_errors_degrade_to_misses():
+    cache = AIResponseCache()
+    # No Redis connection at all: lookups miss and stores are dropped
+    assert await cache.get("ai_cache:default:x") is None
+    await cache.set("ai_cache:default:x", {"content": "c"})
+    assert cache.errors == 2
+
+async def test_generate_response_is_served_from_cache(ai):
+    first = await ai.generate_response("Explain photosynthesis", temperature=0.2)
+    second = await ai.generate_response("Explain  photosynthesis", temperature=0.2)
+    assert first["success"] and "cached" not in first
+    assert second["cached"] is True and second["content"] == first["content"]
+    assert ai.simulated_client.stats["requests"] == 1
+
+async def test_hot_calls_bypass_cache(ai):
+    await ai.generate_response("Write a poem", temperature=1.0)
+    await ai.generate_response("Write a poem", temperature=1.0)
+    assert ai.simulated_client.stats["requests"] == 2
+    assert ai.cache.skipped == 2
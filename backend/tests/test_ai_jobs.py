@@ -0,0 +1,138 @@
+import asyncio
+import json
+
+import pytest
+
+from app.core import ai_jobs, ai_tasks
+from app.core.ai_jobs import AIJobError, AIJobQueue, JobLimitExceeded
+from app.core.celery_app import ATTEMPT_TIMEOUT, SOFT_TIME_LIMIT, celery_app
+from app.core.config import settings
+from tests.fakes import FakeSocket, settle
+
+@pytest.fixture
+def sent(monkeypatch):
+    """Capture the tasks handed to Celery instead of contacting a broker"""
+    calls = []
+
+    async def run(service, func, *args, **kwargs):
+        calls.append((service, args, kwargs))
+
+    monkeypatch.setattr(ai_jobs.blocking_executor, "run", run)
+    return calls
+
+@pytest.fixture
+def queue(redis, sent, monkeypatch):
+    queue = AIJobQueue()
+    monkeypatch.setattr(ai_tasks, "ai_job_queue", queue)
+    return queue
+
+def test_workers_drain_lanes_by_priority():
+    assert celery_app.conf.broker_transport_options["queue_order_strategy"] == "priority"
+    assert [queue.name for queue in celery_app.conf.task_queues] == list(settings.AI_JOB_QUEUES.values())
+
+def test_attempt_timeout_fires_before_the_soft_limit():
+    assert ATTEMPT_TIMEOUT < SOFT_TIME_LIMIT < settings.AI_JOB_TIME_LIMIT
+    assert celery_app.conf.task_soft_time_limit == SOFT_TIME_LIMIT
+    assert celery_app.conf.broker_transport_options["visibility_timeout"] > settings.AI_JOB_TIME_LIMIT
+
+async def test_submit_queues_on_the_priority_lane(queue, sent):
+    job = await queue.submit("alice", "quiz", {"topic": "algebra"}, priority="high")
+    assert job["status"] == ai_jobs.QUEUED
+    assert "owner" not in job and "notify_user_id" not in job
+    service, args, kwargs = sent[0]
+    assert service == "celery"
+    assert args == ("ai_jobs.run",)
+    assert kwargs == {"args": [job["job_id"]], "queue": settings.AI_JOB_QUEUES["high"]}
+    stored = await queue.get(job["job_id"])
+    assert stored["owner"] == "alice" and stored["params"] == {"topic": "algebra"}
+
+async def test_unknown_type_or_priority_is_rejected(queue):
+    with pytest.raises(ValueError):
+        await queue.submit("alice", "essay", {})
+    with pytest.raises(ValueError):
+        await queue.submit("alice", "quiz", {}, priority="urgent")
+
+async def test_per_user_limit(queue, monkeypatch):
+    monkeypatch.setattr(settings, "AI_JOB_MAX_CONCURRENT_PER_USER", 2)
+    first = await queue.submit("alice", "quiz", {})
+    await queue.submit("alice", "quiz", {})
+    with pytest.raises(JobLimitExceeded):
+        await queue.submit("alice", "quiz", {})
+    # Other users have their own slots, and finishing a job frees one
+    await queue.submit("bob", "quiz", {})
+    await queue.finish(await queue.get(first["job_id"]), result={"success": True})
+    await queue.submit("alice", "quiz", {})
+    assert queue.get_stats() == {"submitted": 4, "rejected": 1}
+
+async def test_failed_send_releases_the_slot(queue, redis, monkeypatch):
+    async def unreachable(*args, **kwargs):
+        raise ConnectionError("broker down")
+
+    monkeypatch.setattr(ai_jobs.blocking_executor, "run", unreachable)
+    with pytest.raises(ConnectionError):
+        await queue.submit("alice", "quiz", {})
+    assert await redis.zcard(queue._slots_key("alice")) == 0
+    assert await redis.keys("ai_job:*") == []
+
+async def test_finish_stores_the_result_and_publishes(queue, redis):
+    job = await queue.submit("alice", "quiz", {}, notify_user_id="alice-socket")
+    pubsub = redis.pubsub()
+    await pubsub.subscribe(ai_jobs.JOB_EVENTS_CHANNEL)
+    await pubsub.get_message(timeout=1)
+
+    await queue.finish(await queue.get(job["job_id"]), result={"success": True, "questions": []})
+    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1)
+    event = json.loads(message["data"])
+    assert event["notify_user_id"] == "alice-socket"
+    assert event["status"] == ai_jobs.SUCCEEDED and event["result"]["questions"] == []
+    assert 0 < await redis.ttl(queue._key(job["job_id"])) <= settings.AI_JOB_RESULT_TTL
+    await pubsub.aclose()
+
+async def test_update_is_pushed_to_the_submitters_socket(queue, manager):
+    submitter, other = FakeSocket(), FakeSocket()
+    await manager.connect(submitter, "user1")
+    await manager.connect(other, "user2")
+    listener = asyncio.create_task(queue.listen(manager.send_local_message))
+    await settle()
+
+    job = await queue.submit("user1@example.com", "quiz", {}, notify_user_id="user1")
+    await queue.finish(await queue.get(job["job_id"]), result={"success": True})
+    for _ in range(50):
+        if submitter.sent:
+            break
+        await asyncio.sleep(0.01)
+    listener.cancel()
+    await settle(10)
+    assert [(message["type"], message["job_id"]) for message in submitter.messages()] == [("ai_job_update", job["job_id"])]
+    assert other.sent == []
+
+async def test_failed_attempt_is_retried_then_fails(queue, monkeypatch):
+    async def flaky(**params):
+        return {"success": False, "error": "provider down"}
+
+    monkeypatch.setattr(ai_tasks.ai_service, "generate_quiz_questions", flaky)
+    job = await queue.submit("alice", "quiz", {})
+
+    with pytest.raises(AIJobError):
+        await ai_tasks.execute_job(job["job_id"], 0, final=False)
+    assert (await queue.get(job["job_id"]))["status"] == ai_jobs.RETRYING
+
+    await ai_tasks.execute_job(job["job_id"], 1, final=True)
+    stored = await queue.get(job["job_id"])
+    assert (stored["status"], stored["attempts"], stored["error"]) == (ai_jobs.FAILED, 2, "provider down")
+
+async def test_attempt_timeout_is_recorded(queue, monkeypatch):
+    async def slow(**params):
+        await asyncio.sleep(1)
+
+    monkeypatch.setattr(ai_tasks.ai_service, "generate_quiz_questions", slow)
+    monkeypatch.setattr(ai_tasks, "ATTEMPT_TIMEOUT", 0.01)
+    job = await queue.submit("alice", "quiz", {})
+    await ai_tasks.execute_job(job["job_id"], 0, final=True)
+    assert (await queue.get(job["job_id"]))["error"] == "Job attempt timed out"
+
+async def test_bad_params_fail_without_retry(queue):
+    job = await queue.submit("alice", "quiz", {"no_such_param": 1})
+    await ai_tasks.execute_job(job["job_id"], 0, final=False)
+    stored = await queue.get(job["job_id"])
+    assert stored["status"] == ai_jobs.FAILED and stored["error"].startswith("Invalid parameters")
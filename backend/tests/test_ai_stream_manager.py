@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+import app.core.ai_stream_manager as stream_module
+from app.core.ai_stream_manager import AIStreamManager
+from app.core.config import settings
+from app.core.websocket_manager import WebSocketManager
+from tests.fakes import FakeSocket, settle
+
+@pytest.fixture
+def frames(monkeypatch, ai):
+    """Frames the stream manager sends, per user, with AI answers from the simulated provider"""
+    sent = {}
+
+    async def send_personal_message(user_id, message):
+        sent.setdefault(user_id, []).append(message)
+
+    monkeypatch.setattr(stream_module, "ai_service", ai)
+    monkeypatch.setattr(stream_module.websocket_manager, "send_personal_message", send_personal_message)
+    return sent
+
+async def finish(manager):
+    for tasks in list(manager.tasks.values()):
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+async def test_streams_tokens_tagged_with_request_id(frames):
+    manager = AIStreamManager()
+    await manager.start("u1", {"type": "ai_request", "request_id": "r1", "prompt": "Explain gravity"})
+    await finish(manager)
+    types = [frame["type"] for frame in frames["u1"]]
+    assert types[-1] == "ai_done" and set(types[:-1]) == {"ai_token"}
+    assert all(frame["request_id"] == "r1" for frame in frames["u1"])
+    assert manager.get_stats() == {"users": 0, "streams": 0}
+
+@pytest.mark.parametrize("message, error", [
+    ({}, "ai_request needs a prompt"),
+    ({"prompt": "   "}, "ai_request needs a prompt"),
+    ({"prompt": "hi", "max_tokens": "lots"}, "max_tokens must be a number"),
+    ({"prompt": "hi", "temperature": True}, "temperature must be a number"),
+])
+async def test_invalid_requests_get_an_error_frame(frames, message, error):
+    manager = AIStreamManager()
+    await manager.start("u1", {"type": "ai_request", "request_id": "r1", **message})
+    assert frames["u1"] == [{"type": "ai_error", "error": error, "request_id": "r1"}]
+    assert not manager.tasks
+
+async def test_generation_limits_are_clamped(frames, monkeypatch, ai):
+    monkeypatch.setattr(settings, "AI_WS_MAX_TOKENS", 500)
+    monkeypatch.setattr(settings, "AI_WS_MAX_TEMPERATURE", 1.0)
+    requested = {}
+
+    async def stream_response(prompt, **options):
+        requested.update(options)
+        yield {"type": "done"}
+
+    monkeypatch.setattr(ai, "stream_response", stream_response)
+    manager = AIStreamManager()
+    await manager.start("u1", {"prompt": "hi", "max_tokens": 100000, "temperature": 7})
+    await manager.start("u1", {"prompt": "hi", "max_tokens": -3, "temperature": -1})
+    await finish(manager)
+    assert requested["max_tokens"] == 1 and requested["temperature"] == 0.0
+
+    manager = AIStreamManager()
+    await manager.start("u2", {"prompt": "hi", "max_tokens": 100000, "temperature": 7})
+    await finish(manager)
+    assert requested["max_tokens"] == 500 and requested["temperature"] == 1.0
+
+async def test_duplicate_and_excess_requests_are_refused(frames, monkeypatch):
+    monkeypatch.setattr(settings, "AI_WS_MAX_CONCURRENT_REQUESTS", 2)
+    manager = AIStreamManager()
+    await manager.start("u1", {"request_id": "a", "prompt": "one"})
+    await manager.start("u1", {"request_id": "a", "prompt": "again"})
+    await manager.start("u1", {"request_id": "b", "prompt": "two"})
+    await manager.start("u1", {"request_id": "c", "prompt": "three"})
+    errors = [(frame["request_id"], frame["error"]) for frame in frames["u1"] if frame["type"] == "ai_error"]
+    assert errors == [("a", "Duplicate request_id"), ("c", "Too many concurrent AI requests")]
+    await manager.cancel_all("u1")
+    await finish(manager)
+
+async def test_cancel_sends_ai_cancelled(frames):
+    manager = AIStreamManager()
+    await manager.start("u1", {"request_id": "r1", "prompt": "Explain gravity"})
+    await asyncio.sleep(0)
+    assert await manager.cancel("u1", "r1")
+    await finish(manager)
+    assert frames["u1"][-1] == {"type": "ai_cancelled", "request_id": "r1"}
+    assert not await manager.cancel("u1", "r1")
+
+async def test_replaced_socket_is_no_longer_current():
+    manager = WebSocketManager()
+    old, new = FakeSocket(), FakeSocket()
+    await manager.connect(old, "u1")
+    assert manager.is_current("u1", old)
+    await manager.connect(new, "u1")
+    assert not manager.is_current("u1", old) and manager.is_current("u1", new)
+    # The old socket's loop ending must leave the new connection alone
+    await manager.disconnect("u1", old)
+    assert manager.is_current("u1", new)
+    await manager.disconnect("u1")
+    await settle()
@@ -0,0 +1,161 @@
+from types import SimpleNamespace
+
+from app.core.config import settings
+
+async def collect(events):
+    return [event async for event in events]
+
+async def test_tokens_then_done_with_usage(ai):
+    events = await collect(ai.stream_response("Explain gravity", temperature=0.2))
+    tokens, done = events[:-1], events[-1]
+    assert tokens and all(event["type"] == "token" for event in tokens)
+    assert done["type"] == "done" and done["provider"] == "simulated" and done["cached"] is False
+    usage = done["usage"]
+    assert usage["chunks"] == len(tokens)
+    assert usage["total_tokens"] == usage["prompt_tokens"] + usage["completion_tokens"] > 0
+    assert done["first_token_ms"] <= done["elapsed_ms"]
+
+async def test_repeat_stream_is_served_from_cache(ai):
+    first = await collect(ai.stream_response("Explain gravity", temperature=0.2))
+    second = await collect(ai.stream_response("Explain gravity", temperature=0.2))
+    assert [event["type"] for event in second] == ["token", "done"]
+    assert second[0]["content"] == "".join(event["content"] for event in first[:-1])
+    assert second[1]["cached"] is True and second[1]["usage"] == first[-1]["usage"]
+
+async def test_failing_provider_before_first_token_falls_back(ai, monkeypatch):
+    ai.fallback_providers = ["openai"]
+    ai.openai_client = FakeOpenAI(["Hello", " world"], usage={"prompt_tokens": 7, "completion_tokens": 2, "total_tokens": 9})
+    monkeypatch.setattr(settings, "AI_SIM_ERROR_RATE", 1.0)
+    events = await collect(ai.stream_response("Say hello", use_cache=False))
+    assert [event["content"] for event in events[:-1]] == ["Hello", " world"]
+    assert events[-1]["provider"] == "openai"
+
+async def test_no_provider_yields_error(ai):
+    ai.simulated_client = None
+    events = await collect(ai.stream_response("Say hello", use_cache=False))
+    assert events == [{
+        "type": "error",
+        "error": "All AI providers are unavailable",
+        "content": "I'm sorry, but I'm currently unable to process your request. Please try again later."
+    }]
+
+async def test_closing_the_stream_stops_the_provider(ai):
+    events = ai.stream_response("Explain gravity", use_cache=False)
+    assert (await events.__anext__())["type"] == "token"
+    await events.aclose()
+    assert ai.router.breaker_for("simulated").state == "closed"
+
+class FakeOpenAIStream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.response = SimpleNamespace(aclose=self._close)
+        self.closed = False
+
+    async def _close(self):
+        self.closed = True
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            yield chunk
+
+class FakeOpenAI:
+    """Answers chat completions with a fixed stream, recording the request"""
+
+    def __init__(self, texts, usage=None):
+        self.texts = texts
+        self.usage = usage
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **request):
+        self.requests.append(request)
+        chunks = [
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))], usage=None)
+            for text in self.texts
+        ]
+        if self.usage is not None and request.get("extra_body", {}).get("stream_options", {}).get("include_usage"):
+            chunks.append(SimpleNamespace(choices=[], usage=self.usage))
+        return FakeOpenAIStream(chunks)
+
+async def test_openai_stream_asks_for_and_reports_usage(ai):
+    ai.openai_client = FakeOpenAI(["a", "b"], usage={"prompt_tokens": 12, "completion_tokens": 2, "total_tokens": 14})
+    usage = {}
+    texts = await collect(ai._stream_openai_response("prompt", None, None, None, usage))
+    assert texts == ["a", "b"]
+    assert usage == {"prompt_tokens": 12, "completion_tokens": 2, "total_tokens": 14}
+
+class FakeCohereStream:
+    generations = SimpleNamespace(meta={"billed_units": {"input_tokens": 30, "output_tokens": 5}})
+
+    def __init__(self):
+        self.response = SimpleNamespace(close=self._close)
+        self.closed = False
+
+    def _close(self):
+        self.closed = True
+
+    async def __aiter__(self):
+        yield SimpleNamespace(is_finished=False, text="Hi")
+        yield SimpleNamespace(is_finished=False, text=" there")
+        yield SimpleNamespace(is_finished=True, text="")
+
+def fake_cohere(ai):
+    stream = FakeCohereStream()
+
+    async def generate(**request):
+        return stream
+
+    ai.cohere_client = SimpleNamespace(generate=generate)
+    return stream
+
+async def test_cohere_stream_reports_billed_units(ai):
+    stream = fake_cohere(ai)
+    usage = {}
+    assert await collect(ai._stream_cohere_response("prompt", None, None, None, usage)) == ["Hi", " there"]
+    assert usage == {"prompt_tokens": 30, "completion_tokens": 5, "total_tokens": 35}
+    assert stream.closed
+
+async def test_abandoned_cohere_stream_is_closed(ai):
+    stream = fake_cohere(ai)
+    tokens = ai._stream_cohere_response("prompt", None, None, None, {})
+    assert await tokens.__anext__() == "Hi"
+    await tokens.aclose()
+    assert stream.closed
+
+async def test_abandoned_google_stream_is_closed(ai):
+    closed = []
+
+    async def rpc():
+        try:
+            for text in ["Hi", " there"]:
+                yield SimpleNamespace(text=text)
+        finally:
+            closed.append(True)
+
+    class Response:
+        def __init__(self):
+            self._iterator = rpc()
+
+        def __aiter__(self):
+            return self._iterator
+
+    async def generate_content_async(prompt, **options):
+        return Response()
+
+    ai.sdks["google"] = SimpleNamespace(types=SimpleNamespace(GenerationConfig=dict))
+    ai.google_genai = SimpleNamespace(generate_content_async=generate_content_async)
+    tokens = ai._stream_google_response("prompt", None, None, None, {})
+    assert await tokens.__anext__() == "Hi"
+    await tokens.aclose()
+    assert closed == [True]
+
+async def test_unreported_usage_is_estimated(ai):
+    ai.openai_client = FakeOpenAI(["some words back"])
+    usage = {}
+    await collect(ai._stream_openai_response("a prompt of a few words", None, None, None, usage))
+    assert usage["estimated"] is True
+    assert usage["prompt_tokens"] > 0 and usage["completion_tokens"] > 0
+    assert usage["total_tokens"] == usage["prompt_tokens"] + usage["completion_tokens"]
@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+import app.core.audio_store as audio_store_module
+from app.core.audio_store import AudioStore, parse_byte_range
+
+def clip_id(n: int) -> str:
+    return AudioStore.audio_id(f"text {n}", "voice", "model")
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=990-5000", (990, 999)),
+])
+def test_parse_byte_range(header, expected):
+    assert parse_byte_range(header, 1000) == expected
+
+@pytest.mark.parametrize("header", ["bytes=", "bytes=1000-", "bytes=5-2", "items=0-1", "bytes=0-1,4-5"])
+def test_unsatisfiable_ranges(header):
+    with pytest.raises(ValueError):
+        parse_byte_range(header, 1000)
+
+def test_audio_id_depends_on_text_voice_and_model():
+    base = AudioStore.audio_id("hello", "v1", "m1")
+    assert base == AudioStore.audio_id("hello", "v1", "m1")
+    assert len({base, AudioStore.audio_id("hello", "v2", "m1"), AudioStore.audio_id("hello", "v1", "m2")}) == 3
+
+def test_invalid_ids_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        AudioStore(str(tmp_path)).path_for("../../etc/passwd")
+
+async def test_put_then_get(tmp_path):
+    store = AudioStore(str(tmp_path), max_bytes=1000)
+    assert await store.get(clip_id(1)) is None
+    path = await store.put(clip_id(1), b"mp3 bytes")
+    assert await store.get(clip_id(1)) == path
+    assert path.read_bytes() == b"mp3 bytes"
+    assert store.get_stats() == {"clips": 1, "bytes": 9, "max_bytes": 1000, "hits": 1, "misses": 1, "evictions": 0}
+
+async def test_least_recently_used_clips_are_evicted(tmp_path):
+    store = AudioStore(str(tmp_path), max_bytes=250)
+    for n in range(3):
+        await store.put(clip_id(n), b"x" * 100)
+    assert store.evictions == 1
+    assert await store.get(clip_id(0)) is None
+    await store.get(clip_id(1))
+    await store.put(clip_id(3), b"x" * 100)
+    assert await store.get(clip_id(2)) is None
+    assert await store.get(clip_id(1)) is not None
+
+async def test_index_is_rebuilt_from_disk_by_recency(tmp_path):
+    store = AudioStore(str(tmp_path), max_bytes=1000)
+    for n in range(3):
+        path = await store.put(clip_id(n), b"x" * 100)
+        os.utime(path, (n, n))
+    restarted = AudioStore(str(tmp_path), max_bytes=250)
+    assert await restarted.get(clip_id(2)) is not None
+    assert await restarted.get(clip_id(0)) is None
+    assert restarted.get_stats()["clips"] == 2
+
+async def test_clip_evicted_by_another_worker_is_a_miss(tmp_path):
+    store = AudioStore(str(tmp_path), max_bytes=1000)
+    path = await store.put(clip_id(1), b"x" * 100)
+    path.unlink()
+    assert await store.get(clip_id(1)) is None
+    assert store.get_stats()["bytes"] == 0
+
+async def test_eviction_racing_a_lookup_is_a_miss(tmp_path, monkeypatch):
+    store = AudioStore(str(tmp_path), max_bytes=1000)
+    path = await store.put(clip_id(1), b"x" * 100)
+    utime = os.utime
+
+    def evicted_meanwhile(target, *args):
+        path.unlink()
+        utime(target, *args)
+
+    monkeypatch.setattr(audio_store_module.os, "utime", evicted_meanwhile)
+    assert await store.get(clip_id(1)) is None
+    assert store.get_stats()["clips"] == 0
@@ -0,0 +1,67 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.core.blocking_executor import BlockingCallTimeout, BlockingExecutor, ExecutorSaturatedError
+from app.core.config import settings
+
+@pytest.fixture
+def executor(monkeypatch):
+    monkeypatch.setattr(settings, "BLOCKING_EXECUTOR_WORKERS", {"default": 2})
+    monkeypatch.setattr(settings, "BLOCKING_EXECUTOR_MAX_QUEUE", {"default": 1})
+    monkeypatch.setattr(settings, "BLOCKING_CALL_TIMEOUTS", {"default": 5.0})
+    executor = BlockingExecutor()
+    yield executor
+    executor.shutdown()
+
+async def test_runs_off_the_event_loop(executor):
+    loop_thread = threading.get_ident()
+    thread = await executor.run("tts", threading.get_ident)
+    assert thread != loop_thread
+    assert executor.get_stats()["tts"]["completed"] == 1
+
+async def test_loop_keeps_running_during_a_blocking_call(executor):
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.005)
+
+    task = asyncio.create_task(ticker())
+    await executor.run("tts", time.sleep, 0.1)
+    task.cancel()
+    assert ticks >= 5
+
+async def test_arguments_and_exceptions_pass_through(executor):
+    assert await executor.run("tts", lambda a, b=0: a + b, 2, b=3) == 5
+    with pytest.raises(ZeroDivisionError):
+        await executor.run("tts", lambda: 1 / 0)
+    assert executor.get_stats()["tts"]["failed"] == 1
+
+async def test_calls_beyond_workers_and_queue_are_rejected(executor):
+    release = threading.Event()
+    calls = [asyncio.ensure_future(executor.run("stt", release.wait)) for _ in range(3)]
+    await asyncio.sleep(0.05)
+    with pytest.raises(ExecutorSaturatedError):
+        await executor.run("stt", release.wait)
+    stats = executor.get_stats()["stt"]
+    assert (stats["running"], stats["queued"], stats["rejected"]) == (2, 1, 1)
+    release.set()
+    await asyncio.gather(*calls)
+
+async def test_timeout_is_reported(executor):
+    with pytest.raises(BlockingCallTimeout):
+        await executor.run("stt", time.sleep, 0.2, timeout=0.01)
+    assert executor.get_stats()["stt"]["timeouts"] == 1
+
+async def test_services_have_separate_pools(executor):
+    release = threading.Event()
+    busy = [asyncio.ensure_future(executor.run("stt", release.wait)) for _ in range(3)]
+    await asyncio.sleep(0.05)
+    assert await executor.run("tts", lambda: "free") == "free"
+    release.set()
+    await asyncio.gather(*busy)
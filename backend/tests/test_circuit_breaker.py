@@ -0,0 +1,108 @@
+import asyncio
+import json
+
+import pytest
+
+from app.core.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from app.core.config import settings
+
+@pytest.fixture
+def breaker_settings(monkeypatch):
+    monkeypatch.setattr(settings, "AI_BREAKER_FAILURE_THRESHOLD", 3)
+    monkeypatch.setattr(settings, "AI_BREAKER_RECOVERY_TIMEOUT", 0.05)
+    monkeypatch.setattr(settings, "AI_BREAKER_HALF_OPEN_PROBES", 1)
+    monkeypatch.setattr(settings, "AI_BREAKER_SYNC_INTERVAL", 0.0)
+
+async def open_breaker(breaker):
+    for _ in range(settings.AI_BREAKER_FAILURE_THRESHOLD):
+        await breaker.record_failure(RuntimeError("boom"))
+    assert breaker.state == OPEN
+
+async def test_opens_after_consecutive_failures(redis, breaker_settings):
+    breaker = CircuitBreaker("openai")
+    await breaker.record_failure()
+    await breaker.record_success()
+    await breaker.record_failure()
+    await breaker.record_failure()
+    assert breaker.state == CLOSED
+    await breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not await breaker.allow_request()
+    assert not breaker.available()
+
+async def test_probe_success_closes(redis, breaker_settings):
+    breaker = CircuitBreaker("openai")
+    await open_breaker(breaker)
+    await asyncio.sleep(0.06)
+    assert breaker.available()
+    assert await breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+    assert not await breaker.allow_request()
+    await breaker.record_success()
+    assert breaker.state == CLOSED
+    assert await breaker.allow_request()
+
+async def test_probe_failure_reopens_with_fresh_probes(redis, breaker_settings):
+    breaker = CircuitBreaker("openai")
+    await open_breaker(breaker)
+    await asyncio.sleep(0.06)
+    assert await breaker.allow_request()
+    await breaker.record_failure(RuntimeError("still down"))
+    assert breaker.state == OPEN
+    assert not await breaker.allow_request()
+    await asyncio.sleep(0.06)
+    assert await breaker.allow_request()
+
+async def test_probe_limit_holds_across_workers(redis, breaker_settings, monkeypatch):
+    monkeypatch.setattr(settings, "AI_BREAKER_HALF_OPEN_PROBES", 2)
+    workers = [CircuitBreaker("openai") for _ in range(8)]
+    await open_breaker(workers[0])
+    for worker in workers[1:]:
+        await worker.sync(force=True)
+        assert worker.state == OPEN
+    await asyncio.sleep(0.06)
+
+    allowed = await asyncio.gather(*(worker.allow_request() for worker in workers))
+    assert sum(allowed) == 2
+    assert all(worker.state == HALF_OPEN for worker in workers)
+    transitions = [json.loads(entry) for entry in await redis.lrange(workers[0].transitions_key, 0, -1)]
+    assert [(t["from"], t["to"]) for t in transitions].count((OPEN, HALF_OPEN)) == 1
+
+async def test_late_worker_follows_a_finished_probe(redis, breaker_settings):
+    fast, slow = CircuitBreaker("openai"), CircuitBreaker("openai")
+    await open_breaker(fast)
+    await slow.sync(force=True)
+    await asyncio.sleep(0.06)
+    assert await fast.allow_request()
+    await fast.record_failure(RuntimeError("still down"))
+
+    # slow still remembers the first opening; its timeout has passed but the breaker reopened since
+    slow.state, slow._synced_at = OPEN, float("inf")
+    await slow._transition(HALF_OPEN, "recovery timeout elapsed")
+    assert slow.state == OPEN
+    assert slow.opened_at == fast.opened_at
+    assert not await slow.allow_request()
+
+async def test_cancelled_probe_is_given_back(redis, breaker_settings):
+    breaker = CircuitBreaker("openai")
+    await open_breaker(breaker)
+    await asyncio.sleep(0.06)
+    assert await breaker.allow_request()
+    await breaker.release_probe()
+    assert await breaker.allow_request()
+
+async def test_runs_on_local_state_without_redis(breaker_settings):
+    breaker = CircuitBreaker("offline")
+    await open_breaker(breaker)
+    assert not await breaker.allow_request()
+    await asyncio.sleep(0.06)
+    assert await breaker.allow_request()
+    await breaker.record_success()
+    assert breaker.state == CLOSED
+
+async def test_describe_lists_shared_transitions(redis, breaker_settings):
+    breaker = CircuitBreaker("openai")
+    await open_breaker(breaker)
+    description = await CircuitBreaker("openai").describe()
+    assert description["state"] == OPEN
+    assert description["transitions"][0]["to"] == OPEN
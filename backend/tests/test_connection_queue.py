@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.core.websocket_manager import COALESCE, DISCONNECT, DROP_OLDEST, coalesce_key
+from tests.fakes import FakeSocket, settle
+
+class GatedSocket(FakeSocket):
+    """A peer that reads only while its gate is open"""
+
+    def __init__(self):
+        super().__init__()
+        self.gate = asyncio.Event()
+
+    async def send_text(self, text: str):
+        await self.gate.wait()
+        self.sent.append(text)
+
+@pytest.fixture
+async def slow(manager, monkeypatch):
+    monkeypatch.setattr(settings, "WS_SEND_QUEUE_SIZE", 3)
+    socket = GatedSocket()
+    await manager.connect(socket, "ann")
+    await manager.send_personal_message("ann", {"type": "chat_message", "data": {"content": "in flight"}})
+    await settle()
+    return socket
+
+def chat(n):
+    return {"type": "chat_message", "data": {"content": str(n)}}
+
+def typing(user, room="room1"):
+    return {"type": "typing", "user_id": user, "room_id": room}
+
+def contents(socket):
+    return [message.get("data", {}).get("content") or message["type"] + ":" + message["user_id"] for message in socket.messages()]
+
+async def drain(socket):
+    socket.gate.set()
+    await settle(30)
+
+def test_presence_events_about_the_same_user_share_a_key():
+    assert coalesce_key({"type": "user_joined", "user_id": "a", "room_id": "r"}) == coalesce_key(
+        {"type": "user_left", "user_id": "a", "room_id": "r"}
+    )
+    assert coalesce_key(typing("a")) != coalesce_key(typing("b"))
+    assert coalesce_key(chat(1)) is None
+
+async def test_frames_are_sent_in_order(manager):
+    socket = FakeSocket()
+    await manager.connect(socket, "ann")
+    for n in range(5):
+        await manager.send_personal_message("ann", chat(n))
+    await settle(30)
+    assert [message["data"]["content"] for message in socket.messages()] == ["0", "1", "2", "3", "4"]
+    assert manager.active_connections["ann"].stats["sent"] == 5
+
+async def test_drop_oldest(manager, slow, monkeypatch):
+    monkeypatch.setattr(settings, "WS_OVERFLOW_POLICY", DROP_OLDEST)
+    for n in range(5):
+        await manager.send_personal_message("ann", chat(n))
+    assert manager.get_stats()["max_queue_depth"] == 3
+    await drain(slow)
+    assert contents(slow) == ["in flight", "2", "3", "4"]
+    assert manager.stats["dropped"] == 2
+
+async def test_coalesce_replaces_a_superseded_presence_event(manager, slow, monkeypatch):
+    monkeypatch.setattr(settings, "WS_OVERFLOW_POLICY", COALESCE)
+    await manager.send_personal_message("ann", typing("bob"))
+    await manager.send_personal_message("ann", chat(1))
+    await manager.send_personal_message("ann", typing("cy"))
+    await manager.send_personal_message("ann", {"type": "typing_stopped", "user_id": "bob", "room_id": "room1"})
+    await drain(slow)
+    assert contents(slow) == ["in flight", "1", "typing:cy", "typing_stopped:bob"]
+    assert manager.stats["coalesced"] == 1 and manager.stats["dropped"] == 0
+
+async def test_coalesce_drops_presence_before_chat(manager, slow, monkeypatch):
+    monkeypatch.setattr(settings, "WS_OVERFLOW_POLICY", COALESCE)
+    await manager.send_personal_message("ann", chat(1))
+    await manager.send_personal_message("ann", typing("bob"))
+    await manager.send_personal_message("ann", chat(2))
+    await manager.send_personal_message("ann", chat(3))
+    await manager.send_personal_message("ann", chat(4))
+    await drain(slow)
+    assert contents(slow) == ["in flight", "2", "3", "4"]
+    assert manager.stats["dropped"] == 2
+
+async def test_disconnect_policy_closes_a_slow_consumer(manager, slow, monkeypatch):
+    monkeypatch.setattr(settings, "WS_OVERFLOW_POLICY", DISCONNECT)
+    await manager.join_room("ann", "room1")
+    for n in range(4):
+        await manager.send_personal_message("ann", chat(n))
+    await settle(10)
+    assert "ann" not in manager.active_connections
+    assert "room1" not in manager.room_connections
+    assert slow.closed == (settings.WS_SLOW_CONSUMER_CLOSE_CODE, "Slow consumer")
+    assert manager.stats["slow_disconnects"] == 1
+
+async def test_stopped_connection_accepts_nothing(manager):
+    await manager.connect(FakeSocket(), "ann")
+    connection = manager.active_connections["ann"]
+    connection.stop()
+    assert not connection.enqueue("frame")
+    assert len(connection.queue) == 0
@@ -0,0 +1,58 @@
+import pytest
+
+from app.core.config import settings
+from app.core.content_retriever import ContentRetriever, chunk_text
+
+CLASS = {
+    "id": "bio101",
+    "content": [
+        {"id": "c1", "title": "Photosynthesis", "text": "Plants convert sunlight into chemical energy. Chlorophyll absorbs light in the leaves."},
+        {"id": "c2", "title": "Cell division", "text": "Mitosis splits one cell into two identical daughter cells."},
+    ]
+}
+
+@pytest.fixture
+def retriever(embeddings):
+    return ContentRetriever(embeddings)
+
+def test_chunks_keep_whole_sentences_and_overlap():
+    text = " ".join(f"Sentence {n} has five words." for n in range(10))
+    chunks = chunk_text(text, max_words=10, overlap=5)
+    assert chunks[0] == "Sentence 0 has five words. Sentence 1 has five words."
+    # The last sentence of each chunk opens the next
+    assert chunks[1].startswith("Sentence 1 has five words.")
+    assert all(len(chunk.split()) <= 10 for chunk in chunks)
+    assert chunk_text("", 10, 5) == []
+
+def test_a_sentence_longer_than_a_chunk_is_kept_whole():
+    assert chunk_text("one two three four five. six.", max_words=3, overlap=0) == ["one two three four five.", "six."]
+
+async def test_retrieves_the_relevant_passage_within_a_class(retriever):
+    assert await retriever.index_class(CLASS) == 2
+    await retriever.index_class({"id": "chem", "content": [
+        {"id": "c1", "title": "Chlorophyll", "text": "Chlorophyll absorbs light in the leaves."}
+    ]})
+    passages = await retriever.retrieve("How do leaves absorb light?", class_id="bio101")
+    assert passages[0]["content_id"] == "c1" and passages[0]["class_id"] == "bio101"
+    assert all(passage["class_id"] == "bio101" for passage in passages)
+    assert retriever.get_stats()["hits"] == 1
+
+async def test_unrelated_queries_get_no_context(retriever):
+    await retriever.index_class(CLASS)
+    assert await retriever.build_context("quantum chromodynamics gluons", "bio101") is None
+
+async def test_context_lists_the_passages(retriever, monkeypatch):
+    await retriever.index_class(CLASS)
+    context = await retriever.build_context("chlorophyll light leaves", "bio101")
+    assert context.startswith("Use the following course material")
+    assert "[1] Photosynthesis\nPlants convert sunlight" in context
+    monkeypatch.setattr(settings, "RETRIEVAL_ENABLED", False)
+    assert await retriever.build_context("chlorophyll light leaves", "bio101") is None
+
+async def test_removed_content_is_not_retrieved(retriever):
+    await retriever.index_class(CLASS)
+    assert retriever.remove_content("bio101", "c1") == 1
+    passages = await retriever.retrieve("chlorophyll light leaves", "bio101")
+    assert all(passage["content_id"] != "c1" for passage in passages)
+    assert retriever.remove_class("bio101") == 1
+    assert await retriever.retrieve("mitosis cells", "bio101") == []
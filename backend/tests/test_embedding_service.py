@@ -0,0 +1,104 @@
+import asyncio
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.core.embedding_service import DIGEST_BYTES, EmbeddingService, EmbeddingStore, hash_embed
+
+def cosine(a, b):
+    return float(a @ b / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+def test_hash_embedding_ignores_case_and_stop_words():
+    vectors = hash_embed(["What is the Krebs cycle?", "krebs cycle", "plate tectonics"], 256)
+    assert np.allclose(vectors[0], vectors[1])
+    assert cosine(vectors[0], vectors[2]) < 0.5
+
+async def test_concurrent_requests_share_one_provider_call(embeddings):
+    results = await asyncio.gather(
+        embeddings.embed(["alpha", "beta"]),
+        embeddings.embed(["beta", "gamma"]),
+        embeddings.embed(["alpha"])
+    )
+    assert np.allclose(results[0][0], results[2][0])
+    assert np.allclose(results[0][1], results[1][0])
+    stats = embeddings.get_stats()
+    assert (stats["provider_calls"], stats["computed"], stats["coalesced"]) == (1, 3, 2)
+
+async def test_full_batch_is_sent_without_waiting(embeddings, monkeypatch):
+    monkeypatch.setattr(settings, "EMBEDDING_BATCH_MAX_SIZE", 2)
+    monkeypatch.setattr(settings, "EMBEDDING_BATCH_WINDOW_MS", 10000)
+    await asyncio.wait_for(embeddings.embed(["alpha", "beta"]), 1)
+    assert embeddings.stats["batches"] == 1
+
+async def test_persisted_vectors_are_reused_by_a_new_process(embeddings):
+    first = await embeddings.embed(["photosynthesis", "mitosis"])
+    restarted = EmbeddingService()
+    second = await restarted.embed(["mitosis", "photosynthesis"])
+    assert np.allclose(first[::-1], second)
+    assert restarted.stats["provider_calls"] == 0 and restarted.stats["store_hits"] == 2
+
+async def test_queries_are_kept_in_memory_only(embeddings, monkeypatch):
+    monkeypatch.setattr(settings, "EMBEDDING_QUERY_CACHE_SIZE", 2)
+    await embeddings.embed(["one", "two", "three"], persist=False)
+    assert len(embeddings.store.rows) == 0
+    assert len(embeddings.queries) == 2
+    await embeddings.embed(["three"], persist=False)
+    assert embeddings.stats["query_cache_hits"] == 1
+    # A text asked for both ways is persisted
+    await asyncio.gather(embeddings.embed(["four"], persist=False), embeddings.embed(["four"]))
+    assert len(embeddings.store.rows) == 1
+
+async def test_provider_failure_reaches_every_waiter(embeddings, monkeypatch):
+    async def down(texts):
+        raise ConnectionError("provider down")
+
+    monkeypatch.setattr(embeddings, "_call_provider", down)
+    results = await asyncio.gather(
+        embeddings.embed(["alpha"]), embeddings.embed(["alpha", "beta"]), return_exceptions=True
+    )
+    assert all(isinstance(result, ConnectionError) for result in results)
+    assert embeddings.stats["errors"] == 1 and embeddings.pending == {}
+
+async def test_openai_vectors_are_matched_back_by_index(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "EMBEDDING_PROVIDER", "openai")
+    monkeypatch.setattr(settings, "EMBEDDING_OPENAI_DIM", 2)
+    monkeypatch.setattr(settings, "EMBEDDING_CACHE_DIR", str(tmp_path))
+    service = EmbeddingService()
+    with pytest.raises(RuntimeError):
+        await service.embed(["a"])
+
+    async def create(model, input):
+        data = [SimpleNamespace(index=index, embedding=[len(text), index]) for index, text in enumerate(input)]
+        return SimpleNamespace(data=data[::-1])
+
+    service.openai_client = SimpleNamespace(embeddings=SimpleNamespace(create=create))
+    vectors = await service.embed(["a", "bbb"])
+    assert vectors.tolist() == [[1, 0], [3, 1]]
+
+def test_store_ignores_rows_a_crash_left_without_an_id(tmp_path):
+    store = EmbeddingStore(str(tmp_path), "test", 4)
+    store.load()
+    store.append([b"a" * DIGEST_BYTES, b"b" * DIGEST_BYTES], np.ones((2, 4), dtype=np.float32))
+    # A vector written without its id, as if the process died between the two writes
+    with open(store.vectors_path, "ab") as out:
+        out.write(np.zeros(4, dtype=np.float32).tobytes())
+
+    reopened = EmbeddingStore(str(tmp_path), "test", 4)
+    reopened.load()
+    assert len(reopened.rows) == 2
+    reopened.append([b"c" * DIGEST_BYTES], np.full((1, 4), 3, dtype=np.float32))
+    assert os.path.getsize(reopened.vectors_path) == 3 * 4 * 4
+    assert reopened.get([b"c" * DIGEST_BYTES])[b"c" * DIGEST_BYTES].tolist() == [3, 3, 3, 3]
+
+def test_stores_share_rows_without_duplicates(tmp_path):
+    first, second = EmbeddingStore(str(tmp_path), "test", 2), EmbeddingStore(str(tmp_path), "test", 2)
+    first.load()
+    second.load()
+    first.append([b"a" * DIGEST_BYTES], np.ones((1, 2), dtype=np.float32))
+    second.append([b"a" * DIGEST_BYTES, b"b" * DIGEST_BYTES], np.full((2, 2), 2, dtype=np.float32))
+    first.refresh()
+    assert first.get([b"a" * DIGEST_BYTES])[b"a" * DIGEST_BYTES].tolist() == [1, 1]
+    assert first.get_stats()["rows"] == second.get_stats()["rows"] == 2
@@ -0,0 +1,49 @@
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.core.ws_protocol import JSON_PROTOCOL
+from tests.fakes import FakeSocket, settle
+
+@pytest.fixture
+async def client(manager):
+    socket = FakeSocket(JSON_PROTOCOL)
+    await manager.connect(socket, "ann")
+    return manager.active_connections["ann"], socket
+
+def quiet_for(connection, seconds):
+    connection.last_seen = time.monotonic() - seconds
+
+async def test_quiet_client_is_pinged_once(manager, client):
+    connection, socket = client
+    quiet_for(connection, settings.WS_HEARTBEAT_INTERVAL + 1)
+    manager._check_liveness(connection)
+    manager._check_liveness(connection)
+    await settle(10)
+    assert [message["type"] for message in socket.messages()] == ["ping"]
+    assert manager.stats["pings"] == 1 and socket.closed is None
+
+async def test_client_silent_past_the_idle_timeout_is_evicted(manager, client):
+    connection, socket = client
+    quiet_for(connection, settings.WS_IDLE_TIMEOUT)
+    manager._check_liveness(connection)
+    await settle(10)
+    assert socket.closed[0] == 1001
+    assert "ann" not in manager.active_connections
+    assert manager.stats["idle_evictions"] == 1
+
+async def test_any_frame_counts_as_liveness(manager, client):
+    connection, socket = client
+    quiet_for(connection, settings.WS_HEARTBEAT_INTERVAL + 1)
+    manager._check_liveness(connection)
+    manager.touch("ann")
+    assert not connection.pinged
+    manager._check_liveness(connection)
+    await settle(10)
+    assert socket.closed is None and len(socket.messages()) == 1
+
+async def test_only_subprotocol_clients_get_heartbeat_timers(manager):
+    await manager.connect(FakeSocket(), "legacy")
+    await manager.connect(FakeSocket(JSON_PROTOCOL), "modern")
+    assert len(manager.heartbeats) == 1
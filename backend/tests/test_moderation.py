@@ -0,0 +1,96 @@
+import pytest
+
+from app.core.config import settings
+from app.core.moderation import ALLOW, DENY, ESCALATE, AhoCorasick, LocalModerator, normalize_text
+
+@pytest.fixture
+def moderator():
+    return LocalModerator()
+
+@pytest.mark.parametrize("text, folded", [
+    ("F.U.C.K", "fuck"),
+    ("sh1t", "shit"),
+    ("Ünïcödé", "unicode"),
+    ("ѕhіt", "shit"),
+    ("heeelllo   there", "helo there"),
+])
+def test_normalize_text(text, folded):
+    assert normalize_text(text) == folded
+
+def test_aho_corasick_finds_overlapping_patterns():
+    matcher = AhoCorasick(["he", "she", "hers"])
+    assert sorted(pattern for _, pattern in matcher.iter_matches("ushers")) == ["he", "hers", "she"]
+
+@pytest.mark.parametrize("text", [
+    "Can someone explain question 3?",
+    "The assessment is on Friday",
+    "Scunthorpe is a town",
+    "I passed the class!",
+    "The drugstore sells sextants",
+    "Sextus Empiricus was a skeptic",
+])
+def test_clean_messages_are_allowed(moderator, text):
+    assert moderator.evaluate(text)["verdict"] == ALLOW
+
+@pytest.mark.parametrize("text", [
+    "shit",
+    "this is fucking hard",
+    "you absolute b1tch",
+    "f u c k this",
+    "fuuuuck",
+    "ѕhit",
+    "kys",
+    "just kill yourself",
+])
+def test_abuse_is_denied(moderator, text):
+    assert moderator.evaluate(text)["verdict"] == DENY
+
+@pytest.mark.parametrize("text, term", [
+    ("This flame retardant is used in labs", "retard*"),
+    ("shitake mushrooms are tasty", "shit*"),
+    ("Guns, Germs and Steel is on the reading list", "guns"),
+])
+def test_stems_are_escalated_not_denied(moderator, text, term):
+    decision = moderator.evaluate(text)
+    assert decision == {"verdict": ESCALATE, "matches": [term]}
+
+@pytest.mark.parametrize("text, term", [
+    ("Kill the process with SIGTERM", "kill"),
+    ("The drug trial was double blind", "drug"),
+])
+def test_ambiguous_words_are_escalated(moderator, text, term):
+    assert moderator.evaluate(text) == {"verdict": ESCALATE, "matches": [term]}
+
+def test_links_are_escalated(moderator):
+    assert moderator.evaluate("notes at https://example.com")["verdict"] == ESCALATE
+
+def test_spaced_out_deny_terms_inside_runs_are_escalated(moderator):
+    assert moderator.evaluate("a s h i t b")["verdict"] == ESCALATE
+
+def test_repeats_are_served_from_cache(moderator):
+    first = moderator.evaluate("you are stupid")
+    assert moderator.evaluate("you are stupid") is first
+    assert moderator.evaluate("You  are  STUPID") == first
+    assert moderator.get_stats()["cache_hits"] == 2
+
+def test_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(settings, "MODERATION_CACHE_SIZE", 10)
+    moderator = LocalModerator()
+    for index in range(50):
+        moderator.evaluate(f"message {index}")
+    assert moderator.get_stats()["cache_size"] == 10
+
+def test_extra_terms_from_settings(monkeypatch):
+    monkeypatch.setattr(settings, "MODERATION_EXTRA_DENY_TERMS", ["frobnicate"])
+    monkeypatch.setattr(settings, "MODERATION_EXTRA_ESCALATE_TERMS", ["cheat*"])
+    moderator = LocalModerator()
+    assert moderator.evaluate("frobnicate")["verdict"] == DENY
+    assert moderator.evaluate("cheating on the quiz")["verdict"] == ESCALATE
+
+@pytest.mark.parametrize("fail_closed", [True, False])
+def test_unreviewed_escalations_follow_fail_closed(moderator, monkeypatch, fail_closed):
+    monkeypatch.setattr(settings, "MODERATION_FAIL_CLOSED", fail_closed)
+    decision = moderator.evaluate("you are stupid")
+    assert moderator.to_result("you are stupid", decision)["is_appropriate"] is not fail_closed
+    denied = moderator.evaluate("shit")
+    assert moderator.to_result("shit", denied)["is_appropriate"] is False
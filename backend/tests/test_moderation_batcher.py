@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+import pytest
+
+from app.core.config import settings
+from app.core.moderation_batcher import ModerationBatcher
+
+class FakeAI:
+    """Answers batch prompts with the given verdicts, or single prompts one by one"""
+
+    def __init__(self, batch_content=None, success=True):
+        self.batch_content = batch_content
+        self.success = success
+        self.batch_prompts = []
+        self.single = []
+
+    async def generate_response(self, prompt, **options):
+        self.batch_prompts.append(prompt)
+        return {"success": self.success, "content": self.batch_content}
+
+    async def _moderate_with_llm(self, content):
+        self.single.append(content)
+        return {"is_appropriate": True, "reason": "single", "severity": "low"}
+
+@pytest.fixture
+def window(monkeypatch):
+    monkeypatch.setattr(settings, "MODERATION_BATCH_WINDOW_MS", 10)
+    monkeypatch.setattr(settings, "MODERATION_BATCH_MAX_SIZE", 20)
+
+def verdicts(*appropriate):
+    return json.dumps([
+        {"id": index, "is_appropriate": ok, "reason": "" if ok else "rude", "severity": "low" if ok else "high"}
+        for index, ok in enumerate(appropriate)
+    ])
+
+async def test_messages_in_one_window_share_a_prompt(window):
+    ai = FakeAI(verdicts(True, False, True))
+    batcher = ModerationBatcher(ai)
+    results = await asyncio.gather(*(batcher.submit(text) for text in ["a", "b", "c"]))
+    assert [result["is_appropriate"] for result in results] == [True, False, True]
+    assert len(ai.batch_prompts) == 1
+    assert '[{"id": 0, "content": "a"}' in ai.batch_prompts[0]
+    assert batcher.get_stats()["avg_batch_size"] == 3.0
+
+async def test_single_message_uses_the_single_prompt(window):
+    ai = FakeAI()
+    batcher = ModerationBatcher(ai)
+    assert (await batcher.submit("only"))["reason"] == "single"
+    assert ai.single == ["only"] and not ai.batch_prompts
+
+async def test_full_batch_is_sent_without_waiting(window, monkeypatch):
+    monkeypatch.setattr(settings, "MODERATION_BATCH_WINDOW_MS", 10000)
+    monkeypatch.setattr(settings, "MODERATION_BATCH_MAX_SIZE", 2)
+    batcher = ModerationBatcher(FakeAI(verdicts(True, True)))
+    results = await asyncio.wait_for(asyncio.gather(batcher.submit("a"), batcher.submit("b")), 1)
+    assert len(results) == 2
+
+async def test_missing_and_malformed_verdicts_fall_back_per_message(window):
+    content = json.dumps([{"id": 0, "is_appropriate": False}, {"id": 1, "is_appropriate": "maybe"}, {"id": 9, "is_appropriate": True}])
+    ai = FakeAI(content)
+    batcher = ModerationBatcher(ai)
+    results = await asyncio.gather(*(batcher.submit(text) for text in ["a", "b", "c"]))
+    assert results[0]["is_appropriate"] is False
+    assert ai.single == ["b", "c"]
+    assert batcher.fallback_items == 2
+
+async def test_failed_batch_falls_back_for_every_message(window):
+    ai = FakeAI(success=False)
+    batcher = ModerationBatcher(ai)
+    await asyncio.gather(batcher.submit("a"), batcher.submit("b"))
+    assert ai.single == ["a", "b"]
+
+async def test_errors_reach_every_waiter(window):
+    class Broken(FakeAI):
+        async def generate_response(self, prompt, **options):
+            raise RuntimeError("provider down")
+
+    batcher = ModerationBatcher(Broken())
+    results = await asyncio.gather(batcher.submit("a"), batcher.submit("b"), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+async def test_escalated_chat_is_reviewed_in_batches(ai, window, monkeypatch):
+    monkeypatch.setattr(settings, "AI_SIM_FLAG_RATE", 0.0)
+    results = await asyncio.gather(
+        ai.moderate_content("This flame retardant is used in labs"),
+        ai.moderate_content("you are stupid"),
+        ai.moderate_content("shit")
+    )
+    assert [result["is_appropriate"] for result in results] == [True, True, False]
+    assert ai.moderation_batcher.get_stats()["batches"] == 1
+
+async def test_benign_escalations_pass_while_the_llm_is_down(ai, monkeypatch):
+    async def provider_down(prompt, **options):
+        raise RuntimeError("provider down")
+
+    monkeypatch.setattr(ai, "generate_response", provider_down)
+    kill = await ai.moderate_content("How do I kill a zombie process? See https://example.com")
+    assert kill["is_appropriate"] is True
+    assert kill["reason"] == "Moderation service unavailable"
+    # Deny terms never needed the LLM
+    assert (await ai.moderate_content("this is fucking hard"))["is_appropriate"] is False
@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+from app.core.config import settings
+from app.core.prompt_budget import OMITTED, PromptBudgeter
+
+class CharEncoding:
+    """One token per character, so counts are exact and easy to reason about"""
+
+    def encode(self, text, disallowed_special=()):
+        return list(text)
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+@pytest.fixture
+def estimated():
+    budgeter = PromptBudgeter()
+    budgeter._loaded = True
+    return budgeter
+
+@pytest.fixture
+def tokenized():
+    budgeter = PromptBudgeter()
+    budgeter._loaded = True
+    budgeter.encodings = {"openai": CharEncoding(), "default": CharEncoding()}
+    return budgeter
+
+def test_estimate_without_a_tokenizer(estimated):
+    assert estimated.count("") == 0
+    assert estimated.count(None) == 0
+    assert estimated.count("x" * 400) == int(100 * settings.PROMPT_TOKEN_MARGIN) + 1
+    assert estimated.get_stats()["tokenizer"] == "estimate"
+
+def test_providers_without_a_local_tokenizer_get_a_margin(tokenized):
+    assert tokenized.count("x" * 100, "openai") == 100
+    assert tokenized.count("x" * 100, "cohere") == int(100 * settings.PROMPT_TOKEN_MARGIN)
+
+def test_budget_leaves_room_for_the_reply(estimated, monkeypatch):
+    monkeypatch.setattr(settings, "PROMPT_TOKEN_BUDGET", 10000)
+    assert estimated.budget_for("anthropic", max_tokens=1000) == 10000
+    assert estimated.budget_for("cohere", max_tokens=1500) == 4096 - 1500
+    assert estimated.budget_for("openai", max_tokens=6000) == 8192 - 4096
+    # A generous reply limit never squeezes the prompt below half the window
+    assert estimated.budget_for("unknown", max_tokens=100000) == 2048
+
+def test_trim_keeps_the_opening_and_the_end(tokenized):
+    text = "A" * 300 + "B" * 400 + "C" * 300
+    trimmed = tokenized.trim(text, 200, "openai")
+    assert tokenized.count(trimmed, "openai") <= 200
+    assert trimmed.startswith("A") and trimmed.endswith("C" * 50)
+    assert "tokens omitted" in trimmed
+    assert tokenized.trim("short", 200, "openai") == "short"
+
+def test_trim_without_room_for_the_marker_drops_everything(tokenized):
+    assert tokenized.trim("x" * 100, len(OMITTED.format(100)) - 1, "openai") == ""
+
+def test_fit_trims_context_before_the_prompt(tokenized, monkeypatch):
+    monkeypatch.setattr(settings, "PROMPT_TOKEN_BUDGET", 500)
+    prompt = "Explain photosynthesis."
+    fitted = tokenized.fit("openai", prompt, "context " * 200)
+    assert fitted.endswith(f"\n\n{prompt}")
+    assert tokenized.count(fitted, "openai") <= 500 + 2
+    stats = tokenized.get_stats()
+    assert (stats["prompts"], stats["trimmed"]) == (1, 1)
+    assert stats["tokens_saved"] == stats["tokens_in"] - stats["tokens_out"] > 0
+
+def test_fit_trims_an_oversized_prompt_and_drops_context(tokenized, monkeypatch):
+    monkeypatch.setattr(settings, "PROMPT_TOKEN_BUDGET", 100)
+    fitted = tokenized.fit("openai", "p" * 500, "context")
+    assert "context" not in fitted
+    assert tokenized.count(fitted, "openai") <= 100
+
+def test_fit_leaves_small_prompts_alone(tokenized):
+    assert tokenized.fit("openai", "prompt", "context") == "context\n\nprompt"
+    assert tokenized.fit("openai", "prompt") == "prompt"
+    assert tokenized.get_stats()["trimmed"] == 0
+
+def test_compact_json_drops_noise(estimated):
+    data = {"id": 7, "name": "Ada", "bio": "", "tags": [], "score": 0.123456, "meta": {"created_at": "x", "level": 3}}
+    assert json.loads(estimated.compact_json(data)) == {"name": "Ada", "score": 0.123, "meta": {"level": 3}}
+    assert json.loads(estimated.compact_json({"id": 1, "name": "Ada"}, drop_fields=["name"])) == {"id": 1}
+
+def test_compact_json_states_record_keys_once(estimated):
+    records = [{"topic": f"t{i}", "score": i} for i in range(3)]
+    assert json.loads(estimated.compact_json(records)) == {
+        "columns": ["topic", "score"],
+        "rows": [["t0", 0], ["t1", 1], ["t2", 2]]
+    }
+
+def test_compact_json_keeps_the_most_recent_items(estimated, monkeypatch):
+    monkeypatch.setattr(settings, "PROMPT_JSON_MAX_ITEMS", 2)
+    assert json.loads(estimated.compact_json([1, 2, 3, 4, 5])) == {"omitted_earlier": 3, "items": [4, 5]}
+
+def test_compact_json_counts_the_tokens_it_saves(estimated):
+    estimated.compact_json([{"topic": f"topic {i}", "score": i / 3, "created_at": "2024-01-01"} for i in range(10)])
+    stats = estimated.get_stats()
+    assert stats["json_compacted"] == 1 and stats["json_tokens_saved"] > 0
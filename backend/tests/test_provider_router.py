@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.core.provider_router import ProviderRouter, ProviderStats, ProviderUnavailableError
+
+@pytest.fixture
+def quick_hedge(monkeypatch, redis):
+    monkeypatch.setattr(settings, "AI_HEDGE_ENABLED", True)
+    monkeypatch.setattr(settings, "AI_HEDGE_DEFAULT_DELAY", 0.02)
+    monkeypatch.setattr(settings, "AI_HEDGE_MAX_BURST", 5)
+
+def provider_calls(delays, failing=()):
+    """A call function whose providers answer after the given delays; some of them fail"""
+    started, cancelled = [], []
+
+    async def call(provider):
+        started.append(provider)
+        try:
+            await asyncio.sleep(delays[provider])
+        except asyncio.CancelledError:
+            cancelled.append(provider)
+            raise
+        if provider in failing:
+            raise RuntimeError(f"{provider} failed")
+        return provider
+
+    return call, started, cancelled
+
+async def test_fast_primary_is_not_hedged(quick_hedge):
+    router = ProviderRouter()
+    call, started, _ = provider_calls({"a": 0.0, "b": 0.0})
+    assert await router.route(["a", "b"], call) == "a"
+    assert started == ["a"]
+    assert router.hedges_sent == 0
+
+async def test_slow_primary_is_hedged_and_loser_cancelled(quick_hedge):
+    router = ProviderRouter()
+    call, started, cancelled = provider_calls({"a": 1.0, "b": 0.0})
+    assert await router.route(["a", "b"], call) == "b"
+    assert started == ["a", "b"]
+    await asyncio.sleep(0)
+    assert cancelled == ["a"]
+    assert (router.hedges_sent, router.hedges_won) == (1, 1)
+
+async def test_failure_falls_back_to_next_provider(quick_hedge):
+    router = ProviderRouter()
+    call, started, _ = provider_calls({"a": 0.0, "b": 0.0}, failing={"a"})
+    assert await router.route(["a", "b"], call) == "b"
+    assert router.stats["a"].failures == 1
+    assert router.stats["b"].successes == 1
+
+async def test_all_failing_raises(quick_hedge):
+    router = ProviderRouter()
+    call, _, _ = provider_calls({"a": 0.0, "b": 0.0}, failing={"a", "b"})
+    with pytest.raises(ProviderUnavailableError):
+        await router.route(["a", "b"], call)
+    with pytest.raises(ProviderUnavailableError):
+        await router.route([], call)
+
+async def test_no_hedge_without_budget(quick_hedge, monkeypatch):
+    monkeypatch.setattr(settings, "AI_HEDGE_MAX_BURST", 0)
+    router = ProviderRouter()
+    call, started, _ = provider_calls({"a": 0.05, "b": 0.0})
+    assert await router.route(["a", "b"], call) == "a"
+    assert started == ["a"]
+
+async def test_unhealthy_providers_are_ranked_last(quick_hedge, monkeypatch):
+    monkeypatch.setattr(settings, "AI_ROUTER_MAX_ERROR_RATE", 0.3)
+    router = ProviderRouter()
+    for _ in range(5):
+        router._stats_for("a").record_failure()
+    assert router.rank(["a", "b", "c"]) == ["b", "c", "a"]
+    assert router.health_score("a") < router.health_score("b") == 1.0
+
+def test_hedge_delay_follows_latency_percentile(monkeypatch):
+    monkeypatch.setattr(settings, "AI_HEDGE_MIN_SAMPLES", 10)
+    monkeypatch.setattr(settings, "AI_HEDGE_DEFAULT_DELAY", 8.0)
+    router = ProviderRouter()
+    assert router.hedge_delay("a") == 8.0
+    for latency in range(1, 101):
+        router._stats_for("a").record_success(latency / 100)
+    assert router.hedge_delay("a") == pytest.approx(settings.AI_HEDGE_PERCENTILE / 100, abs=0.01)
+
+def test_error_rate_decays_with_successes(monkeypatch):
+    monkeypatch.setattr(settings, "AI_ROUTER_ERROR_DECAY", 0.5)
+    stats = ProviderStats(10)
+    stats.record_failure()
+    assert stats.error_rate == 0.5
+    stats.record_success(0.1)
+    assert stats.error_rate == 0.25
@@ -0,0 +1,92 @@
+import itertools
+import json
+
+import pytest
+
+from app.core.config import settings
+from app.core.question_pool import QuestionPool
+from tests.fakes import settle
+
+WORDS = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta", "eta", "theta", "iota", "kappa", "lambda", "mu"]
+
+class FakeAI:
+    """Generates questions with distinct wording, optionally running a hook on each call"""
+
+    def __init__(self):
+        self.calls = []
+        self.serial = itertools.count()
+        self.on_call = None
+
+    async def generate_quiz_questions(self, topic, difficulty, count, use_cache=True):
+        self.calls.append((count, use_cache))
+        if self.on_call:
+            await self.on_call()
+        questions = []
+        for _ in range(count):
+            n = next(self.serial)
+            questions.append({"question": f"{WORDS[n % 12]} {WORDS[n // 12 % 12]} question {n}"})
+        return {"success": True, "questions": questions}
+
+@pytest.fixture
+def pool(redis, monkeypatch):
+    monkeypatch.setattr(settings, "QUIZ_POOL_MAX_SIZE", 6)
+    monkeypatch.setattr(settings, "QUIZ_POOL_REFILL_BATCH", 3)
+    monkeypatch.setattr(settings, "QUIZ_POOL_LOW_WATER", 2)
+    return QuestionPool(FakeAI())
+
+async def stock(redis, pool, questions, topic="Algebra"):
+    await redis.rpush(pool._key(topic, "medium"), *[json.dumps({"question": q}) for q in questions])
+
+async def test_serves_from_stock(redis, pool):
+    await stock(redis, pool, ["one a", "two b", "three c", "four d"])
+    result = await pool.take("algebra ", "medium", count=2)
+    assert result["source"] == "pool"
+    assert [q["question"] for q in result["questions"]] == ["one a", "two b"]
+    assert pool.ai_service.calls == []
+    assert pool.stats["hits"] == 1
+
+async def test_shortfall_is_generated_inline(redis, pool):
+    await stock(redis, pool, ["one a"])
+    result = await pool.take("Algebra", "medium", count=3)
+    assert result["source"] == "mixed" and len(result["questions"]) == 3
+    assert pool.ai_service.calls[0] == (2, True)
+    assert pool.stats["generated_inline"] == 2
+    await settle()
+
+async def test_low_stock_triggers_a_refill_up_to_the_cap(redis, pool):
+    await stock(redis, pool, ["one a", "two b"])
+    await pool.take("Algebra", "medium", count=1)
+    await settle(20)
+    key = pool._key("Algebra", "medium")
+    assert await redis.llen(key) == settings.QUIZ_POOL_MAX_SIZE
+    assert all(use_cache is False for count, use_cache in pool.ai_service.calls[1:])
+    assert await redis.get(f"{key}:refill_lock") is None
+
+async def test_near_duplicates_are_not_stocked(pool):
+    stocked = [{"question": "What is the derivative of x squared?"}]
+    fresh = pool._dedupe(stocked, [
+        {"question": "what is the derivative of x squared"},
+        {"question": "Define a prime number"},
+        {"question": "Define a prime number."},
+        "not a question",
+    ])
+    assert fresh == [{"question": "Define a prime number"}]
+    assert pool.stats["duplicates_dropped"] == 2
+
+async def test_refill_skips_while_another_worker_holds_the_lock(redis, pool):
+    key = pool._key("Algebra", "medium")
+    await redis.set(f"{key}:refill_lock", "other-worker")
+    await pool.refill(key, "Algebra", "medium")
+    assert pool.ai_service.calls == []
+    assert await redis.get(f"{key}:refill_lock") == "other-worker"
+
+async def test_overrunning_refill_keeps_a_lock_it_no_longer_owns(redis, pool):
+    key = pool._key("Algebra", "medium")
+    lock_key = f"{key}:refill_lock"
+
+    async def lock_expires_and_is_retaken():
+        await redis.set(lock_key, "other-worker")
+
+    pool.ai_service.on_call = lock_expires_and_is_retaken
+    await pool.refill(key, "Algebra", "medium")
+    assert await redis.get(lock_key) == "other-worker"
@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from app.core import ai_service as ai_service_module
+from app.core.config import settings
+from app.core.readiness import FAILED, PENDING, READY, TIMEOUT, ServiceReadiness
+
+@pytest.fixture
+def readiness(monkeypatch):
+    monkeypatch.setattr(settings, "STARTUP_TIMEOUTS", {"default": 0.2})
+    monkeypatch.setattr(settings, "STARTUP_REQUIRED_SERVICES", ["redis"])
+    monkeypatch.setattr(settings, "STARTUP_RETRY_INTERVAL", 0.01)
+    readiness = ServiceReadiness()
+    yield readiness
+    if readiness._retry_task:
+        readiness._retry_task.cancel()
+
+def step(log, name, failures=0, delay=0.0):
+    """A startup step that fails its first attempts"""
+    attempts = 0
+
+    async def init():
+        nonlocal attempts
+        attempts += 1
+        log.append(f"{name} started")
+        await asyncio.sleep(delay)
+        if attempts <= failures:
+            raise ConnectionError(f"{name} unreachable")
+        log.append(f"{name} ready")
+
+    return init
+
+async def test_steps_run_concurrently(readiness):
+    log = []
+    readiness.register("redis", step(log, "redis", delay=0.05))
+    readiness.register("database", step(log, "database", delay=0.05))
+    await readiness.start()
+    assert log[:2] == ["redis started", "database started"]
+    assert readiness.status() == "healthy"
+    assert readiness.startup_ms < 100
+
+async def test_optional_failure_degrades_and_is_retried(readiness):
+    log = []
+    readiness.register("redis", step(log, "redis"))
+    readiness.register("neo4j", step(log, "neo4j", failures=1))
+    await readiness.start()
+    assert readiness.status() == "degraded"
+    assert readiness.services["neo4j"]["status"] == FAILED
+    assert readiness.services["neo4j"]["error"] == "neo4j unreachable"
+
+    await asyncio.wait_for(readiness._retry_task, 1)
+    assert readiness.status() == "healthy"
+    assert readiness.services["neo4j"]["attempts"] == 2
+
+async def test_required_failure_is_unavailable(readiness):
+    readiness.register("redis", step([], "redis", failures=5))
+    await readiness.start()
+    assert not readiness.is_ready()
+    assert readiness.describe()["status"] == "unavailable"
+
+async def test_slow_step_times_out(readiness):
+    readiness.register("redis", step([], "redis"))
+    readiness.register("neo4j", step([], "neo4j", delay=1))
+    await readiness.start()
+    assert readiness.services["neo4j"]["status"] == TIMEOUT
+    assert readiness.status() == "degraded"
+
+async def test_dependent_step_waits_for_its_dependency(readiness):
+    log = []
+    readiness.register("class_index", step(log, "class_index"), after=["ai_service"])
+    readiness.register("ai_service", step(log, "ai_service", delay=0.05))
+    readiness.register("redis", step(log, "redis"))
+    await readiness.start()
+    assert log.index("class_index started") > log.index("ai_service ready")
+    assert readiness.services["class_index"]["status"] == READY
+
+async def test_dependent_step_is_started_once_its_dependency_recovers(readiness):
+    log = []
+    readiness.register("redis", step(log, "redis"))
+    readiness.register("ai_service", step(log, "ai_service", failures=1))
+    readiness.register("class_index", step(log, "class_index"), after=["ai_service"])
+    await readiness.start()
+    assert "class_index started" not in log
+    assert readiness.services["class_index"]["status"] == PENDING
+    assert readiness.services["class_index"]["error"] == "Waiting for ai_service"
+
+    await asyncio.wait_for(readiness._retry_task, 1)
+    assert log[-2:] == ["class_index started", "class_index ready"]
+    assert readiness.status() == "healthy"
+
+async def test_ai_service_skips_providers_it_could_not_set_up(ai, readiness, monkeypatch):
+    monkeypatch.setattr(ai.budgeter, "load", lambda: None)
+    monkeypatch.setattr(ai_service_module, "PROVIDER_SDKS", {"broken": ("COHERE_API_KEY", "no_such_provider_sdk")})
+    monkeypatch.setattr(settings, "COHERE_API_KEY", "key")
+
+    readiness.register("redis", step([], "redis"))
+    readiness.register("ai_service", ai.initialize)
+    await readiness.start()
+    assert readiness.services["ai_service"]["status"] == READY
+    assert readiness.status() == "healthy"
+    assert (await ai.get_service_status())["missing_sdks"] == ["broken"]
+
+async def test_class_index_needs_only_the_embeddings(ai, embeddings, readiness):
+    ai.embeddings = embeddings
+    log = []
+    readiness.register("redis", step(log, "redis"))
+    readiness.register("ai_service", step(log, "ai_service", failures=5))
+    readiness.register("embeddings", ai.load_embeddings)
+    readiness.register("class_index", step(log, "class_index"), after=["embeddings"])
+    await readiness.start()
+    assert readiness.services["embeddings"]["status"] == READY
+    assert "class_index ready" in log
+    assert readiness.services["ai_service"]["status"] == FAILED
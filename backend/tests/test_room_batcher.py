@@ -0,0 +1,105 @@
+import asyncio
+import json
+
+import pytest
+
+from app.core.config import settings
+from app.core.room_batcher import RoomBatcher
+from app.core.ws_protocol import JSON_PROTOCOL
+from tests.fakes import FakeSocket, settle
+
+TICK = 0.02
+
+@pytest.fixture(autouse=True)
+def fixed_tick(monkeypatch):
+    monkeypatch.setattr(settings, "WS_BATCH_TICK_MIN_MS", int(TICK * 1000))
+    monkeypatch.setattr(settings, "WS_BATCH_TICK_MAX_MS", int(TICK * 1000))
+
+@pytest.fixture
+def flushed():
+    return []
+
+@pytest.fixture
+def batcher(flushed):
+    batcher = RoomBatcher(lambda room_id, events: flushed.append((room_id, [frame for frame, _, _ in events])))
+    yield batcher
+    for room_id in list(batcher.rooms):
+        batcher.discard(room_id)
+
+async def test_quiet_room_sends_at_once_and_batches_what_follows(batcher, flushed):
+    batcher.add("room1", "a")
+    assert flushed == [("room1", ["a"])]
+    batcher.add("room1", "b")
+    batcher.add("room1", "c")
+    assert len(flushed) == 1
+    await asyncio.sleep(TICK * 1.5)
+    assert flushed == [("room1", ["a"]), ("room1", ["b", "c"])]
+    assert batcher.get_stats()["max_batch"] == 2
+
+async def test_newer_presence_event_replaces_the_superseded_one(batcher, flushed):
+    batcher.add("room1", "first")
+    batcher.add("room1", "typing", key="typing:room1:ann")
+    batcher.add("room1", "chat")
+    batcher.add("room1", "stopped", key="typing:room1:ann")
+    await asyncio.sleep(TICK * 1.5)
+    assert flushed[-1] == ("room1", ["chat", "stopped"])
+    assert batcher.stats["coalesced"] == 1
+
+async def test_idle_rooms_are_forgotten(batcher, flushed):
+    for room in range(50):
+        batcher.add(f"room{room}", "hello")
+    assert batcher.get_stats()["rooms"] == 50
+    await asyncio.sleep(TICK * 2)
+    assert batcher.rooms == {}
+    # A busy room stays until it has been quiet for a whole tick
+    batcher.add("busy", "a")
+    batcher.add("busy", "b")
+    await asyncio.sleep(TICK * 1.5)
+    assert "busy" in batcher.rooms and batcher.get_stats()["pending"] == 0
+    await asyncio.sleep(TICK * 1.5)
+    assert batcher.rooms == {}
+    batcher.add("busy", "c")
+    assert flushed[-1] == ("busy", ["c"])
+
+async def test_discard_drops_pending_events(batcher, flushed):
+    batcher.add("room1", "a")
+    batcher.add("room1", "b")
+    batcher.discard("room1")
+    await asyncio.sleep(TICK * 1.5)
+    assert flushed == [("room1", ["a"])]
+
+async def test_tick_stretches_as_the_room_gets_busier(batcher, monkeypatch):
+    monkeypatch.setattr(settings, "WS_BATCH_TICK_MAX_MS", 50)
+    monkeypatch.setattr(settings, "WS_BATCH_BUSY_RATE", 10.0)
+    batcher.add("room1", "a")
+    quiet = batcher.tick(batcher.rooms["room1"])
+    for _ in range(20):
+        batcher.add("room1", "x")
+    assert quiet < batcher.tick(batcher.rooms["room1"]) == pytest.approx(0.05)
+
+@pytest.fixture
+def batching(manager, monkeypatch):
+    monkeypatch.setattr(settings, "WS_ROOM_BATCHING_ENABLED", True)
+    return manager
+
+async def test_rooms_without_local_members_leave_no_state(batching):
+    await batching.connect(FakeSocket(), "ann")
+    await batching.broadcast_to_room("global", {"type": "chat_message", "data": {"content": "hi"}})
+    batching.deliver("room", "elsewhere", json.dumps({"type": "chat_message", "data": {}}))
+    assert batching.batcher.rooms == {}
+
+async def test_members_get_one_batch_frame_per_tick(batching):
+    batched, legacy = FakeSocket(JSON_PROTOCOL), FakeSocket()
+    for user, socket in (("ann", batched), ("bob", legacy)):
+        await batching.connect(socket, user)
+        await batching.join_room(user, "room1")
+    for n in range(3):
+        await batching.broadcast_to_room("room1", {"type": "chat_message", "data": {"content": str(n)}}, exclude_user="bob" if n == 2 else None)
+    await asyncio.sleep(TICK * 1.5)
+    await settle(20)
+
+    first, batch = batched.messages()
+    assert first["data"]["content"] == "0"
+    assert [event["data"]["content"] for event in batch["events"]] == ["1", "2"]
+    # Clients without a subprotocol get the events one by one, minus the one they were excluded from
+    assert [message["data"]["content"] for message in legacy.messages()] == ["0", "1"]
@@ -0,0 +1,69 @@
+import pytest
+
+from app.core.websocket_broker import ROOM, USER
+from tests.fakes import FakeSocket
+
+class RecordingBroker:
+    """Records the subscriptions the manager asks for"""
+
+    distributed = False
+
+    def __init__(self):
+        self.calls = []
+
+    async def subscribe(self, kind, target):
+        self.calls.append(("subscribe", kind, target))
+
+    async def unsubscribe(self, kind, *targets):
+        self.calls.append(("unsubscribe", kind, *sorted(targets)))
+
+@pytest.fixture
+def broker(manager):
+    manager.broker = RecordingBroker()
+    return manager.broker
+
+def consistent(manager):
+    """room_connections and user_rooms describe the same memberships"""
+    forward = {(room, user) for room, users in manager.room_connections.items() for user in users}
+    reverse = {(room, user) for user, rooms in manager.user_rooms.items() for room in rooms}
+    return forward == reverse and all(manager.room_connections.values()) and all(manager.user_rooms.values())
+
+async def test_joins_and_leaves_update_both_indexes(manager):
+    await manager.join_room("ann", "room1")
+    await manager.join_room("ann", "room2")
+    await manager.join_room("bob", "room1")
+    assert manager.user_rooms == {"ann": {"room1", "room2"}, "bob": {"room1"}}
+    assert manager.get_stats()["memberships"] == 3
+
+    await manager.leave_room("ann", "room2")
+    await manager.leave_room("bob", "room1")
+    assert manager.room_connections == {"room1": {"ann"}}
+    assert manager.user_rooms == {"ann": {"room1"}}
+    assert consistent(manager)
+
+async def test_leaving_a_room_one_never_joined_is_harmless(manager):
+    await manager.join_room("ann", "room1")
+    await manager.leave_room("ann", "room2")
+    await manager.leave_room("bob", "room1")
+    assert manager.room_connections == {"room1": {"ann"}} and consistent(manager)
+
+async def test_disconnect_leaves_only_the_users_rooms(manager, broker):
+    await manager.connect(FakeSocket(), "ann")
+    for room in ("room1", "room2", "room3"):
+        await manager.join_room("ann", room)
+    await manager.join_room("bob", "room1")
+    await manager.join_room("bob", "room4")
+
+    broker.calls.clear()
+    await manager.disconnect("ann")
+    assert manager.room_connections == {"room1": {"bob"}, "room4": {"bob"}}
+    assert "ann" not in manager.user_rooms and consistent(manager)
+    # Only the rooms nobody local is left in are unsubscribed, in one call
+    assert broker.calls == [("unsubscribe", USER, "ann"), ("unsubscribe", ROOM, "room2", "room3")]
+
+async def test_rooms_are_subscribed_once(manager, broker):
+    await manager.join_room("ann", "room1")
+    await manager.join_room("bob", "room1")
+    await manager.leave_room("ann", "room1")
+    await manager.leave_room("bob", "room1")
+    assert broker.calls == [("subscribe", ROOM, "room1"), ("unsubscribe", ROOM, "room1")]
@@ -0,0 +1,91 @@
+import pytest
+
+from app.core.config import settings
+from app.core.semantic_cache import SemanticCache
+
+ANSWER = {"success": True, "content": "Plants turn light into sugar using chlorophyll.", "usage": {"total_tokens": 120}}
+
+@pytest.fixture
+def cache(redis, embeddings):
+    return SemanticCache(embeddings)
+
+@pytest.fixture
+def scope(cache):
+    return cache.scope("bio101", "explanation", "beginner")
+
+async def test_reworded_question_is_served_from_the_cache(cache, scope):
+    await cache.set("What is photosynthesis?", scope, ANSWER, ttl=60)
+    cached = await cache.get("what is  PHOTOSYNTHESIS", scope)
+    assert cached["content"] == ANSWER["content"] and cached["cached"]
+    assert cached["semantic"]["matched"] == "What is photosynthesis?"
+    assert cached["semantic"]["similarity"] >= settings.SEMANTIC_CACHE_THRESHOLD
+    assert cache.stats["tokens_avoided"] == 120
+
+async def test_different_question_misses(cache, scope):
+    await cache.set("What is photosynthesis?", scope, ANSWER, ttl=60)
+    assert await cache.get("How do volcanoes erupt?", scope) is None
+    assert cache.stats["misses"] == 1
+
+async def test_answers_are_not_shared_across_scopes(cache, scope):
+    await cache.set("What is photosynthesis?", scope, ANSWER, ttl=60)
+    assert await cache.get("What is photosynthesis?", cache.scope("bio101", "explanation", "advanced")) is None
+    assert await cache.get("What is photosynthesis?", cache.scope("chem", "explanation", "beginner")) is None
+
+async def test_answer_expired_in_redis_is_evicted(cache, scope, redis):
+    await cache.set("What is photosynthesis?", scope, ANSWER, ttl=60)
+    await redis.delete(*await redis.keys("ai_semantic:*"))
+    assert await cache.get("What is photosynthesis?", scope) is None
+    assert cache.entries == {} and len(cache.index) == 0
+    assert cache.stats["evicted_age"] == 1
+
+async def test_old_entries_stop_being_served(cache, scope):
+    await cache.set("What is photosynthesis?", scope, ANSWER, ttl=60)
+    for entry in cache.entries.values():
+        entry["created"] -= settings.SEMANTIC_CACHE_MAX_AGE + 1
+    assert await cache.get("What is photosynthesis?", scope) is None
+    assert cache.stats["evicted_age"] == 1
+
+async def test_capacity_eviction_keeps_the_most_hit_entries(cache, scope, monkeypatch):
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_MAX_ENTRIES", 4)
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_EVICT_TO", 0.5)
+    topics = ["photosynthesis", "mitosis", "volcanoes", "tectonics"]
+    for topic in topics:
+        await cache.set(f"Explain {topic}", scope, ANSWER, ttl=60)
+    await cache.get("Explain volcanoes", scope)
+    await cache.get("Explain mitosis", scope)
+    await cache.set("Explain glaciers", scope, ANSWER, ttl=60)
+    assert cache.stats["evicted_capacity"] == 3
+    assert await cache.get("Explain volcanoes", scope) is not None
+    assert await cache.get("Explain photosynthesis", scope) is None
+
+async def test_false_hit_is_evicted(cache, scope):
+    await cache.set("What is photosynthesis?", scope, ANSWER, ttl=60)
+    cached = await cache.get("What is photosynthesis?", scope)
+
+    async def unrelated_answer():
+        return {"success": True, "content": "Magma rises through cracks in the crust and erupts."}
+
+    cache.verify(cached, unrelated_answer)
+    for task in list(cache._verifications):
+        await task
+    assert cache.stats["verified"] == 1 and cache.stats["false_hits"] == 1
+    assert await cache.get("What is photosynthesis?", scope) is None
+    shared = (await cache.get_stats())["shared"]
+    assert (shared["verified"], shared["false_hits"], shared["provider_calls_avoided"]) == (1, 1, 0)
+
+async def test_matching_fresh_answer_keeps_the_entry(cache, scope):
+    await cache.set("What is photosynthesis?", scope, ANSWER, ttl=60)
+    cached = await cache.get("What is photosynthesis?", scope)
+
+    async def same_answer():
+        return {"success": True, "content": "Using chlorophyll, plants turn light into sugar."}
+
+    await cache._verify(cached, same_answer)
+    assert cache.stats["false_hits"] == 0
+    assert await cache.get("What is photosynthesis?", scope) is not None
+
+async def test_disabled_cache_stores_nothing(cache, scope, monkeypatch):
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_ENABLED", False)
+    await cache.set("What is photosynthesis?", scope, ANSWER, ttl=60)
+    assert await cache.get("What is photosynthesis?", scope) is None
+    assert cache.entries == {} and cache.stats["lookups"] == 0
@@ -0,0 +1,93 @@
+import json
+import statistics
+
+import pytest
+
+from app.core.config import settings
+from app.core.simulated_provider import SimulatedProvider, SimulatedProviderError, SimulatedRateLimitError
+
+def test_output_is_reproducible_but_repeats_differ():
+    first, second = SimulatedProvider(seed=7), SimulatedProvider(seed=7)
+    assert first.respond("Explain gravity") == second.respond("Explain gravity")
+    assert first.respond("Explain gravity") != first.respond("Explain gravity")
+    assert SimulatedProvider(seed=8).respond("Explain gravity") != SimulatedProvider(seed=7).respond("Explain gravity")
+
+def test_text_respects_max_tokens(monkeypatch):
+    monkeypatch.setattr(settings, "AI_SIM_MAX_TEXT_TOKENS", 400)
+    provider = SimulatedProvider(seed=1)
+    for _ in range(10):
+        assert len(provider.respond("Tell me something", max_tokens=20).split()) <= 20 + 14
+
+def test_quiz_prompt_gets_the_requested_questions():
+    provider = SimulatedProvider(seed=1)
+    content = json.loads(provider.respond(
+        "Generate 4 multiple choice questions about photosynthesis at hard difficulty level."
+    ))
+    assert len(content["questions"]) == 4
+    for question in content["questions"]:
+        assert "photosynthesis" in question["question"]
+        assert len(question["options"]) == 4
+        assert question["correct_answer"] in question["options"]
+
+def test_moderation_batch_answers_every_message(monkeypatch):
+    monkeypatch.setattr(settings, "AI_SIM_FLAG_RATE", 0.5)
+    provider = SimulatedProvider(seed=1)
+    messages = [{"id": str(i), "text": f"message {i}"} for i in range(20)]
+    verdicts = json.loads(provider.respond(
+        f'Reply with "is_appropriate" for each. Messages: {json.dumps(messages)}'
+    ))
+    assert [verdict["id"] for verdict in verdicts] == [message["id"] for message in messages]
+    assert {verdict["is_appropriate"] for verdict in verdicts} == {True, False}
+
+def test_structured_responses_match_their_schemas():
+    provider = SimulatedProvider(seed=1)
+    analysis = json.loads(provider.respond('Return JSON with "progress_score" and strengths'))
+    assert 40 <= analysis["progress_score"] <= 95 and analysis["next_steps"]
+    path = json.loads(provider.respond('Return JSON with "difficulty_progression"'))
+    assert path["difficulty_progression"] == [step["difficulty"] for step in path["path"]]
+    explanation = json.loads(provider.respond('Return JSON with "related_concepts"'))
+    assert len(explanation["related_concepts"]) == 3
+
+def test_latency_matches_the_configured_median_and_p99(monkeypatch):
+    monkeypatch.setattr(settings, "AI_SIM_LATENCY_MEDIAN_MS", 100.0)
+    monkeypatch.setattr(settings, "AI_SIM_LATENCY_P99_MS", 1000.0)
+    provider = SimulatedProvider(seed=1)
+    samples = sorted(provider._latency() for _ in range(20000))
+    assert statistics.median(samples) == pytest.approx(0.1, rel=0.1)
+    assert samples[int(len(samples) * 0.99)] == pytest.approx(1.0, rel=0.2)
+
+async def test_injected_errors(fast_simulation, monkeypatch):
+    monkeypatch.setattr(settings, "AI_SIM_ERROR_RATE", 1.0)
+    provider = SimulatedProvider(seed=1)
+    with pytest.raises(SimulatedProviderError):
+        await provider.generate("prompt")
+    monkeypatch.setattr(settings, "AI_SIM_RATE_LIMIT_RATE", 1.0)
+    with pytest.raises(SimulatedRateLimitError) as raised:
+        await provider.generate("prompt")
+    assert 1 <= raised.value.retry_after <= 10
+    assert provider.get_stats() == {"requests": 2, "errors": 1, "rate_limited": 1, "tokens": 0}
+
+async def test_requests_per_minute_limit(fast_simulation, monkeypatch):
+    monkeypatch.setattr(settings, "AI_SIM_RATE_LIMIT_RPM", 2)
+    provider = SimulatedProvider(seed=1)
+    await provider.generate("one")
+    await provider.generate("two")
+    with pytest.raises(SimulatedRateLimitError) as raised:
+        await provider.generate("three")
+    assert 59 < raised.value.retry_after <= 60
+
+async def test_stream_yields_the_response_and_reports_usage(fast_simulation):
+    streamed, whole = SimulatedProvider(seed=3), SimulatedProvider(seed=3)
+    usage = {}
+    chunks = [chunk async for chunk in streamed.stream("Explain tides", 50, usage)]
+    content = "".join(chunks)
+    assert len(chunks) > 1
+    assert content == (await whole.generate("Explain tides", 50))["content"]
+    assert usage["total_tokens"] == usage["prompt_tokens"] + usage["completion_tokens"]
+    assert usage["completion_tokens"] == len(content) // 4 + 1
+
+async def test_service_parses_simulated_quizzes(ai):
+    result = await ai.generate_quiz_questions("fractions", "easy", 3, use_cache=False)
+    assert result["success"]
+    assert len(result["questions"]) == 3
+    assert ai.simulated_client.get_stats()["requests"] == 1
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from app.core.single_flight import SingleFlight
+
+async def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"value": calls}
+
+    results = await asyncio.gather(*(flight.do("k", work) for _ in range(10)))
+    assert calls == 1
+    assert all(result == {"value": 1} for result in results)
+    assert flight.get_stats() == {"in_flight": 0, "executed": 1, "coalesced": 9, "timeouts": 0}
+
+async def test_different_keys_run_separately():
+    flight = SingleFlight()
+
+    async def work(value):
+        await asyncio.sleep(0.01)
+        return value
+
+    assert await asyncio.gather(flight.do("a", lambda: work(1)), flight.do("b", lambda: work(2))) == [1, 2]
+    assert flight.executed == 2
+
+async def test_finished_call_is_forgotten():
+    flight = SingleFlight()
+
+    async def work():
+        return object()
+
+    first = await flight.do("k", work)
+    second = await flight.do("k", work)
+    assert first is not second
+    assert flight.in_flight() == 0
+
+async def test_exception_reaches_every_waiter():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("provider down")
+
+    results = await asyncio.gather(*(flight.do("k", fail) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flight.executed == 1
+
+async def test_cancelled_waiter_leaves_shared_call_running():
+    flight = SingleFlight()
+    started = asyncio.Event()
+
+    async def work():
+        started.set()
+        await asyncio.sleep(0.05)
+        return "done"
+
+    impatient = asyncio.create_task(flight.do("k", work))
+    await started.wait()
+    patient = asyncio.create_task(flight.do("k", work))
+    impatient.cancel()
+    assert await patient == "done"
+
+async def test_timeout_bounds_the_shared_call():
+    flight = SingleFlight(default_timeout=0.01)
+
+    async def hang():
+        await asyncio.sleep(1)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await flight.do("k", hang)
+    assert flight.timeouts == 1
+    assert flight.in_flight() == 0
+
+async def test_identical_generate_requests_make_one_provider_call(ai):
+    responses = await asyncio.gather(*(ai.generate_response("Define entropy", temperature=0.2) for _ in range(5)))
+    assert ai.simulated_client.stats["requests"] == 1
+    assert len({response["content"] for response in responses}) == 1
+    assert ai.inflight.coalesced == 4
@@ -0,0 +1,121 @@
+import time
+
+import pytest
+
+from app.core import study_room_service as study_room_module
+from app.core.config import settings
+from app.core.study_room_service import StudyRoomService
+from app.core.websocket_manager import WebSocketManager
+
+class Node:
+    """One worker: its own StudyRoomService and WebSocketManager, sharing Redis with the others"""
+
+    def __init__(self, monkeypatch, manager):
+        self.monkeypatch = monkeypatch
+        self.manager = manager
+        self.service = StudyRoomService()
+
+    async def call(self, method, *args):
+        self.monkeypatch.setattr(study_room_module, "websocket_manager", self.manager)
+        return await getattr(self.service, method)(*args)
+
+@pytest.fixture
+def graph(monkeypatch):
+    """Record graph queries instead of running them"""
+    queries = []
+
+    async def execute_query(query, params=None):
+        queries.append(params)
+        return []
+
+    monkeypatch.setattr(study_room_module.neo4j_client, "execute_query", execute_query)
+    return queries
+
+@pytest.fixture
+def nodes(redis, graph, manager, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_STUDY_ROOM_SIZE", 2)
+    return Node(monkeypatch, manager), Node(monkeypatch, WebSocketManager())
+
+async def test_capacity_counts_members_on_every_node(nodes):
+    a, b = nodes
+    assert await a.call("add_user_to_room", "ann", "room1")
+    assert await b.call("add_user_to_room", "bob", "room1")
+    assert await a.call("is_full", "room1", "cat")
+    assert not await a.call("add_user_to_room", "cat", "room1")
+    assert a.service.stats["rejected_full"] == 1
+    # Members already in can always come back
+    assert not await b.call("is_full", "room1", "bob")
+    assert (await a.call("get_room_info", "room1"))["users"] == ["ann", "bob"]
+
+async def test_leaving_frees_the_place_everywhere(nodes):
+    a, b = nodes
+    await a.call("add_user_to_room", "ann", "room1")
+    await b.call("add_user_to_room", "bob", "room1")
+    await b.call("remove_user_from_room", "bob", "room1")
+    assert await a.call("add_user_to_room", "cat", "room1")
+
+async def test_a_node_only_prunes_disconnects_it_has_seen(nodes):
+    a, b = nodes
+    await a.call("add_user_to_room", "ann", "room1")
+    await b.call("add_user_to_room", "bob", "room1")
+    # Node a never held bob's socket, so his absence from its room_connections means nothing
+    assert await a.call("is_full", "room1", "cat")
+
+    await a.manager.disconnect("ann")
+    await a.call("forget_disconnected", "ann")
+    assert a.service.active_rooms["room1"]["users"] == set()
+    assert not await b.call("is_full", "room1", "cat")
+
+async def test_unannounced_disconnects_are_pruned_before_counting(nodes):
+    a, b = nodes
+    await a.call("add_user_to_room", "ann", "room1")
+    await a.call("add_user_to_room", "bob", "room1")
+    # An idle eviction clears the WebSocket side only
+    await a.manager.disconnect("ann")
+    assert not await a.call("is_full", "room1", "cat")
+
+async def test_a_member_who_moved_nodes_keeps_their_place(nodes):
+    a, b = nodes
+    await a.call("add_user_to_room", "ann", "room1")
+    await b.call("add_user_to_room", "ann", "room1")
+    # The old node notices ann's socket is gone, but her place now belongs to node b
+    await a.manager.disconnect("ann")
+    await a.call("_check_expiry", "room1")
+    await a.call("add_user_to_room", "bob", "room1")
+    assert await a.call("is_full", "room1", "cat")
+
+async def test_members_of_a_vanished_node_go_stale(nodes, redis):
+    a, b = nodes
+    await b.call("add_user_to_room", "ann", "room1")
+    await b.call("add_user_to_room", "bob", "room1")
+    # Node b stops refreshing its members and they age out
+    await redis.zadd(a.service._key("room1"), {"ann": 1, "bob": 1})
+    assert await a.call("add_user_to_room", "cat", "room1")
+
+async def test_empty_quiet_room_expires(nodes, graph):
+    a, _ = nodes
+    await a.call("add_user_to_room", "ann", "room1")
+    await a.manager.disconnect("ann")
+    a.service.active_rooms["room1"]["last_activity"] -= settings.STUDY_ROOM_TIMEOUT
+    await a.call("_check_expiry", "room1")
+    assert "room1" not in a.service.active_rooms
+    assert a.service.stats["expired"] == 1
+    assert graph[-1] == {"room_id": "room1"}
+
+async def test_room_in_use_on_another_node_does_not_expire(nodes, redis):
+    a, b = nodes
+    await a.call("create_room", "room1", {"name": "Shared"})
+    await b.call("add_user_to_room", "bob", "room1")
+    a.service.active_rooms["room1"]["last_activity"] -= settings.STUDY_ROOM_TIMEOUT
+    await a.call("_check_expiry", "room1")
+    assert "room1" in a.service.active_rooms
+    assert a.service.stats["expired"] == 0
+
+async def test_checks_re_stamp_members_still_here(nodes, redis):
+    a, _ = nodes
+    await a.call("add_user_to_room", "ann", "room1")
+    key = a.service._key("room1")
+    await redis.zadd(key, {"ann": 1})
+    a.service.active_rooms["room1"]["stamps"]["ann"] = 1
+    await a.call("_check_expiry", "room1")
+    assert await redis.zscore(key, "ann") > time.time() * 1000 - 5000
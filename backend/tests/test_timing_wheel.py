@@ -0,0 +1,44 @@
+import asyncio
+
+from app.core.timing_wheel import TimingWheel
+
+def advance(wheel, ticks):
+    """Everything that falls due over the next ticks, in order"""
+    due = []
+    for _ in range(ticks):
+        due.extend(wheel.advance())
+    return due
+
+def test_items_fire_after_their_delay_rounded_up_to_ticks():
+    wheel = TimingWheel(1.0, 8)
+    wheel.schedule("a", 2)
+    wheel.schedule("b", 2.5)
+    wheel.schedule("c", 0)
+    assert wheel.advance() == ["c"]
+    assert wheel.advance() == ["a"]
+    assert wheel.advance() == ["b"]
+    assert len(wheel) == 0
+
+def test_delays_longer_than_a_turn_wait_out_the_extra_turns():
+    wheel = TimingWheel(1.0, 4)
+    wheel.schedule("late", 10)
+    assert advance(wheel, 9) == []
+    assert wheel.advance() == ["late"]
+    assert wheel.get_stats()["fired"] == 1
+
+async def test_run_calls_back_and_survives_failing_handlers():
+    wheel = TimingWheel(0.01, 4)
+    seen = []
+
+    async def on_due(item):
+        if item == "bad":
+            raise ValueError("broken")
+        seen.append(item)
+
+    wheel.schedule("bad", 0.01)
+    wheel.schedule("good", 0.02)
+    task = asyncio.create_task(wheel.run(on_due))
+    await asyncio.sleep(0.1)
+    task.cancel()
+    assert seen == ["good"]
+    assert wheel.get_stats()["errors"] == 1
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from app.core.vector_index import EXACT, IVF, VectorIndex
+
+def unit(rng, rows, dim=16):
+    vectors = rng.standard_normal((rows, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def payloads(doc, rows):
+    return [{"doc": doc, "row": row} for row in range(rows)]
+
+def test_search_ranks_by_cosine_similarity():
+    index = VectorIndex(3, mode=EXACT)
+    index.add("a", np.array([[1, 0, 0], [0, 1, 0]]), payloads("a", 2))
+    index.add("b", np.array([[10, 1, 0]]), payloads("b", 1))
+    results = index.search(np.array([1, 0, 0]), k=2)
+    assert [payload for _, payload in results] == [{"doc": "a", "row": 0}, {"doc": "b", "row": 0}]
+    assert results[0][0] == pytest.approx(1.0)
+    assert results[1][0] == pytest.approx(10 / np.sqrt(101))
+
+def test_groups_restrict_the_search():
+    index = VectorIndex(2, mode=EXACT)
+    index.add("a", np.array([[1, 0]]), payloads("a", 1), group="class1")
+    index.add("b", np.array([[1, 0.1]]), payloads("b", 1), group="class2")
+    assert [p["doc"] for _, p in index.search(np.array([1, 0]), k=5, group="class2")] == ["b"]
+    assert index.search(np.array([1, 0]), group="unknown") == []
+
+def test_adding_a_document_again_replaces_it():
+    index = VectorIndex(2, mode=EXACT)
+    index.add("a", np.array([[1, 0], [0, 1]]), payloads("a", 2))
+    index.add("a", np.array([[1, 1]]), [{"doc": "a", "version": 2}])
+    assert len(index) == 1
+    assert [payload for _, payload in index.search(np.array([1, 0]), k=5)] == [{"doc": "a", "version": 2}]
+
+def test_removed_rows_are_compacted_away():
+    rng = np.random.default_rng(0)
+    index = VectorIndex(16, mode=EXACT, capacity=4)
+    for doc in range(30):
+        index.add(f"doc{doc}", unit(rng, 100), payloads(f"doc{doc}", 100), group="g" if doc % 2 else None)
+    assert index.get_stats()["rows"] == 3000
+    removed = sum(index.remove(f"doc{doc}") for doc in range(20))
+    assert removed == 2000 and index.compactions == 1
+    # Compacted once more than half the rows were dead
+    assert len(index) == 1000 and index.size == 1400 and index.dead == 400
+    assert index.remove_group("g") == 500
+    query = index.vectors[index.docs["doc20"][3]]
+    assert index.search(query, k=1)[0][1] == {"doc": "doc20", "row": 3}
+
+def test_ivf_finds_nearly_what_exact_search_finds():
+    rng = np.random.default_rng(1)
+    index = VectorIndex(16, mode=IVF, nprobe=4)
+    index.add("docs", unit(rng, 2000), payloads("docs", 2000))
+    index.set_centroids(*index.train(nlist=16))
+    # Rows added after training join their nearest list
+    index.add("late", unit(rng, 10), payloads("late", 10))
+
+    queries = unit(rng, 50)
+    recall = np.mean([
+        index.search(query, k=1, mode=IVF)[0][1] == index.search(query, k=1, mode=EXACT)[0][1]
+        for query in queries
+    ])
+    assert recall >= 0.6
+    late = index.vectors[index.docs["late"][0]]
+    assert index.search(late, k=1, mode=IVF)[0][1] == {"doc": "late", "row": 0}
+
+def test_auto_mode_switches_to_ivf_and_trains_in_the_background():
+    index = VectorIndex(16, mode="auto", ivf_min_rows=500)
+    rng = np.random.default_rng(2)
+    index.add("small", unit(rng, 100), payloads("small", 100))
+    assert index.search_mode() == EXACT
+    index.add("large", unit(rng, 500), payloads("large", 500))
+    assert index.search_mode() == IVF
+
+async def test_maybe_train_builds_the_lists_off_the_loop():
+    index = VectorIndex(16, mode="auto", ivf_min_rows=100)
+    index.add("docs", unit(np.random.default_rng(3), 400), payloads("docs", 400))
+    index.maybe_train()
+    index.maybe_train()
+    await index._train_task
+    stats = index.get_stats()
+    assert stats["trainings"] == 1 and stats["ivf_lists"] == 20 and stats["trained_rows"] == 400
+    # Not retrained until the index doubles
+    index.maybe_train()
+    assert not index._training
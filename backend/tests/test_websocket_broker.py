@@ -0,0 +1,161 @@
+import asyncio
+import json
+import uuid
+
+import pytest
+
+from app.core.config import settings
+from app.core.redis_client import redis_client
+from app.core.websocket_broker import ALL, ROOM, USER, LocalBroker, RedisBroker, create_broker
+from tests.fakes import FakeSocket, settle
+
+@pytest.fixture
+async def live_redis(monkeypatch):
+    """The Redis server at REDIS_URL behind the shared redis_client; skips when there is none"""
+    redis_asyncio = pytest.importorskip("redis.asyncio")
+    client = redis_asyncio.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    try:
+        await asyncio.wait_for(client.ping(), 1)
+    except Exception:
+        await client.aclose()
+        pytest.skip(f"No Redis server at {settings.REDIS_URL}")
+    # A prefix of its own keeps the test clear of anything else using the server
+    monkeypatch.setattr(settings, "WS_BROKER_CHANNEL_PREFIX", f"ws-test-{uuid.uuid4().hex[:8]}")
+    previous, redis_client.redis = redis_client.redis, client
+    yield client
+    redis_client.redis = previous
+    await client.aclose()
+
+@pytest.fixture
+async def nodes(live_redis, monkeypatch):
+    """Two WebSocketManagers standing in for two pods, joined by the Redis broker"""
+    from app.core.websocket_manager import WebSocketManager
+
+    monkeypatch.setattr(settings, "WS_BROKER", "redis")
+    monkeypatch.setattr(settings, "WS_ROOM_BATCHING_ENABLED", False)
+    managers = [WebSocketManager(), WebSocketManager()]
+    for manager in managers:
+        await manager.start()
+    await eventually(lambda: all(manager.broker.pubsub is not None for manager in managers))
+    yield managers
+    for manager in managers:
+        for connection in list(manager.active_connections.values()):
+            connection.stop()
+        await manager.stop()
+
+async def eventually(condition, timeout: float = 5.0):
+    """Wait for a condition that depends on Redis round trips"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("Condition not met in time")
+        await asyncio.sleep(0.01)
+
+async def subscribed(client, channel: str):
+    """Wait until some node listens on a channel"""
+    for _ in range(500):
+        if dict(await client.pubsub_numsub(channel)).get(channel):
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"Nobody subscribed to {channel}")
+
+async def lose_subscriptions(*managers):
+    """Cut the nodes' pub/sub connections, as a Redis restart or failover would"""
+    for manager in managers:
+        await manager.broker.pubsub.connection.disconnect()
+
+async def connect(manager, user_id, room_id=None):
+    socket = FakeSocket()
+    await manager.connect(socket, user_id)
+    if room_id:
+        await manager.join_room(user_id, room_id)
+    return socket
+
+async def test_room_broadcast_reaches_members_on_other_nodes(nodes, live_redis):
+    a, b = nodes
+    ann, bob = await connect(a, "ann", "room1"), await connect(b, "bob", "room1")
+    outsider = await connect(b, "cy", "room2")
+    await subscribed(live_redis, b.broker.channel(ROOM, "room1"))
+
+    await a.broadcast_to_room("room1", {"type": "chat_message", "data": {"content": "hi"}})
+    await eventually(lambda: bob.sent)
+    await settle()
+    assert bob.messages() == [{"type": "chat_message", "data": {"content": "hi"}}]
+    assert ann.messages() == bob.messages() and outsider.sent == []
+
+async def test_excluded_user_is_skipped_on_every_node(nodes, live_redis):
+    a, b = nodes
+    await connect(a, "ann", "room1")
+    bob, dee = await connect(b, "bob", "room1"), await connect(b, "dee", "room1")
+    await subscribed(live_redis, b.broker.channel(ROOM, "room1"))
+
+    await a.broadcast_to_room("room1", {"type": "typing", "user_id": "bob", "room_id": "room1"}, exclude_user="bob")
+    await eventually(lambda: dee.sent)
+    await settle()
+    assert bob.sent == []
+
+async def test_personal_message_finds_the_users_node(nodes, live_redis):
+    a, b = nodes
+    bob = await connect(b, "bob")
+    await subscribed(live_redis, b.broker.channel(USER, "bob"))
+
+    await a.send_personal_message("bob", {"type": "notification", "data": {"title": "Graded"}})
+    await eventually(lambda: bob.sent)
+    assert bob.messages() == [{"type": "notification", "data": {"title": "Graded"}}]
+
+async def test_broadcast_to_all_reaches_every_node_once(nodes):
+    a, b = nodes
+    ann, bob = await connect(a, "ann"), await connect(b, "bob")
+
+    await a.broadcast_to_all({"type": "notification", "data": {"title": "Maintenance"}})
+    await eventually(lambda: bob.sent and a.broker.stats["own_echoes"])
+    await settle()
+    # The sender's node delivered locally and skipped its own frame when Redis echoed it
+    assert len(ann.sent) == 1 and len(bob.sent) == 1
+    assert b.broker.stats["received"] == 1 and a.broker.stats["received"] == 0
+
+async def test_nodes_resubscribe_after_losing_redis(nodes, live_redis):
+    a, b = nodes
+    await connect(a, "ann", "room1")
+    bob = await connect(b, "bob", "room1")
+    await subscribed(live_redis, b.broker.channel(ROOM, "room1"))
+
+    await lose_subscriptions(a, b)
+    await eventually(lambda: b.broker.stats["resubscribes"] >= 1 and b.broker.pubsub is not None)
+    await subscribed(live_redis, b.broker.channel(ROOM, "room1"))
+
+    await a.broadcast_to_room("room1", {"type": "chat_message", "data": {"content": "still here"}})
+    await eventually(lambda: bob.sent)
+    assert bob.messages()[0]["data"]["content"] == "still here"
+
+async def test_rooms_left_while_disconnected_are_not_resubscribed(nodes, live_redis):
+    a, b = nodes
+    await connect(b, "bob", "room1")
+    await connect(b, "bob2", "room2")
+    await subscribed(live_redis, b.broker.channel(ROOM, "room2"))
+
+    await lose_subscriptions(b)
+    await b.leave_room("bob2", "room2")
+    await eventually(lambda: b.broker.stats["resubscribes"] >= 1 and b.broker.pubsub is not None)
+    await subscribed(live_redis, b.broker.channel(ROOM, "room1"))
+    assert not dict(await live_redis.pubsub_numsub(b.broker.channel(ROOM, "room2"))).get(b.broker.channel(ROOM, "room2"))
+
+def test_single_process_uses_the_local_broker(monkeypatch):
+    monkeypatch.setattr(settings, "WS_BROKER", "local")
+    broker = create_broker()
+    assert type(broker) is LocalBroker and not broker.distributed
+    monkeypatch.setattr(settings, "WS_BROKER", "redis")
+    assert create_broker().distributed
+
+def test_publish_queue_is_bounded_and_framed(monkeypatch):
+    monkeypatch.setattr(settings, "WS_BROKER_PUBLISH_QUEUE_SIZE", 2)
+    broker = RedisBroker(prefix="ws")
+    for n in range(3):
+        broker.publish(ROOM, "room1", json.dumps({"n": n}), key="typing:room1:ann", exclude="ann")
+    assert broker.stats["publish_dropped"] == 1
+    channel, payload = broker.outbox[0]
+    header, _, text = payload.partition("\n")
+    assert channel == "ws:room:room1"
+    assert json.loads(header) == [broker.node_id, ROOM, "room1", "typing:room1:ann", "ann"]
+    assert json.loads(text) == {"n": 1}
+    assert broker.channel(ALL, None) == "ws:all"
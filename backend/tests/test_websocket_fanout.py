@@ -0,0 +1,80 @@
+import asyncio
+
+from app.core import ws_protocol
+from app.core.config import settings
+from app.core.ws_protocol import JSON_PROTOCOL, MSGPACK_PROTOCOL
+from tests.fakes import FakeSocket, settle
+
+class StalledSocket(FakeSocket):
+    """A peer that stops reading: every send hangs"""
+
+    async def send_text(self, text: str):
+        await asyncio.sleep(3600)
+
+class BrokenSocket(FakeSocket):
+    async def send_text(self, text: str):
+        raise ConnectionResetError("peer went away")
+
+async def join(manager, user_id, socket, room_id="room1"):
+    await manager.connect(socket, user_id)
+    await manager.join_room(user_id, room_id)
+    return socket
+
+async def test_room_broadcast_reaches_members_but_the_sender(manager):
+    sockets = {user: await join(manager, user, FakeSocket()) for user in ("ann", "bob", "cy")}
+    outsider = await join(manager, "dee", FakeSocket(), room_id="room2")
+    await manager.broadcast_to_room("room1", {"type": "chat_message", "data": {"content": "hi"}}, exclude_user="ann")
+    await settle()
+    assert sockets["ann"].sent == [] and outsider.sent == []
+    assert sockets["bob"].messages() == sockets["cy"].messages() == [{"type": "chat_message", "data": {"content": "hi"}}]
+
+async def test_message_is_encoded_once_per_format(manager, monkeypatch):
+    packed = []
+    encode_binary = ws_protocol.encode_binary
+    monkeypatch.setattr(ws_protocol, "encode_binary", lambda message: packed.append(message) or encode_binary(message))
+    text_sockets = [await join(manager, f"text{n}", FakeSocket(JSON_PROTOCOL)) for n in range(3)]
+    binary_sockets = [await join(manager, f"binary{n}", FakeSocket(MSGPACK_PROTOCOL)) for n in range(3)]
+
+    await manager.broadcast_to_room("room1", {"type": "user_joined", "user_id": "ann", "room_id": "room1"})
+    await settle()
+    assert len(packed) == 1
+    # Every text socket is handed the very same string
+    assert len({id(socket.sent[0]) for socket in text_sockets}) == 1
+    assert all(socket.messages() == [{"type": "user_joined", "user_id": "ann", "room_id": "room1"}] for socket in binary_sockets)
+
+async def test_broadcast_to_all(manager):
+    sockets = [await join(manager, user, FakeSocket(), room_id=user) for user in ("ann", "bob")]
+    await manager.broadcast_to_all({"type": "notification", "data": {"title": "Maintenance"}})
+    await settle()
+    assert all(len(socket.sent) == 1 for socket in sockets)
+
+async def test_stalled_client_does_not_hold_up_the_room(manager, monkeypatch):
+    monkeypatch.setattr(settings, "WS_SEND_TIMEOUT", 0.05)
+    stalled = await join(manager, "slow", StalledSocket())
+    fast = await join(manager, "fast", FakeSocket())
+    for n in range(3):
+        await manager.broadcast_to_room("room1", {"type": "chat_message", "data": {"content": str(n)}})
+    await settle(10)
+    assert len(fast.sent) == 3
+
+    await asyncio.sleep(0.1)
+    await settle()
+    assert "slow" not in manager.active_connections
+    assert "slow" not in manager.room_connections["room1"]
+    assert stalled.closed == (1011, "Send timed out")
+
+async def test_failed_send_drops_the_connection(manager):
+    broken = await join(manager, "gone", BrokenSocket())
+    await manager.send_personal_message("gone", {"type": "notification", "data": {"title": "hi"}})
+    await settle(10)
+    assert "gone" not in manager.active_connections
+    assert broken.closed == (1011, "Send failed")
+
+async def test_drop_leaves_a_reconnected_user_alone(manager, monkeypatch):
+    monkeypatch.setattr(settings, "WS_SEND_TIMEOUT", 0.05)
+    await join(manager, "ann", StalledSocket())
+    await manager.send_personal_message("ann", {"type": "notification", "data": {}})
+    replacement = await join(manager, "ann", FakeSocket())
+    await asyncio.sleep(0.1)
+    await settle()
+    assert manager.active_connections["ann"].websocket is replacement
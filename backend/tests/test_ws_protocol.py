@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+from app.core.config import settings
+from app.core.ws_protocol import (
+    JSON_PROTOCOL, MESSAGE_TYPES, MSGPACK_PROTOCOL, UNTYPED, Frame, decode_binary, describe,
+    encode_batch, encode_binary, negotiate
+)
+
+msgpack = pytest.importorskip("msgpack")
+
+CHAT = {
+    "type": "chat_message",
+    "data": {"sender_id": "ann", "content": "hi", "room_id": "room1", "timestamp": "2024-01-01T00:00:00", "message_type": "text"}
+}
+
+def test_negotiation_prefers_msgpack_and_echoes_what_was_offered(monkeypatch):
+    assert negotiate([JSON_PROTOCOL, MSGPACK_PROTOCOL]) == (MSGPACK_PROTOCOL, MSGPACK_PROTOCOL)
+    assert negotiate([JSON_PROTOCOL]) == (JSON_PROTOCOL, JSON_PROTOCOL)
+    assert negotiate([]) == (JSON_PROTOCOL, None)
+    assert negotiate(["something.else"]) == (JSON_PROTOCOL, None)
+    monkeypatch.setattr(settings, "WS_BINARY_PROTOCOL_ENABLED", False)
+    assert negotiate([MSGPACK_PROTOCOL, JSON_PROTOCOL]) == (JSON_PROTOCOL, JSON_PROTOCOL)
+
+@pytest.mark.parametrize("message", [
+    CHAT,
+    {"type": "user_joined", "user_id": "ann", "room_id": "room1"},
+    {"type": "ai_done", "request_id": "r1", "provider": "openai", "usage": {"total_tokens": 5}, "cached": False},
+    {"type": "ping"},
+    {"type": "no_such_type", "anything": [1, 2]},
+    {"type": "study_room_join", "room_id": None},
+    {"type": "ai_job_update", "job_id": "j1", "status": "failed", "error": None, "result": None},
+    {"type": "chat_message", "data": {**CHAT["data"], "room_id": None}},
+])
+def test_binary_round_trip(message):
+    assert decode_binary(encode_binary(message)) == message
+
+def test_binary_frames_are_positional_and_smaller_than_json():
+    packed = msgpack.unpackb(encode_binary(CHAT), raw=False)
+    code = [name for name, _ in MESSAGE_TYPES].index("chat_message") + 1
+    assert packed == [code, ["ann", "hi", "room1", "2024-01-01T00:00:00", "text"]]
+    assert len(encode_binary(CHAT)) < len(json.dumps(CHAT)) / 2
+
+def test_unknown_fields_travel_in_a_trailing_map():
+    message = {"type": "user_joined", "user_id": "ann", "room_id": "room1", "avatar": "a.png"}
+    packed = msgpack.unpackb(encode_binary(message), raw=False)
+    assert packed[-1] == {"avatar": "a.png"}
+    assert decode_binary(encode_binary(message)) == message
+
+def test_none_fields_are_kept_apart_from_missing_ones():
+    message = {"type": "user_joined", "user_id": "ann", "room_id": None}
+    assert msgpack.unpackb(encode_binary(message), raw=False)[-1] == {"room_id": None}
+    assert decode_binary(encode_binary(message)) == json.loads(json.dumps(message))
+    assert "room_id" not in decode_binary(encode_binary({"type": "user_joined", "user_id": "ann"}))
+
+def test_untyped_and_plain_maps_are_accepted():
+    assert msgpack.unpackb(encode_binary({"type": "custom"}), raw=False)[0] == UNTYPED
+    assert decode_binary(msgpack.packb({"type": "chat", "room_id": "room1"})) == {"type": "chat", "room_id": "room1"}
+
+@pytest.mark.parametrize("frame", [[], [999, "x"], "text"])
+def test_malformed_binary_frames_are_rejected(frame):
+    with pytest.raises(ValueError):
+        decode_binary(msgpack.packb(frame))
+
+def test_frame_encodes_each_format_once():
+    frame = Frame(CHAT)
+    assert frame.encode(JSON_PROTOCOL) is frame.encode(JSON_PROTOCOL)
+    assert frame.encode(MSGPACK_PROTOCOL) is frame.encode(MSGPACK_PROTOCOL)
+    relayed = Frame(text=frame.text)
+    assert relayed.message == CHAT
+    assert decode_binary(relayed.encode(MSGPACK_PROTOCOL)) == CHAT
+
+@pytest.mark.parametrize("protocol", [JSON_PROTOCOL, MSGPACK_PROTOCOL])
+def test_batch_carries_each_event(protocol):
+    events = [CHAT, {"type": "typing", "user_id": "bob", "room_id": "room1"}, {"type": "custom", "n": 1}]
+    batch = encode_batch([Frame(event) for event in events], protocol)
+    decoded = decode_binary(batch) if protocol == MSGPACK_PROTOCOL else json.loads(batch)
+    assert decoded == {"type": "batch", "events": events}
+
+def test_describe_lists_the_dictionary(monkeypatch):
+    description = describe()
+    assert description["protocols"] == [MSGPACK_PROTOCOL, JSON_PROTOCOL]
+    chat = description["types"]["1"]
+    assert chat == {"type": "chat_message", "fields": [{"name": "data", "fields": list(CHAT["data"])}]}
+    assert len(description["types"]) == len(MESSAGE_TYPES)
+    monkeypatch.setattr(settings, "WS_BINARY_PROTOCOL_ENABLED", False)
+    assert describe()["protocols"] == [JSON_PROTOCOL]